@@ -1,8 +1,7 @@
 import os
-# --- STABILITY FLAGS ---
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
-os.environ["OMP_NUM_THREADS"] = "1"
+# --- STABILITY FLAGS (per-platform thread settings, see src/runtime_config.py) ---
+from src.runtime_config import apply_runtime_env
+apply_runtime_env()
 
 import streamlit as st
 import sys
@@ -34,19 +33,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-from src.visualizer import plot_radar_chart, plot_sunburst, create_interactive_network
+from src.knowledge_base import list_knowledge_bases, has_index, create_knowledge_base, clear_knowledge_base, DEFAULT_KB
 
 @st.cache_resource
 def get_pipeline_v3():
-    if not os.path.exists("vector_index.faiss"): return None
+    # Only called once some knowledge base has an index (a cached None would stick)
+    ready = [kb for kb in list_knowledge_bases() if has_index(kb)]
     from src.pipeline import RiskAnalysisPipeline
-    return RiskAnalysisPipeline()
+    # Eager: load all models/indexes concurrently and warm them up once, not on the first audit.
+    # Other knowledge bases are loaded on demand and share the models; rebuilt indexes are
+    # hot-loaded by the pipeline, so the models are loaded once per process.
+    return RiskAnalysisPipeline(eager=True, kb=DEFAULT_KB if DEFAULT_KB in ready else ready[0])
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.image("https://cdn-icons-png.flaticon.com/512/2103/2103633.png", width=60)
     st.markdown("### **Risk Map AI**")
 
+    # Every team can keep its own ground truth (src/knowledge_base.py)
+    kb_names = list_knowledge_bases()
+    created = st.session_state.pop("created_kb", None)
+    active_kb = st.selectbox("🗂️ Knowledge Base", kb_names, index=kb_names.index(created) if created in kb_names else 0)
     
     selected_page = option_menu(
         "Menu", ["Dashboard", "Knowledge Base"], 
@@ -90,6 +97,12 @@ with st.sidebar:
         )
         if "Quick" in model_ui: model_key = "base"
         else: model_key = "auto"
+
+        shared_pool = st.checkbox(
+            "Shared candidate pool",
+            value=False,
+            help="Search the knowledge base once for the question + whole text, then check each claim inside that pool. Faster on large knowledge bases."
+        )
         
     thresholds = {
         "sim_threshold": sim_val,
@@ -99,25 +112,41 @@ with st.sidebar:
 # --- PAGE ROUTING ---
 
 if selected_page == "Knowledge Base":
-    st.header("📚 Knowledge Base")
+    st.header(f"📚 Knowledge Base: {active_kb}")
+
+    with st.expander("➕ New Knowledge Base"):
+        new_kb = st.text_input("Name", placeholder="team-a", help="Letters, digits, '_', '-' and '.'")
+        if new_kb and st.button("Create"):
+            try:
+                create_knowledge_base(new_kb)
+                st.session_state["created_kb"] = new_kb
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
     
     # --- Display Current Index Content ---
-    from src.index_builder import get_indexed_files, process_uploaded_file
+    from src.index_builder import get_indexed_files, get_dedup_stats, process_uploaded_file
     
-    files = get_indexed_files()
+    files = get_indexed_files(active_kb)
     if files:
         st.subheader("✅ Currently Indexed Files")
         for f in files:
             st.markdown(f"- 📄 **{f}**")
+
+        # Near-duplicate chunks collapsed at indexing time
+        dedup = get_dedup_stats(active_kb)
+        if dedup:
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("Chunks Ingested", dedup["chunks_ingested"])
+            d2.metric("Chunks Indexed", dedup["chunks_indexed"])
+            d3.metric("Near-Duplicates Removed", dedup["duplicates_removed"], f"{dedup['dedup_ratio']:.0%}", delta_color="off")
+            d4.metric("Shared Across Sources", dedup["chunks_with_multiple_sources"])
         st.divider()
     else:
         st.warning("⚠️ Knowledge Base is Empty. Upload documents below.")
 
     if files and st.button("🗑️ Clear Knowledge Base"):
-        import shutil
-        if os.path.exists("vector_index.faiss"): os.remove("vector_index.faiss")
-        if os.path.exists("corpus_metadata.pkl"): os.remove("corpus_metadata.pkl")
-        if os.path.exists("bm25_index.pkl"): os.remove("bm25_index.pkl")
+        clear_knowledge_base(active_kb)  # Also drops it from the pipeline's loaded knowledge bases
         st.success("Index cleared!")
         st.rerun()
 
@@ -125,9 +154,9 @@ if selected_page == "Knowledge Base":
     if uploaded_file and st.button("⚡ Build Index", type="primary"):
         with st.spinner("Building Hybrid Index..."):
             from src.index_builder import process_uploaded_file
-            count = process_uploaded_file(uploaded_file)
+            count = process_uploaded_file(uploaded_file, kb=active_kb)
+            # No cache clearing: the pipeline picks up the new index version on the next audit
             st.success(f"Indexed {count} chunks!")
-            st.cache_resource.clear()
 
 elif selected_page == "Dashboard":
     st.markdown("<h1 style='text-align: center;'>🧠 Hallucination Risk Map</h1>", unsafe_allow_html=True)
@@ -140,9 +169,17 @@ elif selected_page == "Dashboard":
         audit_question = st.text_input("Enter Question:", placeholder="What is this text about?", key="audit_q", label_visibility="collapsed")
     with col_txt:
         audit_text = st.text_area("Paste Text to Verify", height=200, placeholder="Paste the text you want to audit here...", key="audit_txt")
+
+    # Optional: only check against some of the indexed documents
+    from src.index_builder import get_indexed_files
+    selected_sources = st.multiselect(
+        "📄 Check against sources (optional)",
+        get_indexed_files(active_kb),
+        help="Leave empty to search the whole Knowledge Base."
+    )
     
     if st.button("🕵️ Verify Pasted Text", type="primary", use_container_width=True):
-        pipeline = get_pipeline_v3()
+        pipeline = get_pipeline_v3() if has_index(active_kb) else None
         if not audit_text:
             st.warning("Please paste some text first.")
         elif not pipeline:
@@ -151,17 +188,25 @@ elif selected_page == "Dashboard":
             with st.spinner("🧠 Auditing external text..."):
                 query_context = audit_question if audit_question else audit_text[:100]
                 # Pass thresholds from sidebar
-                results = pipeline.process(question=query_context, answer=audit_text, thresholds=thresholds, model_selection=model_key)
+                results = pipeline.process(question=query_context, answer=audit_text, thresholds=thresholds, model_selection=model_key, shared_pool=shared_pool, sources=selected_sources or None, kb=active_kb, charts=True)
                 st.session_state['results'] = results
                 st.rerun()
 
     # --- SHARED RESULTS DASHBOARD ---
     if 'results' in st.session_state:
+        # Charts are built once per audit, inside pipeline.process (timed with the request)
         res = st.session_state['results']
+        charts = res['charts']
         st.divider()
         st.markdown("### 📊 Verification Report")
         
-        st.plotly_chart(plot_sunburst(res['claims']), use_container_width=True, key="sunburst_main")
+        st.plotly_chart(charts['sunburst'], use_container_width=True, key="sunburst_main")
+
+        timings = res['stats'].get('timings')
+        if timings:
+            with st.expander(f"⏱️ Stage Timings ({timings['total_ms']:.0f} ms)"):
+                st.table([{"stage": name, **info} for name, info in timings['stages'].items()])
+                st.caption(" · ".join(f"{name}: {n}" for name, n in timings['counters'].items()))
 
         t1, t2, t3 = st.tabs(["🛡️ Risk Inspector", "📈 Analytics & Graph", "✨ Clean Up"])
         
@@ -176,7 +221,7 @@ elif selected_page == "Dashboard":
                 with st.expander(f"Details for Claim {i+1}"):
                     c_chart, c_stats = st.columns([2, 1])
                     with c_chart:
-                        st.plotly_chart(plot_radar_chart(c['analysis']), use_container_width=True, key=f"radar_{i}")
+                        st.plotly_chart(charts['radar'][i], use_container_width=True, key=f"radar_{i}")
                     with c_stats:
                         st.markdown("#### Verification Status")
                         st.metric("Overall Score", f"{c['analysis']['score']:.2f}")
@@ -194,27 +239,24 @@ elif selected_page == "Dashboard":
 
         with t2:
              # --- ANALYTICS DASHBOARD ---
-             from src.visualizer import plot_trust_timeline, plot_source_attribution
-             
              col_time, col_src = st.columns([2, 1])
              
              with col_time:
-                 st.plotly_chart(plot_trust_timeline(res['claims']), use_container_width=True)
+                 st.plotly_chart(charts['timeline'], use_container_width=True)
                  
              with col_src:
-                 fig_src = plot_source_attribution(res['claims'])
+                 fig_src = charts['sources']
                  if fig_src:
                      st.plotly_chart(fig_src, use_container_width=True)
                  else:
                      st.info("No sufficient evidence found for attribution.")
 
              # Heatmap Row
-             from src.visualizer import plot_heatmap
-             st.plotly_chart(plot_heatmap(res['claims']), use_container_width=True)
+             st.plotly_chart(charts['heatmap'], use_container_width=True)
 
              st.divider()
              st.markdown("#### 🕸️ Interactive Graph")
-             path = create_interactive_network(res['claims'])
+             path = charts['network']
              if path:
                  with open(path, 'r', encoding='utf-8') as f:
                      components.html(f.read(), height=600, scrolling=True)
@@ -0,0 +1,230 @@
+"""
+Hardware autotuner.
+
+Runs short micro-benchmarks of the embedding, reranker and NLI models on this machine across
+batch sizes, torch thread counts and the available backends, then measures the inference worker
+pool (workers x threads) against in-process inference and writes inference_profile.json,
+which RiskAnalysisPipeline loads at startup.
+
+Usage:
+    python autotune.py                # full sweep
+    python autotune.py --quick        # fewer batch sizes / thread counts
+    python autotune.py --output my_profile.json
+    python autotune.py --no-pool      # skip the worker pool benchmark (in-process only)
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from src.runtime_config import apply_runtime_env, PROFILE_FILE, DEFAULT_PROFILE
+apply_runtime_env()
+
+import torch
+from src.model_loader import _backend_kwargs, resolve_model_path
+from src.inference_pool import InferencePool, PooledSentenceTransformer, PooledCrossEncoder
+from src.token_cache import CACHED_MODELS
+from src.embedding_models import DEFAULT_EMBEDDING_MODEL
+
+MODELS = {
+    "embedding": ("bi", DEFAULT_EMBEDDING_MODEL),
+    "reranker": ("cross", CACHED_MODELS[0]),
+    "nli": ("cross", CACHED_MODELS[1]),
+}
+
+
+def sample_texts(n):
+    """Benchmark inputs: real corpus text if available, else a synthetic sentence."""
+    texts = []
+    if os.path.exists("corpus_data.json"):
+        with open("corpus_data.json", "r") as f:
+            texts = [d["text"] for d in json.load(f)]
+    if not texts:
+        texts = ["The guest policy allows visitors to stay for no longer than seventy-two hours."]
+    return [texts[i % len(texts)] for i in range(n)]
+
+
+def available_backends():
+    backends = ["torch"]
+    for name, module in [("onnx", "onnxruntime"), ("openvino", "openvino")]:
+        try:
+            __import__(module)
+            backends.append(name)
+        except ImportError:
+            pass
+    return backends
+
+
+def thread_candidates(quick):
+    cores = os.cpu_count() or 1
+    counts = {1, cores}
+    t = 2
+    while t < cores:
+        counts.add(t)
+        t *= 2
+    counts = sorted(counts)
+    return [counts[0], counts[len(counts) // 2], counts[-1]] if quick and len(counts) > 3 else counts
+
+
+def load(kind, name, backend):
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+    cls = SentenceTransformer if kind == "bi" else CrossEncoder
+    return cls(resolve_model_path(name), device='cpu', **_backend_kwargs(backend))
+
+
+def pool_candidates(threads, quick):
+    """(workers, threads per worker) pool layouts that use the machine's cores, at least 2 workers each."""
+    cores = os.cpu_count() or 1
+    layouts = [(cores // t, t) for t in threads if cores // t >= 2]
+    return layouts[:2] if quick else layouts
+
+
+def geometric_mean(values):
+    product = 1.0
+    for v in values:
+        product *= max(v, 1e-9)
+    return product ** (1.0 / len(values)) if values else 0.0
+
+
+def throughput(model, kind, texts, batch_size, repeats=2):
+    """Items per second for one (model, batch size) configuration."""
+    run = (lambda: model.encode(texts, batch_size=batch_size, show_progress_bar=False)) if kind == "bi" \
+        else (lambda: model.predict([[t, texts[0]] for t in texts], batch_size=batch_size))
+    run()  # Warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the models on this machine and write an inference profile.")
+    parser.add_argument("--output", default=PROFILE_FILE)
+    parser.add_argument("--quick", action="store_true", help="Smaller sweep (for CI / slow machines)")
+    parser.add_argument("--rerank-budget-ms", type=float, default=150.0, help="Time allowed for reranking one claim's candidates")
+    parser.add_argument("--nli-budget-ms", type=float, default=250.0, help="Time allowed for NLI on one claim's evidence")
+    parser.add_argument("--no-pool", action="store_true", help="Skip the worker pool benchmark (keeps inference in-process)")
+    args = parser.parse_args()
+
+    batch_sizes = [8, 32, 64] if args.quick else [4, 8, 16, 32, 64, 128]
+    threads = thread_candidates(args.quick)
+    backends = available_backends()
+    texts = sample_texts(max(batch_sizes) * 2)
+
+    print(f"🔧 Autotuning on {os.cpu_count()} cores | threads {threads} | batches {batch_sizes} | backends {backends}")
+
+    # results[model][(backend, threads, batch)] = items/sec
+    results = {key: {} for key in MODELS}
+    for key, (kind, name) in MODELS.items():
+        for backend in backends:
+            try:
+                model = load(kind, name, backend)
+            except Exception as e:
+                print(f"   ⚠️ {key}: backend {backend} unavailable ({e})")
+                continue
+            for t in threads:
+                torch.set_num_threads(t)
+                for bs in batch_sizes:
+                    ips = throughput(model, kind, texts, bs)
+                    results[key][(backend, t, bs)] = ips
+                    print(f"   {key:<9} {backend:<8} threads={t:<3} batch={bs:<4} {ips:8.1f} items/s")
+            del model
+
+    # One thread count for the whole process: best geometric mean over the three models
+    def best_for(key, t):
+        return max((ips for (b, tt, bs), ips in results[key].items() if tt == t), default=0.0)
+
+    def score(t):
+        return geometric_mean([best_for(key, t) for key in MODELS])
+
+    best_threads = max(threads, key=score)
+
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    profile["torch_threads"] = best_threads
+    for key in MODELS:
+        candidates = {cfg: ips for cfg, ips in results[key].items() if cfg[1] == best_threads}
+        if candidates:
+            (backend, _, bs), _ = max(candidates.items(), key=lambda x: x[1])
+            profile["backends"][key] = backend
+            profile["batch_sizes"][key] = bs
+
+    # In-process vs the worker pool: same inputs, each model with its chosen backend and batch size.
+    # Large calls are split into one slice per worker, so the inputs hold one batch per worker.
+    cores = os.cpu_count() or 1
+    profile["inference_workers"] = 0
+    profile["worker_threads"] = best_threads
+    layouts = [] if args.no_pool else pool_candidates(threads, args.quick)
+    if layouts:
+        pool_texts = sample_texts(max(profile["batch_sizes"][key] for key in MODELS) * max(w for w, _ in layouts))
+        torch.set_num_threads(best_threads)
+        in_process = {}
+        for key, (kind, name) in MODELS.items():
+            model = load(kind, name, profile["backends"][key])
+            in_process[key] = throughput(model, kind, pool_texts, profile["batch_sizes"][key], repeats=1)
+            del model
+        print(f"   in-process threads={best_threads:<3} " + "  ".join(f"{k} {v:.1f}/s" for k, v in in_process.items()))
+
+        pooled = []
+        for workers, t in layouts:
+            pool = InferencePool(workers, t)
+            try:
+                measured = {}
+                for key, (kind, name) in MODELS.items():
+                    path, backend = resolve_model_path(name), profile["backends"][key]
+                    model = PooledSentenceTransformer(pool, path, backend=backend) if kind == "bi" \
+                        else PooledCrossEncoder(pool, path, backend=backend)
+                    measured[key] = throughput(model, kind, pool_texts, profile["batch_sizes"][key], repeats=1)
+                if pool.restarts:
+                    # The wrappers answered in-process while the workers were down: not a pool measurement
+                    raise RuntimeError(f"workers restarted {pool.restarts}x")
+            except Exception as e:
+                print(f"   ⚠️ pool {workers}x{t} failed ({e})")
+                continue
+            finally:
+                pool.shutdown()
+            pooled.append({"workers": workers, "threads": t, "items_per_sec": measured})
+            print(f"   pool {workers}x{t:<10} " + "  ".join(f"{k} {v:.1f}/s" for k, v in measured.items()))
+
+        baseline = geometric_mean(list(in_process.values()))
+        best_pool = max(pooled, key=lambda p: geometric_mean(list(p["items_per_sec"].values())), default=None)
+        # The pool costs a process per worker and copies through shared memory: it has to clearly win
+        if best_pool and geometric_mean(list(best_pool["items_per_sec"].values())) > 1.1 * baseline:
+            profile["inference_workers"] = best_pool["workers"]
+            profile["worker_threads"] = best_pool["threads"]
+        profile["pool_benchmark"] = {
+            "items": len(pool_texts),
+            "in_process": {"threads": best_threads, "items_per_sec": {k: round(v, 1) for k, v in in_process.items()}},
+            "pooled": [{**p, "items_per_sec": {k: round(v, 1) for k, v in p["items_per_sec"].items()}} for p in pooled],
+        }
+
+    # Candidate depths that fit the per-claim time budgets (rounded, within sane bounds)
+    rerank_ips = best_for("reranker", best_threads)
+    nli_ips = best_for("nli", best_threads)
+    if rerank_ips:
+        profile["initial_k"] = int(min(100, max(20, round(rerank_ips * args.rerank_budget_ms / 1000 / 10) * 10)))
+    if nli_ips:
+        profile["k"] = int(min(5, max(3, nli_ips * args.nli_budget_ms / 1000)))
+
+    profile["machine"] = {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": cores,
+        "torch": torch.__version__,
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"\n✅ Profile written to {args.output}")
+    print(json.dumps({k: v for k, v in profile.items() if k not in ("machine", "pool_benchmark")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
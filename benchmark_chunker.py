@@ -0,0 +1,67 @@
+"""
+Benchmark: sentence-aware token-budgeted chunker vs the old 500/100 character sliding window.
+The BENCHMARK_300 evidence sentences are laid out as PDF-like pages; every claim should retrieve
+a chunk containing its whole evidence sentence.
+Reports chunk count, stored text, vector index size and recall@k for both chunkers.
+
+Usage: python benchmark_chunker.py [--sentences-per-page 15] [--budget 160] [--overlap 1]
+"""
+import argparse
+import numpy as np
+from src.chunker import chunk_text, count_tokens
+from src.model_loader import load_bi_encoder
+from src.index_builder import MODEL_NAME
+from sample_data.benchmark_300 import BENCHMARK_300
+
+
+def sliding_window_chunks(text, chunk_size=500, overlap=100):
+    # The previous extract_text_from_pdf chunking
+    text = text.replace('\n', ' ').strip()
+    chunks = (text[start:start + chunk_size] for start in range(0, len(text), chunk_size - overlap))
+    return [c for c in chunks if len(c) > 50]
+
+
+def evaluate(name, chunks, model, queries, evidences, source_chars, ks=(1, 5)):
+    vectors = model.encode(chunks, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    q_vectors = model.encode(queries, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    top = np.argsort(-(q_vectors @ vectors.T), axis=1)[:, :max(ks)]
+
+    stored = sum(len(c) for c in chunks)
+    row = [name, f"{len(chunks):7d}", f"{stored / source_chars:8.2f}x", f"{vectors.nbytes / 1024:8.1f}",
+           f"{np.mean([count_tokens(c) for c in chunks]):7.1f}"]
+    for k in ks:
+        hits = [any(ev in chunks[j] for j in top[i, :k]) for i, ev in enumerate(evidences)]
+        row.append(f"{np.mean(hits):8.3f}")
+    print(" ".join(f"{c:>10}" for c in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences-per-page", type=int, default=15)
+    parser.add_argument("--budget", type=int, default=None, help="Token budget (default: src/chunker.py)")
+    parser.add_argument("--overlap", type=int, default=None, help="Overlap in sentences (default: src/chunker.py)")
+    args = parser.parse_args()
+
+    # Unique evidence sentences, each ending with punctuation so it is one sentence
+    items, seen = [], set()
+    for item in BENCHMARK_300:
+        ev = " ".join(item["evidence"].split())
+        ev = ev if ev[-1:] in ".!?" else ev + "."
+        if ev not in seen:
+            seen.add(ev)
+            items.append((item["claim"], ev))
+    evidences = [ev for _, ev in items]
+    queries = [claim for claim, _ in items]
+    pages = [" ".join(evidences[i:i + args.sentences_per_page]) for i in range(0, len(evidences), args.sentences_per_page)]
+    source_chars = sum(len(p) for p in pages)
+
+    options = {k: v for k, v in (("budget", args.budget), ("overlap", args.overlap)) if v is not None}
+    model = load_bi_encoder(MODEL_NAME)
+    print(f"🚀 Chunkers on {len(pages)} pages / {len(evidences)} evidence sentences ({MODEL_NAME})\n")
+    print(" ".join(f"{c:>10}" for c in ["chunker", "chunks", "stored", "index KB", "tokens", "recall@1", "recall@5"]))
+    evaluate("window", [c for p in pages for c in sliding_window_chunks(p)], model, queries, evidences, source_chars)
+    evaluate("sentence", [c for p in pages for c in chunk_text(p, **options)], model, queries, evidences, source_chars)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: two-tier (document -> chunk) retrieval vs flat retrieval.
+Uses the current index (build it first) and the BENCHMARK_300 claims as queries.
+Flat retrieval is the reference: recall@k = share of flat's top-k chunks that two-tier also returns.
+
+Usage: python benchmark_hierarchical.py [--top-docs 5 10 20 50] [--queries 100]
+"""
+import argparse
+import time
+import numpy as np
+from src.retriever import LocalRetriever
+from sample_data.benchmark_300 import BENCHMARK_300
+
+
+def run(retriever, queries, k, hierarchical):
+    results, stage1, total = [], 0.0, 0.0
+    for q in queries:
+        # Stage 1 alone (document tier + candidate fusion), then the full retrieve incl. reranking
+        query_vec = retriever.encode_query(q)
+        t0 = time.perf_counter()
+        pool = retriever.document_pool(q, query_vec) if hierarchical else None
+        candidates = retriever._fuse(q, query_vec, retriever.profile["initial_k"], pool=pool)
+        stage1 += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        top = retriever.retrieve(q, k=k, narrow=False, hierarchical=hierarchical)
+        total += time.perf_counter() - t0
+        results.append(({int(i) for i, _ in candidates}, [r["id"] for r in top]))
+    n = max(len(queries), 1)
+    return results, stage1 / n * 1000, total / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-docs", type=int, nargs="+", default=[5, 10, 20, 50])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    retriever = LocalRetriever()
+    if retriever.document_index is None:
+        raise SystemExit("❌ No document index. Rebuild the index (python rebuild_index.py) first.")
+    retriever.warm_up()
+    queries = [item["claim"] for item in BENCHMARK_300[:args.queries]]
+    print(f"🚀 Two-tier vs flat retrieval: {len(retriever.metadata)} chunks, "
+          f"{len(retriever.document_index.sources)} documents, {len(queries)} queries\n")
+
+    flat, flat_stage1, flat_total = run(retriever, queries, args.k, hierarchical=False)
+    print(f"{'mode':<16} {'stage-1 ms':>10} {'total ms':>10} {'cand. recall':>13} {f'recall@{args.k}':>10}")
+    print(f"{'flat':<16} {flat_stage1:10.1f} {flat_total:10.1f} {1.0:13.3f} {1.0:10.3f}")
+
+    for top_docs in args.top_docs:
+        retriever.profile["top_docs"] = top_docs
+        tiered, stage1, total = run(retriever, queries, args.k, hierarchical=True)
+        cand_recall = np.mean([len(c & fc) / max(len(fc), 1) for (c, _), (fc, _) in zip(tiered, flat)])
+        top_recall = np.mean([len(set(t) & set(ft)) / max(len(ft), 1) for (_, t), (_, ft) in zip(tiered, flat)])
+        print(f"{f'top_docs={top_docs}':<16} {stage1:10.1f} {total:10.1f} {cand_recall:13.3f} {top_recall:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: Symbolic Verifier fast path.
+Runs every claim/evidence pair through SymbolicVerifier with and without the spaCy-free
+pre-filter, checks that the verdicts are identical and reports the speed-up.
+
+Usage: python benchmark_symbolic.py
+"""
+import time
+from src.symbolic_verifier import SymbolicVerifier, may_contain_values
+from sample_data.benchmark_200 import BENCHMARK_200
+from sample_data.benchmark_300 import BENCHMARK_300
+
+# Same pairs as test_symbolic.py
+SYMBOLIC_CASES = [
+    {"claim": "Cost is $99.99.", "evidence": "The price is one hundred dollars."},
+    {"claim": "Guest limit is 3 days.", "evidence": "Guests may stay no longer than 72 hours."},
+    {"claim": "Profit was $10M.", "evidence": "Profit was $10M."},
+    {"claim": "Release date is 2024.", "evidence": "Release date is 2025."},
+]
+
+
+def verdicts(verifier, pairs, batched):
+    if batched:
+        texts = [t for p in pairs for t in (p["claim"], p["evidence"])]
+        values = verifier.extract_values_batch(texts)
+        claim_vals, evidence_vals = values[0::2], values[1::2]
+    else:
+        claim_vals = [verifier._extract_values(p["claim"]) for p in pairs]
+        evidence_vals = [verifier._extract_values(p["evidence"]) for p in pairs]
+
+    out = []
+    for p, c_vals, e_vals in zip(pairs, claim_vals, evidence_vals):
+        result = verifier.check_contradiction(p["claim"], p["evidence"], c_vals, e_vals)
+        out.append(result or verifier.check_entailment(p["claim"], p["evidence"], c_vals, e_vals))
+    return out
+
+
+def main():
+    datasets = {"test_symbolic": SYMBOLIC_CASES, "BENCHMARK_200": BENCHMARK_200, "BENCHMARK_300": BENCHMARK_300}
+    full = SymbolicVerifier(fast_path=False)
+    fast = SymbolicVerifier(fast_path=True)
+    verdicts(full, SYMBOLIC_CASES, batched=False)  # warm-up
+
+    print("🚀 Symbolic Verifier: fast path vs full NER\n")
+    mismatches = 0
+    for name, pairs in datasets.items():
+        texts = [t for p in pairs for t in (p["claim"], p["evidence"])]
+        skipped = sum(not may_contain_values(t) for t in texts)
+        print(f"📦 {name}: {len(pairs)} pairs, {skipped}/{len(texts)} texts skip NER")
+        for batched in (False, True):
+            t0 = time.perf_counter()
+            expected = verdicts(full, pairs, batched)
+            t_full = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            got = verdicts(fast, pairs, batched)
+            t_fast = time.perf_counter() - t0
+
+            diff = [i for i, (a, b) in enumerate(zip(expected, got)) if a != b]
+            mismatches += len(diff)
+            mode = "batch " if batched else "single"
+            status = "✅" if not diff else f"❌ {len(diff)} verdicts changed (items {diff[:10]})"
+            print(f"   {mode}: full {t_full * 1000:8.1f} ms | fast {t_fast * 1000:8.1f} ms | "
+                  f"x{t_full / max(t_fast, 1e-9):.1f} {status}")
+
+    print("\n✅ Verdicts unchanged" if not mismatches else f"\n❌ {mismatches} verdicts changed")
+    return mismatches
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
@@ -0,0 +1,85 @@
+"""
+Benchmark: compressed vector storage (src/vector_store.py) vs the flat float32 index.
+Uses the vectors of the current index (build it first) and the BENCHMARK_300 claims as queries.
+--scale pads the corpus with jittered copies of its vectors to emulate a larger knowledge base
+(PQ needs ~10k vectors to train). Exact flat search is the reference: recall@50 = share of the
+exact top 50 that each format returns. "+rescore" re-scores the compressed candidates against the
+full-precision vectors, memory-mapped from disk as in the retriever.
+
+Usage: python benchmark_vector_formats.py [--scale 50000] [--queries 300] [--k 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from src.embedding_models import get_bi_encoder, index_embedding
+from src.vector_store import VECTOR_FORMATS, make_vector_index, search_vectors, stored_vectors, load_full_vectors
+from sample_data.benchmark_300 import BENCHMARK_300
+
+
+def corpus_vectors(scale):
+    import faiss
+    index = faiss.read_index("vector_index.faiss")
+    vectors = stored_vectors(index, load_full_vectors(index.ntotal), np.arange(index.ntotal))
+    if scale and scale > len(vectors):
+        rng = np.random.RandomState(0)
+        extra = vectors[rng.randint(0, len(vectors), scale - len(vectors))]
+        extra = extra + rng.normal(scale=0.3 / np.sqrt(vectors.shape[1]), size=extra.shape).astype(np.float32)
+        vectors = np.vstack([vectors, extra])
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def index_bytes(index):
+    import faiss
+    return len(faiss.serialize_index(index))
+
+
+def run(index, full_vectors, queries, k, rescore):
+    ids, start = [], time.perf_counter()
+    for q in queries:
+        _, found = search_vectors(index, full_vectors, q[None, :], k, rescore=rescore)
+        ids.append(found[0])
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=50_000, help="Pad the corpus to this many vectors (0 = as is)")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=50)
+    args = parser.parse_args()
+
+    if not os.path.exists("vector_index.faiss"):
+        raise SystemExit("❌ No index. Build it first (python rebuild_index.py).")
+    vectors = corpus_vectors(args.scale)
+    model = get_bi_encoder(index_embedding()["model"])
+    queries = model.encode([item["claim"] for item in BENCHMARK_300[:args.queries]], convert_to_numpy=True,
+                           normalize_embeddings=True, show_progress_bar=False).astype(np.float32)
+    k = min(args.k, len(vectors))
+    print(f"🚀 Vector formats: {len(vectors):,} x {vectors.shape[1]} vectors, {len(queries)} queries, recall@{k}\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Full-precision copy on disk, memory-mapped like FULL_VECTORS_FILE
+        path = os.path.join(tmp, "full.npy")
+        np.save(path, vectors)
+        full_vectors = np.load(path, mmap_mode="r")
+
+        print(f"{'format':<14} {'index MB':>9} {'B/vector':>9} {'ms/query':>9} {f'recall@{k}':>10}")
+        exact = None
+        for fmt in VECTOR_FORMATS:
+            index = make_vector_index(vectors.shape[1], fmt, vectors)
+            index.add(vectors)
+            size = index_bytes(index)
+            variants = [(fmt, None, False)] + ([(f"{fmt}+rescore", full_vectors, True)] if fmt != "flat" else [])
+            for name, full, rescore in variants:
+                ids, ms = run(index, full, queries, k, rescore)
+                if exact is None:
+                    exact = ids
+                recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, exact)])
+                print(f"{name:<14} {size / 2**20:9.2f} {size / len(vectors):9.1f} {ms:9.2f} {recall:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
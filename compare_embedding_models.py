@@ -0,0 +1,99 @@
+"""
+Compare embedding models for the retrieval index (see src/embedding_models.py).
+For each model: encode throughput, vector index size, and retrieval recall@1/5/10 on the benchmark
+sets. Every claim has to find its evidence sentence among all evidence sentences of the set plus the
+current knowledge base's chunks (or corpus_data.json) as distractors.
+--save also builds a complete knowledge base per model (knowledge_bases/emb-<model>) to try in the app.
+
+Usage: python compare_embedding_models.py [--models all-mpnet-base-v2 all-MiniLM-L6-v2 ...]
+                                          [--vector-format flat] [--save]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from src.embedding_models import EMBEDDING_MODELS, DEFAULT_EMBEDDING_MODEL, get_bi_encoder
+from src.vector_store import VECTOR_FORMATS, make_vector_index
+from src.knowledge_base import load_metadata
+from sample_data.benchmark_100 import BENCHMARK_100
+from sample_data.benchmark_200 import BENCHMARK_200
+from sample_data.benchmark_300 import BENCHMARK_300
+
+BENCHMARKS = {"BENCHMARK_100": BENCHMARK_100, "BENCHMARK_200": BENCHMARK_200, "BENCHMARK_300": BENCHMARK_300}
+KS = (1, 5, 10)
+
+
+def load_corpus():
+    """Chunks of the default knowledge base, else corpus_data.json."""
+    if os.path.exists("corpus_metadata.pkl"):
+        return load_metadata("corpus_metadata.pkl")
+    if os.path.exists("corpus_data.json"):
+        with open("corpus_data.json", "r") as f:
+            return json.load(f)
+    return []
+
+
+def evaluate(model, name, corpus_texts, vector_format):
+    import faiss
+    model.encode(["warm-up"], show_progress_bar=False)
+    start = time.perf_counter()
+    corpus_vectors = model.encode(corpus_texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False) \
+        if corpus_texts else None
+    throughput = len(corpus_texts) / max(time.perf_counter() - start, 1e-9)
+
+    row = {"model": name, "chunks/s": throughput}
+    for set_name, items in BENCHMARKS.items():
+        evidences = sorted({item["evidence"] for item in items})
+        target = {ev: i for i, ev in enumerate(evidences)}
+        vectors = model.encode(evidences, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+        if corpus_vectors is not None:
+            vectors = np.vstack([vectors, corpus_vectors])
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = make_vector_index(vectors.shape[1], vector_format, vectors)
+        index.add(vectors)
+        queries = model.encode([item["claim"] for item in items], convert_to_numpy=True, normalize_embeddings=True,
+                               show_progress_bar=False).astype(np.float32)
+        _, top = index.search(queries, max(KS))
+        hits = np.array([[target[item["evidence"]] in top[i, :k] for k in KS] for i, item in enumerate(items)])
+        row[set_name] = hits.mean(axis=0)
+        row["dim"] = vectors.shape[1]
+        row["bytes/chunk"] = len(faiss.serialize_index(index)) / len(vectors)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=list(EMBEDDING_MODELS))
+    parser.add_argument("--vector-format", choices=VECTOR_FORMATS, default="flat")
+    parser.add_argument("--save", action="store_true", help="Build a knowledge base per model (emb-<model>)")
+    args = parser.parse_args()
+
+    docs = load_corpus()
+    corpus_texts = [d["text"] for d in docs]
+    print(f"🚀 Embedding models on {len(corpus_texts)} corpus chunks + benchmark evidence ({args.vector_format} index)\n")
+
+    header = f"{'model':<28} {'dim':>4} {'chunks/s':>9} {'B/chunk':>8} " + \
+             " ".join(f"{name[-3:] + '@' + str(k):>7}" for name in BENCHMARKS for k in KS)
+    print(header)
+    for name in args.models:
+        try:
+            model = get_bi_encoder(name)
+        except Exception as e:
+            print(f"{name:<28} ❌ could not load: {e}")
+            continue
+        row = evaluate(model, name, corpus_texts, args.vector_format)
+        recalls = " ".join(f"{r:7.3f}" for set_name in BENCHMARKS for r in row[set_name])
+        marker = "*" if name == DEFAULT_EMBEDDING_MODEL else ""
+        print(f"{name + marker:<28} {row['dim']:>4} {row['chunks/s']:9.0f} {row['bytes/chunk']:8.0f} {recalls}")
+
+        if args.save and docs:
+            from src.index_builder import build_index_from_documents
+            kb = "emb-" + name.replace("/", "__")
+            build_index_from_documents([dict(d) for d in docs], model_name=name, model=model, vector_format=args.vector_format, kb=kb)
+            print(f"   💾 saved as knowledge base '{kb}'")
+    print("\n* = current default (HRM_EMBEDDING_MODEL)")
+
+
+if __name__ == "__main__":
+    main()
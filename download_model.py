@@ -1,15 +1,37 @@
 from huggingface_hub import snapshot_download
 import os
+import sys
 
-model_name = "cross-encoder/nli-deberta-v3-base"
-print(f"🚀 Starting Download: {model_name}")
-
-try:
-    path = snapshot_download(
-        repo_id=model_name, 
-        resume_download=True,
-        tqdm_class=None
-    )
-    print(f"\n✅ Download Complete! Saved to: {path}")
-except Exception as e:
-    print(f"\n❌ Download Failed: {e}")
+sys.path.append(os.getcwd())
+from src.runtime_config import MODEL_DIR
+from src.embedding_models import EMBEDDING_MODELS, DEFAULT_EMBEDDING_MODEL
+
+# Downloads every model the pipeline uses into MODEL_DIR (HRM_MODEL_DIR, default ./models),
+# where src/model_loader.py picks them up instead of going to the hub at startup.
+# Extra embedding models from the registry can be named on the command line:
+#   python download_model.py all-MiniLM-L6-v2 all-MiniLM-L12-v2
+MODELS = {
+    DEFAULT_EMBEDDING_MODEL: EMBEDDING_MODELS.get(DEFAULT_EMBEDDING_MODEL, {}).get("repo", DEFAULT_EMBEDDING_MODEL),
+    "cross-encoder/ms-marco-MiniLM-L-6-v2": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    "cross-encoder/nli-deberta-v3-base": "cross-encoder/nli-deberta-v3-base",
+}
+for name in sys.argv[1:]:
+    MODELS[name] = EMBEDDING_MODELS.get(name, {}).get("repo", name)
+
+# Framework weights we never load (safetensors are preferred and memory-mapped)
+IGNORE = ["*.h5", "*.msgpack", "*.ot", "tf_model*", "flax_model*", "rust_model*"]
+
+for model_name, repo_id in MODELS.items():
+    local_dir = os.path.join(MODEL_DIR, model_name.replace("/", "__"))
+    print(f"🚀 Starting Download: {repo_id} -> {local_dir}")
+
+    try:
+        path = snapshot_download(
+            repo_id=repo_id,
+            local_dir=local_dir,
+            ignore_patterns=IGNORE,
+            tqdm_class=None
+        )
+        print(f"\n✅ Download Complete! Saved to: {path}")
+    except Exception as e:
+        print(f"\n❌ Download Failed: {e}")
@@ -1,3 +1,4 @@
+import argparse
 import json
 import os
 import sys
@@ -6,18 +7,22 @@ sys.path.append(os.getcwd())
 
 from src.index_builder import build_index_from_documents
 
-def rebuild():
-    print("Loading corpus_data.json...")
-    if not os.path.exists("corpus_data.json"):
-        print("Error: corpus_data.json not found!")
+def rebuild(corpus="corpus_data.json", kb=None):
+    print(f"Loading {corpus}...")
+    if not os.path.exists(corpus):
+        print(f"Error: {corpus} not found!")
         return
 
-    with open("corpus_data.json", "r") as f:
+    with open(corpus, "r") as f:
         data = json.load(f)
     
     print(f"Loaded {len(data)} documents.")
-    build_index_from_documents(data)
+    build_index_from_documents(data, kb=kb)
     print("Index rebuilt successfully.")
 
 if __name__ == "__main__":
-    rebuild()
+    parser = argparse.ArgumentParser(description="Rebuild a knowledge base index from a JSON corpus.")
+    parser.add_argument("corpus", nargs="?", default="corpus_data.json")
+    parser.add_argument("--kb", default=None, help="Knowledge base name (default: the default knowledge base)")
+    args = parser.parse_args()
+    rebuild(args.corpus, args.kb)
@@ -1,5 +1,10 @@
 import re
 
+# Evidence retrieved without the reranker (deadline mode) carries "similarity_kind": "cosine":
+# a bi-encoder cosine, not a sigmoid(cross-encoder) score. Passages that are only on the same topic
+# often reach 0.5-0.7 cosine, so the "Semantic Match" rule needs a stricter bar for them.
+COSINE_SIM_THRESHOLD = 0.75
+
 def calculate_overlap(claim_text, evidence_text):
     stopwords = {"the", "is", "at", "which", "on", "and", "a", "an", "of", "in", "to", "for", "with", "it", "this", "that", "from", "by", "as", "be", "are"}
     def clean(text): return set(re.findall(r'\b\w+\b', text.lower())) - stopwords
@@ -15,6 +20,7 @@ def aggregate_scores(retrieval_results, nli_results, thresholds=None):
         thresholds = {"sim_threshold": 0.6, "entail_threshold": 0.6}
         
     sim_thresh = thresholds.get("sim_threshold", 0.6)
+    cosine_thresh = thresholds.get("cosine_sim_threshold", COSINE_SIM_THRESHOLD)
     entail_thresh = thresholds.get("entail_threshold", 0.7)
 
     if not retrieval_results:
@@ -26,6 +32,7 @@ def aggregate_scores(retrieval_results, nli_results, thresholds=None):
     for res, nli in zip(retrieval_results, nli_results):
         
         sim_score = max(0, res['similarity'])
+        res_sim_thresh = cosine_thresh if res.get('similarity_kind') == "cosine" else sim_thresh
         entail_score = nli['p_entailment']
         contra_score = nli['p_contradiction']
         neutral_score = nli['p_neutral']
@@ -58,7 +65,7 @@ def aggregate_scores(retrieval_results, nli_results, thresholds=None):
             
         # 4. The "Semantic Match"
         # NLI says Neutral, but Similarity is strong (User Configured)
-        elif neutral_score > 0.4 and sim_score > sim_thresh:
+        elif neutral_score > 0.4 and sim_score > res_sim_thresh:
             trust_score = 0.75
             
         # 5. The "Hard Contradiction"
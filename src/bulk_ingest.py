@@ -0,0 +1,382 @@
+import glob
+import json
+import os
+import pickle
+import time
+import numpy as np
+from src.index_builder import (
+    INDEX_FILE, METADATA_FILE, BM25_FILE, SOURCES_FILE, DEDUP_STATS_FILE, MODEL_NAME,
+    simple_tokenize, iter_pdf_chunks, txt_chunks, annotate_entities,
+)
+from src.embedding_models import get_bi_encoder, embedding_info, chunk_token_budget
+from src.entity_index import build_entity_index
+from src.document_index import build_document_index
+from src.chunker import CHUNK_TOKEN_BUDGET
+from src.vector_store import VECTOR_FORMAT, FULL_VECTORS_FILE, TRAIN_SAMPLE, make_vector_index, index_format
+from src.knowledge_base import create_knowledge_base
+from src.index_manifest import begin_build, publish_index, discard_build
+from src.near_dedup import ChunkDeduplicator, chunk_sources, dedup_stats
+from src.evidence_narrowing import SentenceStoreWriter
+from src.token_cache import TokenCacheWriter, TOKEN_CACHE_DIR, SENTENCE_CACHED_MODELS
+
+# Streaming, resumable bulk ingestion (see ingest.py).
+# Inputs are read one unit at a time (a JSONL line, a JSON array element, a PDF or TXT file),
+# chunks are encoded in bounded batches and written to disk in shards. After each shard,
+# state.json records how many input units are fully stored, so an interrupted run resumes
+# from the last shard instead of starting over. Finalizing assembles the shards into the
+# normal index files shard by shard, so peak memory is one shard plus the FAISS index.
+
+WORK_DIR = "ingest_work"
+STATE_FILE = "state.json"
+SHARD_SIZE = 50_000          # Chunks per shard (checkpoint granularity)
+ENCODE_BATCH = 1024          # Chunks per encoder call
+BM25_MAX_CHUNKS = 1_000_000  # rank_bm25 keeps a dict per chunk in RAM; above this BM25 is skipped
+JSON_READ_SIZE = 1 << 20
+
+INPUT_EXTENSIONS = (".jsonl", ".json", ".pdf", ".txt")
+
+
+# --- INPUT ---
+
+def list_inputs(paths):
+    """Input files in a stable order (directories are walked recursively)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "**", "*"), recursive=True)
+            files.extend(sorted(f for f in found if f.lower().endswith(INPUT_EXTENSIONS)))
+        else:
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+
+def _iter_json_array(path):
+    """Elements of a top-level JSON array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, started = "", 0, False
+        while True:
+            chunk = f.read(JSON_READ_SIZE)
+            buf = buf[pos:] + chunk
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if not started:
+                    if pos < len(buf) and buf[pos] == "[":
+                        started, pos = True, pos + 1
+                        continue
+                    if pos < len(buf):
+                        raise ValueError(f"{path}: expected a JSON array")
+                    break
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break  # Element continues in the next read
+                yield item
+                pos = end
+            if not chunk:
+                if buf[pos:].strip():
+                    raise ValueError(f"{path}: truncated JSON array")
+                return
+
+
+def _record_chunks(record, default_source):
+    if isinstance(record, str):
+        record = {"text": record}
+    if not record.get("text"):
+        return []
+    record.setdefault("source", default_source)
+    return [record]
+
+
+def _txt_file_chunks(path, name, budget):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return txt_chunks(f.read(), name, budget=budget)
+
+
+def iter_units(files, budget=CHUNK_TOKEN_BUDGET):
+    """
+    Yields one lazy chunk iterator per input unit, in a fixed order.
+    Units skipped on resume are never parsed (PDFs) or encoded.
+    budget: chunk size for PDF / TXT inputs (JSON records are taken as they are).
+    """
+    for path in files:
+        name = os.path.basename(path)
+        lower = path.lower()
+        if lower.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield (lambda line=line: _record_chunks(json.loads(line), name))
+        elif lower.endswith(".json"):
+            for record in _iter_json_array(path):
+                yield (lambda record=record: _record_chunks(record, name))
+        elif lower.endswith(".pdf"):
+            yield (lambda path=path, name=name: iter_pdf_chunks(path, filename=name, budget=budget))
+        else:
+            yield (lambda path=path, name=name: _txt_file_chunks(path, name, budget))
+
+
+# --- CHECKPOINTS ---
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def load_state(work_dir):
+    path = os.path.join(work_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(work_dir, state):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+    _write_atomic(os.path.join(work_dir, STATE_FILE), write)
+
+
+def _shard_paths(work_dir, n):
+    return os.path.join(work_dir, f"shard_{n:05d}.npy"), os.path.join(work_dir, f"shard_{n:05d}.pkl")
+
+
+class _Progress:
+    def __init__(self, state, every=10.0):
+        self.start = time.perf_counter()
+        self.base = state["chunks"]
+        self.last = 0.0
+        self.every = every
+
+    def report(self, state, pending, force=False):
+        elapsed = time.perf_counter() - self.start
+        if not force and elapsed - self.last < self.every:
+            return
+        self.last = elapsed
+        done = state["chunks"] + pending
+        rate = (done - self.base) / max(elapsed, 1e-9)
+        print(f"   📈 {done:,} chunks | {state['units_done']:,} inputs stored | {state['shards']} shards | "
+              f"{rate:,.0f} chunks/s | {elapsed:,.0f}s")
+
+
+def ingest(paths, work_dir=WORK_DIR, model_name=MODEL_NAME, shard_size=SHARD_SIZE, batch_size=ENCODE_BATCH, dedup=False):
+    """Encodes all inputs into shards under work_dir (resuming a previous run if there is one)."""
+    files = list_inputs(paths)
+    os.makedirs(work_dir, exist_ok=True)
+    state = load_state(work_dir)
+    if state is None:
+        state = {"inputs": files, "model": model_name, "units_done": 0, "chunks": 0, "shards": 0, "complete": False}
+        save_state(work_dir, state)
+    elif state["inputs"] != files or state["model"] != model_name:
+        raise ValueError(f"{work_dir} holds a different ingestion (inputs/model changed). Use another --work-dir.")
+    elif state["complete"]:
+        print(f"✅ Ingestion already complete: {state['chunks']:,} chunks in {state['shards']} shards")
+        return state
+    else:
+        print(f"↩️ Resuming after {state['units_done']:,} inputs ({state['chunks']:,} chunks, {state['shards']} shards)")
+
+    model = get_bi_encoder(model_name)
+    encode_batch_size = min(batch_size, 256)
+    # Near-duplicates are caught across everything encoded since this run (re)started;
+    # the dedup index keeps every kept chunk in RAM, so leave it off for very large corpora.
+    # A duplicate of a chunk in an already-written shard is still dropped, but its source is not recorded
+    deduplicator = ChunkDeduplicator() if dedup else None
+    progress = _Progress(state)
+    shard_docs, shard_vectors, batch = [], [], []
+
+    def encode_batch():
+        if batch:
+            vecs = model.encode([d["text"] for d in batch], batch_size=encode_batch_size, convert_to_numpy=True, show_progress_bar=False)
+            vecs = np.asarray(vecs, dtype=np.float32)
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+            shard_vectors.append(vecs.astype(np.float16))
+            shard_docs.extend(batch)
+            batch.clear()
+
+    def write_shard(units_done):
+        encode_batch()
+        if shard_docs:
+            annotate_entities(shard_docs)
+            vec_path, doc_path = _shard_paths(work_dir, state["shards"])
+            def write_vectors(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, np.vstack(shard_vectors))
+
+            def write_docs(tmp):
+                with open(tmp, "wb") as f:
+                    pickle.dump(shard_docs, f)
+            _write_atomic(vec_path, write_vectors)
+            _write_atomic(doc_path, write_docs)
+            state["shards"] += 1
+            state["chunks"] += len(shard_docs)
+        state["units_done"] = units_done
+        save_state(work_dir, state)
+        shard_docs.clear()
+        shard_vectors.clear()
+        progress.report(state, 0, force=True)
+
+    print(f"🚚 Ingesting {len(files)} input files into {work_dir}/")
+    unit_no = 0
+    for unit_no, make_chunks in enumerate(iter_units(files, chunk_token_budget(model_name)), start=1):
+        if unit_no <= state["units_done"]:
+            continue
+        chunks = make_chunks()
+        if deduplicator is not None:
+            chunks = deduplicator.filter(chunks)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                encode_batch()
+                progress.report(state, len(shard_docs))
+        # Checkpoints only fall on input boundaries, so a resume never splits an input
+        if len(shard_docs) + len(batch) >= shard_size:
+            write_shard(unit_no)
+
+    write_shard(max(unit_no, state["units_done"]))
+    state["complete"] = True
+    save_state(work_dir, state)
+    print(f"✅ Ingested {state['chunks']:,} chunks in {state['shards']} shards")
+    return state
+
+
+# --- FINALIZE ---
+
+def _iter_shards(work_dir, state):
+    for n in range(state["shards"]):
+        vec_path, doc_path = _shard_paths(work_dir, n)
+        with open(doc_path, "rb") as f:
+            docs = pickle.load(f)
+        yield np.load(vec_path, mmap_mode="r"), docs
+
+
+def _iter_docs(work_dir, state):
+    """Chunk metadata of every shard, one shard in memory at a time."""
+    for n in range(state["shards"]):
+        with open(_shard_paths(work_dir, n)[1], "rb") as f:
+            yield from pickle.load(f)
+
+
+def _training_sample(work_dir, state, size=TRAIN_SAMPLE):
+    """Quantizer training vectors drawn uniformly from all shards (shard 0 alone is one slice of the inputs)."""
+    total = state["chunks"]
+    rows = np.sort(np.random.default_rng(0).choice(total, min(size, total), replace=False))
+    sample, start = [], 0
+    for n in range(state["shards"]):
+        vectors = np.load(_shard_paths(work_dir, n)[0], mmap_mode="r")
+        lo, hi = np.searchsorted(rows, [start, start + len(vectors)])
+        sample.append(np.asarray(vectors[rows[lo:hi] - start], dtype=np.float32))
+        start += len(vectors)
+    return np.concatenate(sample)
+
+
+def finalize(work_dir=WORK_DIR, vector_format=None, bm25=None, kb=None, sentence_store=True, token_cache=True):
+    """
+    Writes the index files read by LocalRetriever from the shards into knowledge base `kb`
+    (None = the default one, see src/knowledge_base.py).
+    vector_format: "flat" / "fp16" / "int8" / "pq" (see src/vector_store.py; None = HRM_VECTOR_FORMAT).
+    bm25: build the BM25 index (None = only up to BM25_MAX_CHUNKS chunks).
+    sentence_store: encode every chunk's sentences for evidence narrowing (about as long as the ingestion itself).
+    token_cache: pre-tokenize chunks (reranker + NLI) and sentences (NLI) for the cross-encoders.
+    Parts left out are listed under "skipped" in the manifest; the retriever warns about them.
+    Returns the vector format actually built (PQ falls back to int8 on small corpora).
+    """
+    import faiss
+    state = load_state(work_dir)
+    if not state or not state["complete"]:
+        raise ValueError(f"No complete ingestion in {work_dir}. Run the ingestion (again) first.")
+    if state["shards"] == 0:
+        raise ValueError("Nothing was ingested.")
+
+    root = create_knowledge_base(kb)
+    staging = begin_build(root)   # Published atomically at the end (src/index_manifest.py)
+    try:
+        path = lambda name: os.path.join(staging, name)
+        total = state["chunks"]
+        fmt = vector_format or VECTOR_FORMAT
+        dim = np.load(_shard_paths(work_dir, 0)[0], mmap_mode="r").shape[1]
+        # flat / fp16 need no training, so only the quantized formats read the sample
+        train = _training_sample(work_dir, state) if fmt in ("int8", "pq") else np.zeros((0, dim), dtype=np.float32)
+        index = make_vector_index(dim, fmt, train)
+        built = index_format(index)
+        del train
+        compressed = built != "flat"
+
+        if bm25 is None:
+            bm25 = total <= BM25_MAX_CHUNKS
+        tokenized_corpus = [] if bm25 else None
+        skipped = [] if bm25 else ["bm25"]
+
+        # Sentence store and token caches are streamed shard by shard like everything else
+        sentences = SentenceStoreWriter(get_bi_encoder(state["model"]), kb_dir=staging) if sentence_store else None
+        chunk_tokens = sentence_tokens = None
+        if token_cache:
+            try:
+                chunk_tokens = TokenCacheWriter(cache_dir=path(TOKEN_CACHE_DIR))
+                sentence_tokens = TokenCacheWriter(SENTENCE_CACHED_MODELS, cache_dir=path(TOKEN_CACHE_DIR), unit="sentences") \
+                    if sentences else None
+            except Exception as e:
+                print(f"⚠️ Token cache skipped (models will tokenize evidence on the fly): {e}")
+                chunk_tokens = None
+        if sentences is None:
+            skipped.append("sentence_store")
+        if chunk_tokens is None:
+            skipped.append("token_cache")
+
+        # All vectors also go to one float16 memmap (disk, not RAM): the document tier reads it, and for a
+        # compressed index it stays next to the index as the full-precision copy for re-scoring.
+        # Metadata is appended to corpus_metadata.pkl one pickled shard at a time (see load_metadata).
+        vectors_path = path(FULL_VECTORS_FILE) if compressed else os.path.join(work_dir, "embeddings.npy")
+        all_vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float16, shape=(total, dim))
+        sources, row = set(), 0
+        with open(path(METADATA_FILE), "wb") as meta:
+            for vectors, shard_docs in _iter_shards(work_dir, state):
+                index.add(np.asarray(vectors, dtype=np.float32))
+                all_vectors[row:row + len(vectors)] = vectors
+                row += len(vectors)
+                pickle.dump(shard_docs, meta)
+                sources.update(s for d in shard_docs for s in chunk_sources(d))
+                if bm25:
+                    tokenized_corpus.extend(simple_tokenize(d["text"]) for d in shard_docs)
+                texts = [d["text"] for d in shard_docs]
+                if sentences is not None:
+                    shard_sentences = sentences.add(texts)
+                    if sentence_tokens is not None:
+                        sentence_tokens.add(shard_sentences)
+                if chunk_tokens is not None:
+                    chunk_tokens.add(texts)
+                print(f"   🧱 {row:,}/{total:,} vectors added")
+        all_vectors.flush()
+        for writer in (sentences, chunk_tokens, sentence_tokens):
+            if writer is not None:
+                writer.close()
+        faiss.write_index(index, path(INDEX_FILE))
+
+        with open(path(SOURCES_FILE), "w") as f:
+            json.dump(sorted(sources), f)
+        with open(path(DEDUP_STATS_FILE), "w") as f:
+            json.dump(dedup_stats(_iter_docs(work_dir, state)), f)
+
+        if bm25:
+            from rank_bm25 import BM25Okapi
+            with open(path(BM25_FILE), "wb") as f:
+                pickle.dump(BM25Okapi(tokenized_corpus), f)
+        else:
+            print(f"⚠️ BM25 skipped for {total:,} chunks (retrieval uses the vector + entity lanes)")
+
+        build_entity_index(_iter_docs(work_dir, state), kb_dir=staging)
+        build_document_index(_iter_docs(work_dir, state), all_vectors, tokenized_corpus, kb_dir=staging)
+
+        # A previous index's files for skipped parts would not line up with these chunks: publishing removes them
+        if skipped:
+            print(f"⚠️ Not built: {', '.join(skipped)} (recorded in the manifest)")
+        publish_index(staging, root, num_chunks=total, embedding=embedding_info(state["model"], dim=dim), skipped=skipped)
+    finally:
+        discard_build(staging)
+    print(f"✅ Index ready: {total:,} chunks ({built})")
+    return built
@@ -0,0 +1,71 @@
+import re
+from src.evidence_narrowing import split_sentence_spans
+
+# Sentence-aware chunking.
+# Whole sentences are packed into a chunk until it would exceed a token budget; the next chunk
+# repeats the last CHUNK_OVERLAP_SENTENCES sentences for context. Unlike the old 500/100 character
+# window this never cuts a word or sentence and duplicates far less text.
+#
+# Budget: all-mpnet-base-v2 embeds 384 word pieces and the cross-encoders see 512 for claim + chunk.
+# 160 "tokens" (words + punctuation, ~1.2 word pieces each) keeps a chunk inside every model
+# with room for the claim. Embedding models with a shorter window get a smaller budget
+# (embedding_models.chunk_token_budget); CHUNK_TOKEN_BUDGET is the cross-encoder cap.
+
+CHUNK_TOKEN_BUDGET = 160
+WORD_PIECES_PER_TOKEN = 1.2
+CHUNK_OVERLAP_SENTENCES = 1
+MIN_CHUNK_CHARS = 50   # Same floor as the old sliding window
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Cheap tokenizer-free token estimate (words + punctuation marks)."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _split_long_sentence(sentence, budget):
+    # A single sentence over budget (tables, run-on PDF text) is cut at word boundaries
+    words = sentence.split()
+    pieces, current, size = [], [], 0
+    for word in words:
+        n = count_tokens(word)
+        if current and size + n > budget:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += n
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text, budget=CHUNK_TOKEN_BUDGET, overlap=CHUNK_OVERLAP_SENTENCES, min_chars=MIN_CHUNK_CHARS):
+    """Splits text into chunks of whole sentences, each at most `budget` tokens."""
+    text = " ".join(text.split())
+    sentences = []
+    for start, end in split_sentence_spans(text):
+        sentence = text[start:end]
+        n = count_tokens(sentence)
+        if n > budget:
+            sentences.extend((piece, count_tokens(piece)) for piece in _split_long_sentence(sentence, budget))
+        else:
+            sentences.append((sentence, n))
+
+    chunks, current, size, fresh = [], [], 0, 0
+    for sentence, n in sentences:
+        if current and size + n > budget:
+            chunks.append(" ".join(s for s, _ in current))
+            # Carry the last `overlap` sentences over, as long as they leave room for this one
+            current = current[-overlap:] if overlap else []
+            while current and sum(c for _, c in current) + n > budget:
+                current = current[1:]
+            size, fresh = sum(c for _, c in current), 0
+        current.append((sentence, n))
+        size += n
+        fresh += 1
+
+    # The tail is only a new chunk if it has sentences beyond the carried-over overlap
+    if fresh:
+        chunks.append(" ".join(s for s, _ in current))
+    return [c for c in chunks if len(c) > min_chars]
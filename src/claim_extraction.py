@@ -1,63 +1,104 @@
-import spacy
+import re
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-import subprocess
-import sys
-
-# Global NLP model
-nlp = None
+from src.nlp_registry import get_nlp, sentence_doc, pipe_sentences
 
 @dataclass
 class Claim:
     id: int
     text: str
+    # Character span of the claim in the original answer text (first to last merged sentence)
+    start: int = None
+    end: int = None
+
+_BULLET_RE = re.compile(r"^[\s*\-•#>]+")
+_TRAILING_RE = re.compile(r"[\s.!?;:,*\-•]+$")
+
+def canonical_claim_text(text: str) -> str:
+    """Key used to collapse repeated claims: no bullets/trailing punctuation, lowercase, single spaces."""
+    text = _TRAILING_RE.sub("", _BULLET_RE.sub("", text))
+    return " ".join(text.lower().split())
 
 def get_spacy_model():
-    global nlp
-    if nlp is None:
-        try: 
-            nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            print("Downloading SpaCy model...")
-            subprocess.run([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
-            nlp = spacy.load("en_core_web_sm")
-    return nlp
+    # Shared with the symbolic verifier (src/nlp_registry.py)
+    return get_nlp()
 
-def extract_claims(text: str, api_key: str = None) -> list[Claim]:
-    # 1. Light Preprocessing: Remove bold/italic markers but keep structure
-    clean_text = text.replace("**", "").replace("__", "")
-    
-    # 2. Use SpaCy for initial splitting
-    doc = get_spacy_model()(clean_text)
-    raw_sents = [s.text.strip() for s in doc.sents if s.text.strip()]
-    
+def _clean(text):
+    """
+    Light Preprocessing: Remove bold/italic markers but keep structure.
+    Returns the cleaned text and the cleaned-text positions where a marker was removed,
+    so offsets can be mapped back to the original text.
+    """
+    if "**" not in text and "__" not in text:
+        return text, []
+    parts, removed, pos, i, n = [], [], 0, 0, len(text)
+    while i < n:
+        j = min((k for k in (text.find("**", i), text.find("__", i)) if k != -1), default=n)
+        parts.append(text[i:j])
+        pos += j - i
+        if j < n:
+            removed.append(pos)
+        i = j + 2
+    return "".join(parts), removed
+
+def _claims_from_doc(doc, removed):
+    # Sentence spans (stripped), in cleaned-text offsets
+    sents = []
+    for s in doc.sents:
+        t = s.text
+        stripped = t.strip()
+        if stripped:
+            start = s.start_char + len(t) - len(t.lstrip())
+            sents.append((stripped, start, start + len(stripped)))
+
+    # Each claim is a list of sentences, joined once at the end (no string growing in the loop)
     merged_claims = []
-    buffer = ""
-    
-    for sent in raw_sents:
-        # Heuristic: If sentence is too short (< 20 chars) or ends with a colon (Header), 
+    buffer = []
+
+    for sent in sents:
+        text = sent[0]
+        # Heuristic: If sentence is too short (< 20 chars) or ends with a colon (Header),
         # it is likely a fragment/header -> Convert to context for next sentence OR append to previous.
-        
-        is_short = len(sent) < 20
-        is_header = sent.endswith(":")
-        is_bullet = sent.startswith("*") or sent.startswith("-")
+
+        is_short = len(text) < 20
+        is_header = text.endswith(":")
+        is_bullet = text.startswith("*") or text.startswith("-")
 
         if is_short or is_header or is_bullet:
-            if buffer:
-                buffer += " " + sent
-            else:
-                buffer = sent
+            buffer.append(sent)
         else:
-            if buffer:
-                # Attach buffer to this sentence (Context + Claim)
-                merged_claims.append(buffer + " " + sent)
-                buffer = ""
-            else:
-                merged_claims.append(sent)
-    
+            # Attach buffer to this sentence (Context + Claim)
+            buffer.append(sent)
+            merged_claims.append(buffer)
+            buffer = []
+
     # If anything left in buffer, append it to the last claim if possible
     if buffer and merged_claims:
-        merged_claims[-1] += " " + buffer
+        merged_claims[-1].extend(buffer)
     elif buffer:
         merged_claims.append(buffer)
 
-    return [Claim(i, t) for i, t in enumerate(merged_claims)]
\ No newline at end of file
+    # Map cleaned offsets back to the original text (each removed marker was 2 chars).
+    # A marker removed right at a claim's start comes before it, one right at its end comes after it.
+    return [
+        Claim(i, " ".join(s[0] for s in parts),
+              parts[0][1] + 2 * bisect_right(removed, parts[0][1]),
+              parts[-1][2] + 2 * bisect_left(removed, parts[-1][2]))
+        for i, parts in enumerate(merged_claims)
+    ]
+
+def extract_claims(text: str, api_key: str = None) -> list[Claim]:
+    clean_text, removed = _clean(text)
+
+    # Use SpaCy for initial splitting (sentence boundaries only, no tagger/parser/NER)
+    return _claims_from_doc(sentence_doc(clean_text), removed)
+
+def extract_claims_batch(texts, batch_size: int = 64, n_process: int = 1) -> list[list[Claim]]:
+    """
+    extract_claims for many answers: texts are streamed through the sentence-only pipeline
+    with nlp.pipe. n_process > 1 (or -1 for all cores) splits the work across processes.
+    Returns one list of Claims per input text, in order.
+    """
+    cleaned = [_clean(t) for t in texts]
+    docs = pipe_sentences((c for c, _ in cleaned), batch_size=batch_size, n_process=n_process)
+    return [_claims_from_doc(doc, removed) for doc, (_, removed) in zip(docs, cleaned)]
@@ -0,0 +1,118 @@
+import os
+import pickle
+import numpy as np
+from src.near_dedup import chunk_sources
+
+# Two-tier (document -> chunk) retrieval for large knowledge bases.
+# Tier 1 ranks documents (one per `source`, i.e. per PDF page / TXT / JSON source) with their own
+# embeddings + BM25; tier 2 runs the normal chunk-level search only inside the top documents.
+# Document embeddings are the mean of their chunk embeddings, so building them costs no encoding.
+# The per-document chunk id ranges also back source-filtered retrieval (retrieve(..., sources=[...])).
+
+DOC_INDEX_FILE = "document_index.faiss"
+DOC_META_FILE = "document_index.pkl"
+
+TOP_DOCS = 20                      # Documents whose chunks are searched (profile: "top_docs")
+HIERARCHICAL_MIN_CHUNKS = 50_000   # Below this, flat search is fast enough and loses no recall
+
+
+def build_document_index(docs, embeddings, tokenized_corpus=None, block_size=65536, kb_dir="."):
+    """
+    docs: chunk metadata (with "source" / "sources"), any iterable read once; embeddings: L2-normalized chunk vectors
+    (may be a float16 memmap, read block_size rows at a time);
+    tokenized_corpus: BM25 tokens per chunk (None = document tier ranks by vectors only).
+    """
+    import faiss
+    from rank_bm25 import BM25Okapi
+
+    # (document, chunk) memberships; a deduplicated chunk belongs to every one of its sources
+    memberships, num_chunks = [], 0
+    for chunk, d in enumerate(docs):
+        memberships.extend((s, chunk) for s in chunk_sources(d))
+        num_chunks = chunk + 1
+    sources = sorted({s for s, _ in memberships})
+    doc_of = {s: i for i, s in enumerate(sources)}
+    pairs = [(doc_of[s], chunk) for s, chunk in memberships]
+    del memberships
+    pair_doc = np.asarray([p[0] for p in pairs], dtype=np.int64)
+    pair_chunk = np.asarray([p[1] for p in pairs], dtype=np.int64)
+
+    # Chunks grouped by document: document i owns chunk_ids[offsets[i]:offsets[i + 1]]
+    order = np.argsort(pair_doc, kind="stable")
+    chunk_ids = pair_chunk[order]
+    offsets = np.searchsorted(pair_doc[order], np.arange(len(sources) + 1)).astype(np.int64)
+
+    doc_vectors = np.zeros((len(sources), embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, len(pairs), block_size):
+        block = slice(start, start + block_size)
+        np.add.at(doc_vectors, pair_doc[block], np.asarray(embeddings[pair_chunk[block]], dtype=np.float32))
+    faiss.normalize_L2(doc_vectors)
+    index = faiss.IndexFlatIP(doc_vectors.shape[1])
+    index.add(doc_vectors)
+    faiss.write_index(index, os.path.join(kb_dir, DOC_INDEX_FILE))
+
+    bm25 = None
+    if tokenized_corpus is not None:
+        doc_tokens = [[] for _ in sources]
+        for doc, chunk in pairs:
+            doc_tokens[doc].extend(tokenized_corpus[chunk])
+        bm25 = BM25Okapi(doc_tokens)
+
+    with open(os.path.join(kb_dir, DOC_META_FILE), 'wb') as f:
+        pickle.dump({
+            "num_chunks": num_chunks,
+            "sources": sources,
+            "chunk_ids": chunk_ids,
+            "offsets": offsets,
+            "bm25": bm25,
+        }, f)
+    print(f"📚 Document index: {len(sources)} documents over {num_chunks} chunks")
+
+
+class DocumentIndex:
+    def __init__(self, index, meta):
+        self.index = index
+        self.sources = meta["sources"]
+        self.chunk_ids = meta["chunk_ids"]
+        self.offsets = meta["offsets"]
+        self.bm25 = meta["bm25"]
+        self.num_chunks = meta["num_chunks"]
+
+    @classmethod
+    def load(cls, kb_dir="."):
+        """Returns None if the document tier was not built."""
+        index_path, meta_path = os.path.join(kb_dir, DOC_INDEX_FILE), os.path.join(kb_dir, DOC_META_FILE)
+        if not os.path.exists(index_path) or not os.path.exists(meta_path):
+            return None
+        try:
+            import faiss
+            with open(meta_path, 'rb') as f:
+                meta = pickle.load(f)
+            return cls(faiss.read_index(index_path), meta)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable document index: {e}")
+            return None
+
+    def top_documents(self, query_vec, tokenized_query, top_docs=TOP_DOCS):
+        """Document ids ranked by RRF of document-vector and document-BM25 search."""
+        depth = min(top_docs, len(self.sources))
+        _, v_indices = self.index.search(query_vec, depth)
+        bm25_indices = np.argsort(self.bm25.get_scores(tokenized_query))[::-1][:depth] if self.bm25 is not None else []
+
+        scores = {}
+        for indices, weight in ((v_indices[0], 1.0), (bm25_indices, 1.5)):
+            for rank, idx in enumerate(indices):
+                if idx == -1: continue
+                scores[idx] = scores.get(idx, 0.0) + weight / (60 + rank)
+        return [int(idx) for idx, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:depth]]
+
+    def documents_for_sources(self, sources):
+        """Document ids for source names. A file name also selects its pages ("a.pdf" -> "a.pdf (Page 3)")."""
+        wanted = set(sources)
+        return [i for i, s in enumerate(self.sources) if s in wanted or s.split(" (Page ")[0] in wanted]
+
+    def chunks_of(self, doc_ids):
+        """Chunk ids belonging to the given documents."""
+        if not doc_ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.chunk_ids[self.offsets[d]:self.offsets[d + 1]] for d in doc_ids])
@@ -0,0 +1,68 @@
+import os
+import threading
+from src.chunker import CHUNK_TOKEN_BUDGET, WORD_PIECES_PER_TOKEN
+from src.index_manifest import read_manifest
+from src.model_loader import load_bi_encoder
+
+# Embedding model registry.
+# The bi-encoder that built an index is recorded in the index manifest ("embedding": model, dimension,
+# normalization) and the retriever loads that model, so chunk and query vectors always come from the
+# same model. Any sentence-transformers model can be used; the registry lists the tested ones
+# (compare_embedding_models.py benchmarks them) with their download repo and limits.
+
+EMBEDDING_MODELS = {
+    # name: hub repo, dimension, max word pieces embedded (sets the chunk size, see chunk_token_budget)
+    "all-mpnet-base-v2": {"repo": "sentence-transformers/all-mpnet-base-v2", "dim": 768, "max_tokens": 384},
+    "all-MiniLM-L12-v2": {"repo": "sentence-transformers/all-MiniLM-L12-v2", "dim": 384, "max_tokens": 256},
+    "all-MiniLM-L6-v2": {"repo": "sentence-transformers/all-MiniLM-L6-v2", "dim": 384, "max_tokens": 256},
+    "multi-qa-MiniLM-L6-cos-v1": {"repo": "sentence-transformers/multi-qa-MiniLM-L6-cos-v1", "dim": 384, "max_tokens": 512},
+    "paraphrase-MiniLM-L3-v2": {"repo": "sentence-transformers/paraphrase-MiniLM-L3-v2", "dim": 384, "max_tokens": 128},
+}
+
+# Indexes built before the manifest recorded the model were all built with this one
+LEGACY_EMBEDDING_MODEL = "all-mpnet-base-v2"
+# Model for new knowledge bases (uploads to an existing one keep its model)
+DEFAULT_EMBEDDING_MODEL = os.environ.get("HRM_EMBEDDING_MODEL", LEGACY_EMBEDDING_MODEL)
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def embedding_dimension(model):
+    dim = getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension
+    return dim()
+
+
+def embedding_info(model_name, model=None, dim=None):
+    """Manifest entry for an index built with `model_name` (vectors are always L2-normalized)."""
+    if dim is None:
+        dim = embedding_dimension(model) if model is not None else EMBEDDING_MODELS.get(model_name, {}).get("dim")
+    return {"model": model_name, "dim": int(dim) if dim else None, "normalize": True}
+
+
+def index_embedding(root=".", manifest=None):
+    """Embedding model recorded for the index in `root` (the legacy model for older indexes)."""
+    manifest = read_manifest(root) if manifest is None else manifest
+    # Older indexes have no recorded dimension, so the retriever's dimension check is skipped for them
+    return manifest.get("embedding") or {"model": LEGACY_EMBEDDING_MODEL, "dim": None, "normalize": True}
+
+
+def chunk_token_budget(model_name):
+    """
+    Chunk size (src/chunker.py tokens) for an index embedded with `model_name`: at most half of the
+    model's window in estimated word pieces, and never above the cross-encoder cap CHUNK_TOKEN_BUDGET.
+    Models outside the registry get the cap.
+    """
+    max_tokens = EMBEDDING_MODELS.get(model_name, {}).get("max_tokens")
+    if not max_tokens:
+        return CHUNK_TOKEN_BUDGET
+    return min(CHUNK_TOKEN_BUDGET, int(max_tokens / 2 / WORD_PIECES_PER_TOKEN))
+
+
+def get_bi_encoder(model_name, backend="torch"):
+    """Loads a bi-encoder once per process; knowledge bases built with the same model share it."""
+    with _loaded_lock:
+        key = (model_name, backend)
+        if key not in _loaded:
+            _loaded[key] = load_bi_encoder(model_name, backend=backend)
+        return _loaded[key]
@@ -0,0 +1,168 @@
+import os
+import pickle
+import re
+import numpy as np
+
+# Entity inverted index (third retrieval lane).
+# Claims with specific numbers/dates/IDs ("Established in 1990") often rank the chunk that
+# contradicts them below dozens of similar-sounding chunks, so the symbolic verifier never sees it.
+# At index time we map every chunk's normalized entity values and units to chunk ids; at query
+# time chunks sharing the claim's entity type (and subject, via BM25 overlap) get an RRF lane.
+#
+# Posting keys:
+#   "DATE"             chunks with any DATE entity (same entity type)
+#   "DATE=1990"        chunks with that exact normalized value
+#   "=1990"            the value under any label (spaCy mixes up CARDINAL/DATE on bare numbers)
+#   "QUANTITY~hour"    chunks with that unit
+
+ENTITY_INDEX_FILE = "entity_index.pkl"
+
+ENTITY_LANE_K = 20        # Chunks contributed by the entity lane per query
+ENTITY_LANE_WEIGHT = 1.0  # RRF weight (vector = 1.0, BM25 = 1.5)
+ENTITY_SUBJECT_TOP_N = 1000  # Best BM25 matches checked for the query's entity type (beyond exact value/unit hits)
+
+# spaCy labels bare numbers inconsistently ("in 1850" -> CARDINAL, "in 1889" -> DATE)
+_SAME_TYPE = {"CARDINAL": ("CARDINAL", "DATE"), "DATE": ("DATE", "CARDINAL")}
+
+_UNIT_RE = re.compile(r"[a-z]+|[$€£%]")
+# Words inside an entity span that are not units ("about 3 million days" -> "day")
+_NON_UNITS = {
+    "a", "an", "the", "about", "around", "approximately", "over", "under", "nearly", "almost", "roughly",
+    "more", "less", "than", "up", "to", "at", "least", "most", "of", "and", "or", "per", "some", "only",
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+    "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty", "thirty",
+    "forty", "fifty", "sixty", "seventy", "eighty", "ninety", "hundred", "thousand", "million", "billion",
+    "point", "k", "m", "bn",
+}
+
+
+def normalize_value(val):
+    """Canonical string for an entity value: 1990.0 -> "1990", "July 1969" -> "july 1969"."""
+    if isinstance(val, (int, float)):
+        return format(float(val), ".10g")
+    return " ".join(str(val).lower().split())
+
+
+def entity_unit(text):
+    """Unit of an entity span ("72 hours" -> "hour", "$10M" -> "$"), or None."""
+    units = [u for u in _UNIT_RE.findall(text.lower()) if u not in _NON_UNITS]
+    if not units:
+        return None
+    unit = units[-1]
+    return unit[:-1] if len(unit) > 3 and unit.endswith("s") else unit
+
+
+def entity_keys(entities):
+    """All posting keys for a list of {"val", "text", "label"} entities."""
+    keys = set()
+    for ent in entities:
+        label, value = ent["label"], normalize_value(ent["val"])
+        keys.update((label, f"{label}={value}", f"={value}"))
+        unit = entity_unit(ent["text"])
+        if unit:
+            keys.add(f"{ent['label']}~{unit}")
+    return keys
+
+
+def build_entity_index(docs, kb_dir="."):
+    """
+    Writes the inverted index for docs that carry "entities" (see index_builder.annotate_entities).
+    docs: any iterable of chunk dicts (read once, e.g. streamed from bulk-ingest shards).
+    """
+    postings = {}
+    num_chunks = 0
+    for chunk_id, doc in enumerate(docs):
+        for key in entity_keys(doc.get("entities") or []):
+            postings.setdefault(key, []).append(chunk_id)
+        num_chunks = chunk_id + 1
+
+    index = {key: np.asarray(ids, dtype=np.int32) for key, ids in postings.items()}
+    with open(os.path.join(kb_dir, ENTITY_INDEX_FILE), 'wb') as f:
+        pickle.dump({"num_chunks": num_chunks, "postings": index}, f)
+    print(f"🔢 Entity index: {len(index)} keys over {num_chunks} chunks")
+
+
+class EntityIndex:
+    def __init__(self, postings, num_chunks):
+        self.postings = postings
+        self.num_chunks = num_chunks
+
+    @classmethod
+    def load(cls, num_chunks=None, kb_dir="."):
+        """Returns None if the index is missing or was built for a different corpus."""
+        path = os.path.join(kb_dir, ENTITY_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable entity index: {e}")
+            return None
+        if num_chunks is not None and data["num_chunks"] != num_chunks:
+            print("⚠️ Entity index is out of date with the index. Rebuild the index to enable the entity lane.")
+            return None
+        return cls(data["postings"], data["num_chunks"])
+
+    def lane(self, query_entities, subject_scores, k=ENTITY_LANE_K):
+        """
+        Ranked chunk ids for the entity lane.
+        Candidates share an entity type with the query; they are ordered by exact value match,
+        then unit match, then subject overlap (`subject_scores` = BM25 scores of the query).
+        Chunks without any subject overlap are dropped (no subject filter if subject_scores is None).
+        Only the exact-value and unit postings are read whole. Chunks that merely share the type
+        (a generic label like DATE posts most of the corpus) are looked up for the top
+        ENTITY_SUBJECT_TOP_N subject matches, so a query costs the same on any corpus size.
+        """
+        if not query_entities:
+            return []
+
+        empty = np.zeros(0, dtype=np.int32)
+        labels = {label for ent in query_entities for label in _SAME_TYPE.get(ent["label"], (ent["label"],))}
+        label_postings = [self.postings[label] for label in labels if label in self.postings]
+        if not label_postings:
+            return []
+
+        def same_type(ids):
+            hit = np.zeros(len(ids), dtype=bool)
+            for posting in label_postings:
+                hit |= _contains(posting, ids)
+            return ids[hit]
+
+        def with_subject(ids):
+            return ids[subject_scores[ids] > 0] if subject_scores is not None else ids
+
+        keys = entity_keys(query_entities)
+        values = [self.postings[key] for key in keys if "=" in key and key in self.postings]
+        units = [self.postings[key] for key in keys if "~" in key and key in self.postings]
+        values = np.unique(np.concatenate(values)) if values else empty
+        units = np.unique(np.concatenate(units)) if units else empty
+        candidates = with_subject(same_type(np.union1d(values, units)))
+
+        if len(candidates) < k:
+            # Same type, any value (e.g. the chunk that gives a different date): the best subject matches only
+            if subject_scores is not None:
+                top = min(ENTITY_SUBJECT_TOP_N, len(subject_scores))
+                subject_top = np.argpartition(-subject_scores, top - 1)[:top] if top else empty
+                typed = same_type(np.sort(with_subject(subject_top)))
+            else:
+                typed = np.unique(np.concatenate([posting[:ENTITY_SUBJECT_TOP_N] for posting in label_postings]))
+            candidates = np.union1d(candidates, typed)
+        if len(candidates) == 0:
+            return []
+
+        value_hit = _contains(values, candidates)
+        unit_hit = _contains(units, candidates)
+
+        # lexsort: last key is primary
+        subject = subject_scores[candidates] if subject_scores is not None else np.zeros(len(candidates))
+        order = np.lexsort((-subject, ~unit_hit, ~value_hit))
+        return candidates[order][:k].tolist()
+
+
+def _contains(sorted_ids, ids):
+    """Membership of ids in a sorted posting list (binary search, no pass over the posting)."""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return sorted_ids[pos] == ids
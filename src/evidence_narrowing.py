@@ -0,0 +1,161 @@
+import os
+import re
+import numpy as np
+from src.vector_store import NpyAppender
+
+# Sentence-level evidence narrowing.
+# NLI cost grows quadratically with input length, and a whole 500-char window (or a full TXT
+# paragraph) dilutes the entailment signal. At index time we store sentence boundaries and
+# sentence embeddings per chunk; at query time only the sentences most similar to the claim
+# (plus neighbours) are sent to the NLI model. The full chunk stays in the report.
+
+SENTENCE_SPANS_FILE = "sentence_spans.npy"       # (n_sentences, 2) char start/end inside the chunk
+SENTENCE_OFFSETS_FILE = "sentence_offsets.npy"   # chunk i -> sentence rows [off[i], off[i+1])
+SENTENCE_EMB_FILE = "sentence_embeddings.npy"    # (n_sentences, dim) float16, L2-normalized
+
+NARROW_TOP_N = 1        # Most similar sentences kept per chunk (1-3 is sensible)
+NARROW_NEIGHBOURS = 1   # Sentences kept on each side of a selected sentence
+
+# A sentence ends at . ! ? (plus closing quotes/brackets) followed by whitespace, or at end of text
+_SENTENCE_RE = re.compile(r'\S.*?(?:[.!?]+["\')\]]*(?=\s)|$)', re.S)
+
+
+def split_sentence_spans(text):
+    """Cheap regex sentence splitter. Returns [(start, end), ...] char spans."""
+    return [(m.start(), m.end()) for m in _SENTENCE_RE.finditer(text) if m.group().strip()]
+
+
+def build_sentence_store(passages, model, kb_dir=".", previous=None):
+    """
+    Splits every chunk into sentences and embeds them with the retrieval bi-encoder.
+    previous: (SentenceStore of the current index, its chunk id per passage or None). Unchanged chunks
+    copy their spans and embeddings from it, so an upload only encodes the new chunks' sentences.
+    Returns the number of sentences encoded.
+    """
+    store, old_ids = previous or (None, None)
+    spans, offsets, sentences = [], [0], []
+    new_rows, old_rows, old_src = [], [], []
+    for i, text in enumerate(passages):
+        old = old_ids[i] if store is not None else None
+        if old is not None:
+            start, end = int(store.offsets[old]), int(store.offsets[old + 1])
+            old_rows.extend(range(len(spans), len(spans) + end - start))
+            old_src.extend(range(start, end))
+            spans.extend(map(tuple, store.spans[start:end]))
+        else:
+            chunk_spans = split_sentence_spans(text)
+            new_rows.extend(range(len(spans), len(spans) + len(chunk_spans)))
+            spans.extend(chunk_spans)
+            sentences.extend(text[s:e] for s, e in chunk_spans)
+        offsets.append(len(spans))
+
+    encoded = model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False) if sentences else None
+    dim = encoded.shape[1] if encoded is not None else store.embeddings.shape[1] if old_src else 1
+    embeddings = np.zeros((len(spans), dim), dtype=np.float16)
+    if encoded is not None:
+        embeddings[new_rows] = encoded
+    if old_src:
+        embeddings[old_rows] = store.embeddings[old_src]
+
+    np.save(os.path.join(kb_dir, SENTENCE_SPANS_FILE), np.asarray(spans, dtype=np.int32).reshape(-1, 2))
+    np.save(os.path.join(kb_dir, SENTENCE_OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(kb_dir, SENTENCE_EMB_FILE), embeddings)
+    print(f"✂️ Sentence store: {len(spans)} sentences for {len(passages)} chunks ({len(sentences)} encoded)")
+    return len(sentences)
+
+
+class SentenceStoreWriter:
+    """
+    Same files as build_sentence_store, written one batch of chunks at a time (bulk ingestion,
+    where the corpus never fits in memory). add() returns the batch's sentence texts in row order.
+    """
+
+    def __init__(self, model, kb_dir="."):
+        self.model = model
+        self.kb_dir = kb_dir
+        self.spans = NpyAppender(os.path.join(kb_dir, SENTENCE_SPANS_FILE), np.int32, (2,))
+        self.embeddings = None   # Created with the first encoded batch (dimension of the model)
+        self.counts = []
+
+    def add(self, passages):
+        spans = [split_sentence_spans(text) for text in passages]
+        sentences = [text[s:e] for text, chunk_spans in zip(passages, spans) for s, e in chunk_spans]
+        self.counts.append(np.fromiter(map(len, spans), dtype=np.int64, count=len(spans)))
+        if sentences:
+            self.spans.append([span for chunk_spans in spans for span in chunk_spans])
+            encoded = self.model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+            if self.embeddings is None:
+                self.embeddings = NpyAppender(os.path.join(self.kb_dir, SENTENCE_EMB_FILE), np.float16, (encoded.shape[1],))
+            self.embeddings.append(encoded)
+        return sentences
+
+    def close(self):
+        self.spans.close()
+        if self.embeddings is None:
+            np.save(os.path.join(self.kb_dir, SENTENCE_EMB_FILE), np.zeros((0, 1), dtype=np.float16))
+        else:
+            self.embeddings.close()
+        counts = np.concatenate(self.counts) if self.counts else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        np.save(os.path.join(self.kb_dir, SENTENCE_OFFSETS_FILE), offsets)
+        print(f"✂️ Sentence store: {self.spans.rows:,} sentences for {len(counts):,} chunks")
+
+
+class SentenceStore:
+    def __init__(self, spans, offsets, embeddings):
+        self.spans = spans
+        self.offsets = offsets
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def sentence_texts(self, passages):
+        """Text of every sentence row (for the per-sentence token cache)."""
+        return [text[s:e] for i, text in enumerate(passages) for s, e in self.spans[self.offsets[i]:self.offsets[i + 1]]]
+
+    def previous_rows(self, previous, old_ids):
+        """Sentence row in `previous` (the store of the current index) per row of this one, None for new chunks."""
+        rows = []
+        for i, old in enumerate(old_ids):
+            n = int(self.offsets[i + 1] - self.offsets[i])
+            rows.extend(range(int(previous.offsets[old]), int(previous.offsets[old]) + n) if old is not None else [None] * n)
+        return rows
+
+    @classmethod
+    def load(cls, num_chunks=None, kb_dir="."):
+        """Returns None if the store is missing or was built for a different index."""
+        path = lambda name: os.path.join(kb_dir, name)
+        if not os.path.exists(path(SENTENCE_EMB_FILE)):
+            return None
+        try:
+            store = cls(np.load(path(SENTENCE_SPANS_FILE)), np.load(path(SENTENCE_OFFSETS_FILE)), np.load(path(SENTENCE_EMB_FILE), mmap_mode='r'))
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable sentence store: {e}")
+            return None
+        if num_chunks is not None and len(store.offsets) - 1 != num_chunks:
+            print("⚠️ Sentence store is out of date with the index. Rebuild the index to enable evidence narrowing.")
+            return None
+        return store
+
+    def narrow(self, chunk_id, text, query_vec, top_n=NARROW_TOP_N, neighbours=NARROW_NEIGHBOURS):
+        """
+        Returns (the part of chunk `chunk_id` most relevant to the (normalized) query vector, its sentence rows),
+        or None if narrowing would not shorten the chunk.
+        """
+        start, end = int(self.offsets[chunk_id]), int(self.offsets[chunk_id + 1])
+        n = end - start
+        if n <= top_n:
+            return None
+
+        sims = self.embeddings[start:end].astype(np.float32) @ query_vec
+        keep = set()
+        for best in np.argsort(-sims)[:top_n]:
+            keep.update(range(max(0, best - neighbours), min(n, best + neighbours + 1)))
+        if len(keep) == n:
+            return None
+
+        spans = self.spans[start:end]
+        rows = sorted(keep)
+        return " ".join(text[spans[i][0]:spans[i][1]] for i in rows), [start + int(i) for i in rows]
@@ -1,136 +1,366 @@
 import os
-# --- CRITICAL FIX FOR MACOS SEGFAULT ---
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
+# --- CRITICAL FIX FOR MACOS SEGFAULT (per-platform, see src/runtime_config.py) ---
+from src.runtime_config import apply_runtime_env, load_inference_profile
+apply_runtime_env()
 # ---------------------------------------
 
 import json
-import faiss
 import pickle
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from pypdf import PdfReader
-from rank_bm25 import BM25Okapi # New keyword searcher
 import re
+import numpy as np
+from src.token_cache import build_token_cache, TOKEN_CACHE_DIR, SENTENCE_CACHED_MODELS
+from src.evidence_narrowing import build_sentence_store, SentenceStore
+from src.entity_index import build_entity_index
+from src.document_index import build_document_index
+from src.chunker import chunk_text, CHUNK_TOKEN_BUDGET
+from src.near_dedup import ChunkDeduplicator, collapse_near_duplicates, chunk_sources, dedup_stats
+from src.vector_store import build_vector_index, index_format, load_full_vectors
+from src.knowledge_base import kb_dir, create_knowledge_base, load_metadata
+from src.index_manifest import begin_build, publish_index, discard_build
+from src.embedding_models import DEFAULT_EMBEDDING_MODEL, embedding_info, index_embedding, get_bi_encoder, chunk_token_budget
 
 # Constants
 INDEX_FILE = "vector_index.faiss"
 METADATA_FILE = "corpus_metadata.pkl"
 BM25_FILE = "bm25_index.pkl"
-# UPGRADE: Stronger embedding model (slower but much smarter)
-MODEL_NAME = 'all-mpnet-base-v2' 
+# Sorted list of sources, so listing the knowledge base never unpickles the whole corpus
+SOURCES_FILE = "corpus_sources.json"
+# Near-duplicate statistics for the Knowledge Base page (see src/near_dedup.py)
+DEDUP_STATS_FILE = "dedup_stats.json"
+# Embedding model for new knowledge bases (HRM_EMBEDDING_MODEL, see src/embedding_models.py).
+# The model that built an index is recorded in its manifest; uploads and the retriever use that one.
+MODEL_NAME = DEFAULT_EMBEDDING_MODEL
 
 def simple_tokenize(text):
     # Simple tokenizer for BM25
     return re.findall(r'\b\w+\b', text.lower())
 
-def extract_text_from_pdf(pdf_path):
-    reader = PdfReader(pdf_path)
-    text_chunks = []
-    
-    # Improved Chunking: Sliding Window (Overlap)
-    # 500 chars with 100 char overlap ensures we don't cut sentences in half
-    chunk_size = 500
-    overlap = 100
-    
-    for i, page in enumerate(reader.pages):
-        text = page.extract_text()
-        if text:
-            text = text.replace('\n', ' ').strip()
-            # Create sliding windows
-            for start in range(0, len(text), chunk_size - overlap):
-                end = start + chunk_size
-                chunk = text[start:end]
-                # Only keep chunks with actual content
-                if len(chunk) > 50:
-                    filename = os.path.basename(pdf_path).replace("temp_", "")
-                    text_chunks.append({
-                        "text": chunk,
-                        "source": f"{filename} (Page {i+1})"
-                    })
-    return text_chunks
-
-def build_index_from_documents(docs, model_name=MODEL_NAME):
+# --- PDF INGESTION ---
+# Pages are extracted by a process pool (PDF_PAGES_PER_TASK pages per task) and chunks are
+# yielded in page order as soon as their pages are done, so encoding starts before the last page
+# is read. Each worker parses the PDF once from the in-memory bytes (no temp file).
+PDF_PAGES_PER_TASK = 16
+PDF_POOL_MIN_PAGES = 32   # Smaller PDFs are not worth starting worker processes for
+PDF_TASKS_PER_WORKER = 2  # Page ranges queued ahead per worker (bounds the extracted text held in memory)
+INGEST_BATCH_SIZE = 256   # Chunks per encoder call while streaming an upload
+
+_pdf_reader = None
+
+def _init_pdf_worker(data):
+    global _pdf_reader
+    import io
+    from pypdf import PdfReader
+    _pdf_reader = PdfReader(io.BytesIO(data))
+
+def _extract_pages(page_range):
+    start, end = page_range
+    return [(i, _pdf_reader.pages[i].extract_text()) for i in range(start, end)]
+
+def chunk_page_text(text, filename, page_number, budget=CHUNK_TOKEN_BUDGET):
+    # Whole sentences packed up to the model token budget (see src/chunker.py)
+    return [{"text": chunk, "source": f"{filename} (Page {page_number})"} for chunk in chunk_text(text, budget=budget)]
+
+def txt_chunks(text, source="Text", budget=CHUNK_TOKEN_BUDGET):
+    # One or more sentence-packed chunks per paragraph
+    return [{"text": c, "source": source} for t in text.split('\n\n') if t for c in chunk_text(t, budget=budget, min_chars=0)]
+
+def source_file(source):
+    # "<file> (Page N)" for PDF chunks, "<file>" for TXT uploads
+    return source.split(" (Page ")[0]
+
+def iter_pdf_chunks(pdf, filename=None, workers=None, budget=CHUNK_TOKEN_BUDGET):
+    """
+    Yields chunk dicts of a PDF (path or bytes) in page order.
+    workers: extraction processes (None = all cores, 1 = in-process).
+    budget: chunk size in tokens (embedding_models.chunk_token_budget of the index's model).
+    """
+    import io
+    from pypdf import PdfReader
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        data = bytes(pdf)
+    else:
+        with open(pdf, "rb") as f:
+            data = f.read()
+        filename = filename or os.path.basename(pdf).replace("temp_", "")
+    filename = filename or "document.pdf"
+
+    num_pages = len(PdfReader(io.BytesIO(data)).pages)
+    ranges = [(i, min(i + PDF_PAGES_PER_TASK, num_pages)) for i in range(0, num_pages, PDF_PAGES_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+
+    if workers <= 1 or num_pages < PDF_POOL_MIN_PAGES:
+        _init_pdf_worker(data)
+        pages = (page for r in ranges for page in _extract_pages(r))
+        for i, text in pages:
+            if text:
+                yield from chunk_page_text(text, filename, i + 1, budget)
+        return
+
+    import multiprocessing as mp
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_pdf_worker, initargs=(data,)) as pool:
+        # At most PDF_TASKS_PER_WORKER page ranges per worker in flight, yielded in order: when the
+        # encoder is slower than extraction, extracted text doesn't pile up for the whole PDF
+        pending, todo = deque(), iter(ranges)
+        for r in todo:
+            pending.append(pool.submit(_extract_pages, r))
+            if len(pending) >= PDF_TASKS_PER_WORKER * workers:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            for r in todo:
+                pending.append(pool.submit(_extract_pages, r))
+                break
+            for i, text in pages:
+                if text:
+                    yield from chunk_page_text(text, filename, i + 1, budget)
+
+def extract_text_from_pdf(pdf_path, workers=None, budget=CHUNK_TOKEN_BUDGET):
+    return list(iter_pdf_chunks(pdf_path, workers=workers, budget=budget))
+
+def encode_stream(chunks, model, batch_size=INGEST_BATCH_SIZE):
+    """
+    Encodes chunks as they arrive, batch_size at a time (bounded buffering).
+    Returns (docs, L2-normalized float32 embeddings).
+    """
+    docs, parts, batch = [], [], []
+    encode_batch_size = load_inference_profile()["batch_sizes"]["embedding"]
+
+    def flush():
+        vecs = model.encode([d['text'] for d in batch], batch_size=encode_batch_size, convert_to_numpy=True, show_progress_bar=False)
+        parts.append(np.asarray(vecs, dtype=np.float32))
+        docs.extend(batch)
+        print(f"   ...encoded {len(docs)} chunks")
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+
+    if not parts:
+        # (sentence-transformers >= 5 renamed the dimension getter)
+        dim = (getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension)()
+        return docs, np.zeros((0, dim), dtype=np.float32)
+    embeddings = np.vstack(parts)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return docs, embeddings
+
+def annotate_entities(docs):
+    """
+    Stores the normalized MONEY/QUANTITY/CARDINAL/PERCENT/DATE/TIME values of every chunk
+    as doc["entities"] = [{"val", "text", "label"}, ...]. Chunks that already have them are skipped.
+    """
+    from src.symbolic_verifier import SymbolicVerifier
+    todo = [d for d in docs if "entities" not in d]
+    if not todo:
+        return
+    values = SymbolicVerifier().extract_values_batch([d['text'] for d in todo])
+    for d, vals in zip(todo, values):
+        d["entities"] = vals
+    print(f"🔢 Entity annotations: {len(todo)} chunks parsed")
+
+def build_index_from_documents(docs, model_name=None, embeddings=None, model=None, dedup=True, vector_format=None, kb=None, reuse=None):
+    """
+    kb: knowledge base name (None = the default one, see src/knowledge_base.py).
+    model_name: embedding model (None = MODEL_NAME).
+    embeddings: precomputed L2-normalized vectors for docs (e.g. streamed during upload).
+    model: already loaded bi-encoder for model_name.
+    dedup: collapse near-duplicate chunks first (False if the caller already did).
+    vector_format: "flat" / "fp16" / "int8" / "pq" (None = HRM_VECTOR_FORMAT, see src/vector_store.py).
+    reuse: (kb directory of the current index, its chunk count, its chunk id per doc or None). The sentence
+    store and token cache rows of those chunks are copied instead of being encoded / tokenized again.
+    """
     if not docs:
         print("No documents to index.")
         return
 
-    print(f"Indexing {len(docs)} passages...")
+    if dedup:
+        before = len(docs)
+        docs, keep = collapse_near_duplicates(docs)
+        if embeddings is not None:
+            embeddings = embeddings[keep]
+        if reuse is not None:
+            reuse = (reuse[0], reuse[1], [reuse[2][i] for i in keep])
+        print(f"🧬 Near-duplicates: {before - len(docs)} of {before} chunks collapsed")
+
+    # Everything is written to a staging directory and published atomically at the end,
+    # so a running pipeline never loads a half-written index (see src/index_manifest.py)
+    root = create_knowledge_base(kb)
+    staging = begin_build(root)
+    try:
+        path = lambda name: os.path.join(staging, name)
+        print(f"Indexing {len(docs)} passages...")
+        # Heavy deps are only imported when we actually build
+        import faiss
+        from rank_bm25 import BM25Okapi # New keyword searcher
     
-    # 1. Build Vector Index (Semantic)
-    model = SentenceTransformer(model_name)
-    passages = [d['text'] for d in docs]
-    embeddings = model.encode(passages, convert_to_numpy=True, show_progress_bar=True)
-    faiss.normalize_L2(embeddings)
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    index.add(embeddings)
-    faiss.write_index(index, INDEX_FILE)
+        # 1. Build Vector Index (Semantic)
+        model_name = model_name or MODEL_NAME
+        model = model or get_bi_encoder(model_name)
+        passages = [d['text'] for d in docs]
+        if embeddings is None:
+            batch_size = load_inference_profile()["batch_sizes"]["embedding"]
+            embeddings = model.encode(passages, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=True)
+            faiss.normalize_L2(embeddings)
+        index = build_vector_index(embeddings, vector_format, kb_dir=staging)
+        faiss.write_index(index, path(INDEX_FILE))
     
-    # 2. Build BM25 Index (Keyword) - NEW
-    tokenized_corpus = [simple_tokenize(doc) for doc in passages]
-    bm25 = BM25Okapi(tokenized_corpus)
+        # 2. Build BM25 Index (Keyword) - NEW
+        tokenized_corpus = [simple_tokenize(doc) for doc in passages]
+        bm25 = BM25Okapi(tokenized_corpus)
     
-    # Save Metadata & BM25
-    with open(METADATA_FILE, 'wb') as f:
-        pickle.dump(docs, f)
-        
-    with open(BM25_FILE, 'wb') as f:
-        pickle.dump(bm25, f)
-        
-    print("Hybrid Indexing complete.")
+        # 3. Numeric/date entities per chunk (the symbolic verifier then only parses the claim)
+        annotate_entities(docs)
 
-def process_uploaded_file(uploaded_file):
-    temp_path = f"temp_{uploaded_file.name}"
-    with open(temp_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    try:
-        data = []
-        if temp_path.endswith(".pdf"):
-            data = extract_text_from_pdf(temp_path)
-        elif temp_path.endswith(".json"):
-            with open(temp_path, "r") as f:
-                data = json.load(f)
-        else:
-            with open(temp_path, "r") as f:
-                text = f.read()
-                data = [{"text": t, "source": "Text"} for t in text.split('\n\n') if t]
-
-        # --- NEW LOGIC: APPEND TO INDEX ---
-        existing_docs = []
-        if os.path.exists(METADATA_FILE):
-             try:
-                 with open(METADATA_FILE, 'rb') as f:
-                     existing_docs = pickle.load(f)
-             except: pass
-        
-        # Check for duplicates (basic check by source filename)
-        # If we re-upload the same file, we should probably remove old chunks of that file first
-        # based on the source string starting with the filename.
-        new_filename = uploaded_file.name
-        
-        # Filter out old chunks of this file if present (Update logic)
-        existing_docs = [d for d in existing_docs if new_filename not in d['source']]
-        
-        # Combine
-        combined_docs = existing_docs + data
+        # Save Metadata & BM25
+        with open(path(METADATA_FILE), 'wb') as f:
+            pickle.dump(docs, f)
         
-        build_index_from_documents(combined_docs)
-        return len(combined_docs)
+        with open(path(BM25_FILE), 'wb') as f:
+            pickle.dump(bm25, f)
+
+        with open(path(SOURCES_FILE), 'w') as f:
+            json.dump(sorted({s for d in docs for s in chunk_sources(d)}), f)
+
+        with open(path(DEDUP_STATS_FILE), 'w') as f:
+            json.dump(dedup_stats(docs), f)
+
+        # Entity values/units -> chunk ids (third retrieval lane for numeric claims)
+        build_entity_index(docs, kb_dir=staging)
+
+        # Document-level tier (embeddings + BM25 per source) for two-tier retrieval on large corpora
+        build_document_index(docs, embeddings, tokenized_corpus, kb_dir=staging)
+
+        # 4. Sentence boundaries + embeddings for evidence narrowing before NLI
+        previous_store = SentenceStore.load(num_chunks=reuse[1], kb_dir=reuse[0]) if reuse else None
+        build_sentence_store(passages, model, kb_dir=staging, previous=(previous_store, reuse[2]) if previous_store else None)
+
+        # 5. Pre-tokenize chunks for the cross-encoders (reranker + NLI), and sentences for NLI on narrowed evidence
+        try:
+            build_token_cache(passages, cache_dir=path(TOKEN_CACHE_DIR),
+                              previous=(os.path.join(reuse[0], TOKEN_CACHE_DIR), reuse[1], reuse[2]) if reuse else None)
+            store = SentenceStore.load(kb_dir=staging)
+            build_token_cache(store.sentence_texts(passages), SENTENCE_CACHED_MODELS, cache_dir=path(TOKEN_CACHE_DIR), unit="sentences",
+                              previous=(os.path.join(reuse[0], TOKEN_CACHE_DIR), len(previous_store), store.previous_rows(previous_store, reuse[2]))
+                              if previous_store else None)
+        except Exception as e:
+            print(f"⚠️ Token cache skipped (models will tokenize evidence on the fly): {e}")
+
+        publish_index(staging, root, num_chunks=len(docs), embedding=embedding_info(model_name, dim=embeddings.shape[1]))
     finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        discard_build(staging)
+    print("Hybrid Indexing complete.")
+
+def _load_existing(exclude_filename, root="."):
+    """
+    Current chunks minus those of `exclude_filename`, with their stored vectors
+    (None if the vectors can't be reused and everything must be re-encoded), the index's vector format
+    and `reuse` for build_index_from_documents (root, current chunk count, current id of each kept chunk).
+    """
+    existing_docs = []
+    metadata_file, index_file = os.path.join(root, METADATA_FILE), os.path.join(root, INDEX_FILE)
+    if os.path.exists(metadata_file):
+         try:
+             existing_docs = load_metadata(metadata_file)
+         except: pass
+
+    # Re-uploading a file replaces its chunks (sources of exactly that file, any page).
+    # Chunks shared with other files (near-duplicates) stay, minus this file's source.
+    keep = []
+    for i, d in enumerate(existing_docs):
+        remaining = [s for s in chunk_sources(d) if source_file(s) != exclude_filename]
+        if not remaining:
+            continue
+        dropped = len(chunk_sources(d)) - len(remaining)
+        if dropped:
+            d["source"] = remaining[0]
+            d["duplicate_count"] = max(0, d.get("duplicate_count", 0) - dropped)
+            if len(remaining) > 1:
+                d["sources"] = remaining
+            else:
+                d.pop("sources", None)
+        keep.append(i)
+
+    vectors, vector_format = None, None
+    if existing_docs and os.path.exists(index_file):
+        import faiss
+        index = faiss.read_index(index_file)
+        vector_format = index_format(index)
+        full_vectors = load_full_vectors(index.ntotal, kb_dir=root)
+        if index.ntotal == len(existing_docs):
+            # Compressed codes only decode approximately: reuse the full-precision copy instead
+            if full_vectors is not None:
+                vectors = np.asarray(full_vectors[keep], dtype=np.float32)
+            elif vector_format == "flat":
+                vectors = index.reconstruct_n(0, index.ntotal)[keep]
+    return [existing_docs[i] for i in keep], vectors, vector_format, (root, len(existing_docs), keep)
+
+def process_uploaded_file(uploaded_file, kb=None):
+    # Read straight from the upload buffer (no temp file on disk)
+    name = uploaded_file.name
+    raw = uploaded_file.getvalue()
+
+    # --- APPEND TO INDEX ---
+    # Old chunks keep their vectors; only the new file is encoded, batch by batch as it is read.
+    # Near-duplicates of existing (or earlier new) chunks are merged before they are encoded.
+    existing_docs, existing_vectors, vector_format, reuse = _load_existing(name, kb_dir(kb))
+    # A knowledge base keeps the embedding model it was built with (and chunks sized for it)
+    model_name = index_embedding(kb_dir(kb))["model"] if existing_docs else MODEL_NAME
+    budget = chunk_token_budget(model_name)
+    model = get_bi_encoder(model_name)
 
-def get_indexed_files():
-    if not os.path.exists(METADATA_FILE):
+    if name.endswith(".pdf"):
+        data = iter_pdf_chunks(raw, filename=name, budget=budget)
+    elif name.endswith(".json"):
+        data = json.loads(raw)
+    else:
+        data = txt_chunks(raw.decode("utf-8", errors="replace"), source=name, budget=budget)
+    dedup = ChunkDeduplicator(existing_docs)
+    new_docs, new_vectors = encode_stream(dedup.filter(data), model)
+
+    # Combine
+    combined_docs = existing_docs + new_docs
+    embeddings = None
+    if not existing_docs:
+        # First upload (or the file replaced everything): nothing to combine, the streamed vectors are the index
+        embeddings = new_vectors
+    elif existing_vectors is not None and existing_vectors.shape[1] == new_vectors.shape[1]:
+        embeddings = np.vstack([existing_vectors, new_vectors])
+    # The knowledge base keeps its vector format across uploads
+    # Sentence store + token cache: only the new chunks are encoded / tokenized
+    reuse = (reuse[0], reuse[1], reuse[2] + [None] * len(new_docs))
+    build_index_from_documents(combined_docs, model_name=model_name, embeddings=embeddings, model=model, dedup=False,
+                               vector_format=vector_format, kb=kb, reuse=reuse)
+    return len(combined_docs)
+
+def get_dedup_stats(kb=None):
+    """Near-duplicate statistics of the current index (None for indexes built before dedup)."""
+    stats_file = os.path.join(kb_dir(kb), DEDUP_STATS_FILE)
+    if not os.path.exists(stats_file):
+        return None
+    with open(stats_file, 'r') as f:
+        return json.load(f)
+
+def get_indexed_files(kb=None):
+    metadata_file, sources_file = os.path.join(kb_dir(kb), METADATA_FILE), os.path.join(kb_dir(kb), SOURCES_FILE)
+    if not os.path.exists(metadata_file):
         return []
+
+    # Fast path: source list written at index time
+    if os.path.exists(sources_file):
+        with open(sources_file, 'r') as f:
+            return json.load(f)
     
-    with open(METADATA_FILE, 'rb') as f:
-        docs = pickle.load(f)
-    
+    docs = load_metadata(metadata_file)
+
     # Extract unique sources
     sources = set()
     for d in docs:
-        sources.add(d.get("source", "Unknown"))
+        sources.update(chunk_sources(d))
         
     return sorted(list(sources))
\ No newline at end of file
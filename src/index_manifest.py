@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from src.knowledge_base import INDEX_FILES, INDEX_DIRS
+
+# Versioned, atomically published index files.
+# A build writes every index file into a staging directory next to the live files. Publishing works
+# like a seqlock: the manifest is first rewritten with the new version and "publishing": true, then the
+# files are moved into place one by one (os.replace), then the final manifest is written.
+# Readers wait out a publish in progress, load the files, and keep them only if the manifest is
+# unchanged afterwards (see LocalRetriever.load_index), so they never mix files of two versions.
+# A changed version means a newer index is complete on disk and can be hot-loaded, while already
+# loaded (and memory-mapped) files stay valid for requests still running on the old snapshot.
+
+MANIFEST_FILE = "index_manifest.json"
+# A publish only moves files, so one still "publishing" after this long crashed midway
+PUBLISH_WAIT_SECONDS = 10
+# Staging directories of builds that were killed are removed by the next build after this long
+STAGING_MAX_AGE = 24 * 3600
+
+
+def read_manifest(root="."):
+    """The manifest of a knowledge base directory ({} for indexes built before manifests)."""
+    try:
+        with open(os.path.join(root, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def index_version(root="."):
+    return read_manifest(root).get("version")
+
+
+def wait_for_publish(root=".", timeout=PUBLISH_WAIT_SECONDS):
+    """The manifest of `root` once no publish is in progress (a crashed one is ignored after `timeout`)."""
+    manifest = read_manifest(root)
+    while manifest.get("publishing") and time.time() - manifest.get("publishing_since", 0) < timeout:
+        time.sleep(0.05)
+        manifest = read_manifest(root)
+    return manifest
+
+
+def begin_build(root="."):
+    """Fresh staging directory for a new index build inside `root` (see discard_build)."""
+    os.makedirs(root, exist_ok=True)
+    for name in os.listdir(root):
+        old = os.path.join(root, name)
+        if name.startswith(".staging-") and time.time() - os.path.getmtime(old) > STAGING_MAX_AGE:
+            shutil.rmtree(old, ignore_errors=True)
+    return tempfile.mkdtemp(prefix=".staging-", dir=root)
+
+
+def discard_build(staging):
+    """Removes the staging directory of a failed build (no-op once it was published)."""
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _write_manifest(root, staging, manifest):
+    tmp = os.path.join(staging, MANIFEST_FILE)
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(root, MANIFEST_FILE))
+
+
+def publish_index(staging, root=".", **info):
+    """
+    Moves a finished build from `staging` into `root`, removes index files the new build no longer
+    has, and writes the manifest (version + `info`) last. Returns the manifest.
+    """
+    built = set(os.listdir(staging))
+    manifest = dict(info, version=(index_version(root) or 0) + 1, built_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    files=sorted(built))
+    # Readers that started on the old version see the change, new readers wait until the end
+    _write_manifest(root, staging, dict(manifest, publishing=True, publishing_since=time.time()))
+
+    for name in built:
+        src, dst = os.path.join(staging, name), os.path.join(root, name)
+        if os.path.isdir(src):
+            os.makedirs(dst, exist_ok=True)
+            files = set(os.listdir(src))
+            for f in files:
+                os.replace(os.path.join(src, f), os.path.join(dst, f))
+            for f in set(os.listdir(dst)) - files:
+                os.remove(os.path.join(dst, f))
+        else:
+            os.replace(src, dst)
+
+    # Left over from an earlier build of a different shape (e.g. vector_full.npy of a compressed index)
+    for name in INDEX_FILES:
+        if name not in built and os.path.exists(os.path.join(root, name)):
+            os.remove(os.path.join(root, name))
+    for name in INDEX_DIRS:
+        if name not in built and os.path.exists(os.path.join(root, name)):
+            shutil.rmtree(os.path.join(root, name))
+
+    _write_manifest(root, staging, manifest)
+    discard_build(staging)
+    print(f"📦 Index version {manifest['version']} published")
+    return manifest
@@ -0,0 +1,374 @@
+import atexit
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+# Multi-core CPU inference worker pool.
+# Model calls are dispatched to N worker processes, each running its own copy of the models
+# with a fixed number of intra-op torch threads. Input/output tensors travel through shared
+# memory; only small task descriptors (and raw text) go through the queues.
+# Large calls are split into contiguous slices so one request can use every worker.
+# If a worker dies or a call exceeds TASK_TIMEOUT, the call is answered in-process by the
+# Pooled* wrapper and the pool restarts its workers for the next call.
+
+TASK_TIMEOUT = float(os.environ.get("HRM_INFERENCE_TIMEOUT", "300"))   # Seconds per pooled call
+LIVENESS_POLL = 1.0   # Seconds between worker liveness checks while results are pending
+MAX_RESTARTS = 3      # After this many restarts the pool is given up and everything runs in-process
+
+
+class InferencePoolError(RuntimeError):
+    """A pooled call could not be answered (worker died or timed out); the caller runs it in-process."""
+
+
+def _load_model(kind, spec, device='cpu'):
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+    from src.model_loader import _backend_kwargs
+    name, backend = spec
+    cls = SentenceTransformer if kind == "bi" else CrossEncoder
+    return cls(name, device=device, **_backend_kwargs(backend))
+
+
+def _pack(arrays):
+    """Copies a dict of numpy arrays into one shared-memory block. Returns (shm, spec)."""
+    spec, offset = [], 0
+    for key, arr in arrays.items():
+        spec.append((key, arr.dtype.str, arr.shape, offset))
+        offset += arr.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (key, _, _, start), arr in zip(spec, arrays.values()):
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf, offset=start)[...] = arr
+    return shm, spec
+
+
+def _views(shm, spec):
+    return {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=start) for key, dtype, shape, start in spec}
+
+
+def _worker_main(task_queue, result_queue, threads):
+    # Thread settings must be in place before torch is imported
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+    torch.set_num_threads(threads)
+
+    models = {}
+
+    def get_model(kind, spec):
+        if (kind, spec) not in models:
+            models[(kind, spec)] = _load_model(kind, spec)
+        return models[(kind, spec)]
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, op, kind, name, payload, out = task
+        try:
+            model = get_model(kind, name)
+            if op == "describe":
+                if kind == "bi":
+                    width = model.get_sentence_embedding_dimension()
+                else:
+                    width = model.config.num_labels
+                result_queue.put((task_id, None, width))
+                continue
+
+            if op == "encode":
+                texts, kwargs = payload
+                result = model.encode(texts, convert_to_numpy=True, show_progress_bar=False, **kwargs)
+            elif op == "predict":
+                pairs, kwargs = payload
+                result = model.predict(pairs, **kwargs)
+            elif op == "predict_features":
+                from src.token_cache import run_pair_features
+                in_name, spec, kwargs = payload
+                in_shm = shared_memory.SharedMemory(name=in_name)
+                try:
+                    features = {k: np.array(v) for k, v in _views(in_shm, spec).items()}
+                finally:
+                    in_shm.close()
+                result = run_pair_features(model, features, **kwargs)
+            else:
+                raise ValueError(f"Unknown op {op}")
+
+            # Write our rows straight into the caller's output block
+            out_name, row_offset = out
+            result = np.asarray(result, dtype=np.float32).reshape(len(result), -1)
+            out_shm = shared_memory.SharedMemory(name=out_name)
+            try:
+                np.ndarray(result.shape, dtype=np.float32, buffer=out_shm.buf, offset=row_offset * result[0].nbytes)[...] = result
+            finally:
+                out_shm.close()
+            result_queue.put((task_id, None, result.shape))
+        except Exception as e:
+            result_queue.put((task_id, f"{type(e).__name__}: {e}", None))
+
+
+class InferencePool:
+    def __init__(self, workers, threads_per_worker, timeout=TASK_TIMEOUT):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.timeout = timeout
+        self.restarts = 0
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._widths = {}
+        self._closed = False
+        self._start()
+        print(f"🧵 Inference pool: {workers} workers x {threads_per_worker} threads")
+
+    def _start(self):
+        ctx = mp.get_context("spawn")
+        self.task_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+        self.processes = [
+            ctx.Process(target=_worker_main, args=(self.task_queue, self.result_queue, self.threads_per_worker), daemon=True)
+            for _ in range(self.workers)
+        ]
+        for p in self.processes:
+            p.start()
+        # The collector is bound to this generation's queue/processes; a restart leaves it to exit on its own
+        self._collector = threading.Thread(target=self._collect, args=(self.result_queue, self.processes), daemon=True)
+        self._collector.start()
+
+    def _collect(self, result_queue, processes):
+        while processes is self.processes and not self._closed:
+            try:
+                msg = result_queue.get(timeout=LIVENESS_POLL)
+            except queue.Empty:
+                msg = ()
+            except (EOFError, OSError):
+                break   # Queue torn down at interpreter exit
+            if msg is None:
+                break
+            if msg:
+                task_id, error, result = msg
+                with self._lock:
+                    future = self._pending.pop(task_id, None)
+                if future is not None:
+                    if error:
+                        future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+                    else:
+                        future.set_result(result)
+            dead = [p for p in processes if not p.is_alive()]
+            if dead and processes is self.processes and not self._closed:
+                # The dead worker's task is lost and we cannot tell which one it was
+                self._fail_pending(self._take_pending(), f"inference worker exited (exit code {dead[0].exitcode})")
+                break
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    @staticmethod
+    def _fail_pending(pending, reason):
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(InferencePoolError(reason))
+
+    def healthy(self):
+        return self.restarts <= MAX_RESTARTS and all(p.is_alive() for p in self.processes)
+
+    def restart(self, processes=None):
+        """
+        Replaces all workers (after a crash or a hung call); their pending calls fail.
+        processes: the generation the caller saw fail; if another thread already replaced it, nothing happens.
+        """
+        with self._lock:
+            if processes is not None and processes is not self.processes:
+                return
+            old, pending, self._pending = self.processes, self._pending, {}
+            for p in old:
+                p.terminate()
+            for p in old:
+                p.join(timeout=5)
+                if p.is_alive():   # Hung hard (or stopped): SIGTERM is not enough
+                    p.kill()
+                    p.join(timeout=5)
+            self.restarts += 1
+            if self.restarts > MAX_RESTARTS:
+                self.processes = []
+                print(f"⚠️ Inference pool failed {self.restarts} times; running models in-process from now on")
+            else:
+                self._start()
+                print(f"🔁 Inference pool restarted ({self.restarts}x)")
+        self._fail_pending(pending, "inference pool restarted")
+
+    def _wait(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise InferencePoolError(f"pooled call took longer than {self.timeout:.0f}s") from None
+
+    def _submit(self, op, kind, name, payload=None, out=None):
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            self._pending[task_id] = future
+        self.task_queue.put((task_id, op, kind, name, payload, out))
+        return future
+
+    def output_width(self, kind, name):
+        """Embedding dimension / number of labels of a model (asked once, from a worker)."""
+        if (kind, name) not in self._widths:
+            self._widths[(kind, name)] = self._call(lambda: self._wait(self._submit("describe", kind, name)))
+        return self._widths[(kind, name)]
+
+    def _slices(self, n, min_rows):
+        # Contiguous slices, one per worker, but never smaller than a model batch
+        parts = max(1, min(self.workers, n // max(1, min_rows)))
+        bounds = np.linspace(0, n, parts + 1).astype(int)
+        return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def _call(self, fn):
+        # A dead or hung worker pool is replaced before the error reaches the caller
+        if self.restarts > MAX_RESTARTS:
+            raise InferencePoolError("inference pool disabled")
+        if not self.healthy():
+            self.restart(self.processes)
+        processes = self.processes
+        try:
+            return fn()
+        except InferencePoolError:
+            self.restart(processes)
+            raise
+
+    def run(self, op, kind, name, n, make_payload, batch_size=32):
+        """
+        Runs `op` over n rows split across workers; returns the (n, width) float32 output.
+        Raises InferencePoolError (after restarting the workers) if a worker died or the call timed out.
+        """
+        width = self.output_width(kind, name)
+        return self._call(lambda: self._run(op, kind, name, n, width, make_payload, batch_size))
+
+    def _run(self, op, kind, name, n, width, make_payload, batch_size):
+        out_shm = shared_memory.SharedMemory(create=True, size=max(n * width * 4, 1))
+        in_blocks = []
+        try:
+            futures = []
+            for start, end in self._slices(n, batch_size):
+                payload, in_shm = make_payload(start, end)
+                if in_shm is not None:
+                    in_blocks.append(in_shm)
+                futures.append(self._submit(op, kind, name, payload, (out_shm.name, start)))
+            for future in futures:
+                self._wait(future)
+            return np.array(np.ndarray((n, width), dtype=np.float32, buffer=out_shm.buf))
+        finally:
+            for shm in in_blocks + [out_shm]:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        self._closed = True
+        for _ in self.processes:
+            self.task_queue.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+        self.result_queue.put(None)
+
+
+class _InProcessFallback:
+    """Loads the in-process copy of a pooled model the first time the pool fails a call."""
+
+    def _fallback(self, kind, device=None):
+        if getattr(self, "_local", None) is None:
+            from src.model_loader import _configure_in_process
+            _configure_in_process()
+            print(f"⚠️ Running {self.model_name} in-process while the inference pool recovers")
+            self._local = _load_model(kind, self.spec, device=device)
+        return self._local
+
+
+class PooledSentenceTransformer(_InProcessFallback):
+    """SentenceTransformer stand-in whose encode() runs on the worker pool."""
+
+    def __init__(self, pool, model_name, backend="torch"):
+        self.pool = pool
+        self.model_name = model_name
+        # Workers key their loaded models by (name, backend)
+        self.spec = (model_name, backend)
+
+    def get_sentence_embedding_dimension(self):
+        try:
+            return self.pool.output_width("bi", self.spec)
+        except InferencePoolError:
+            return self._fallback("bi").get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        options = {"batch_size": batch_size, "normalize_embeddings": normalize_embeddings}
+        try:
+            out = self.pool.run("encode", "bi", self.spec, len(texts),
+                                lambda a, b: ((texts[a:b], options), None), batch_size=batch_size)
+        except InferencePoolError as e:
+            print(f"⚠️ Inference pool: {e}")
+            out = np.asarray(self._fallback("bi").encode(texts, convert_to_numpy=True, show_progress_bar=False, **options), dtype=np.float32)
+        return out[0] if single else out
+
+
+class PooledCrossEncoder(_InProcessFallback):
+    """CrossEncoder stand-in whose predict() runs on the worker pool. Tokenization stays in-process."""
+
+    def __init__(self, pool, model_name, max_length=None, backend="torch"):
+        from transformers import AutoTokenizer
+        self.pool = pool
+        self.model_name = model_name
+        self.spec = (model_name, backend)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = max_length or min(self.tokenizer.model_max_length, 512)
+
+    def predict(self, pairs, apply_softmax=False, batch_size=32, **kwargs):
+        options = {"apply_softmax": apply_softmax, "batch_size": batch_size}
+        try:
+            out = self.pool.run("predict", "cross", self.spec, len(pairs),
+                                lambda a, b: ((pairs[a:b], options), None), batch_size=batch_size)
+        except InferencePoolError as e:
+            print(f"⚠️ Inference pool: {e}")
+            return self._fallback("cross").predict(pairs, **options)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+    def predict_features(self, features, apply_softmax=False, batch_size=32):
+        """Runs prebuilt (token-cache) features; the int tensors go to the workers via shared memory."""
+        options = {"apply_softmax": apply_softmax, "batch_size": batch_size}
+        n = len(features["input_ids"])
+
+        def make_payload(a, b):
+            shm, spec = _pack({k: v[a:b] for k, v in features.items()})
+            return (shm.name, spec, options), shm
+
+        try:
+            out = self.pool.run("predict_features", "cross", self.spec, n, make_payload, batch_size=batch_size)
+        except InferencePoolError as e:
+            print(f"⚠️ Inference pool: {e}")
+            from src.token_cache import run_pair_features
+            return run_pair_features(self._fallback("cross"), features, **options)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_inference_pool():
+    """The process-wide pool, or None when inference runs in-process (inference_workers = 0)."""
+    global _POOL
+    from src.runtime_config import get_runtime_config
+    config = get_runtime_config()
+    if config["inference_workers"] <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = InferencePool(config["inference_workers"], config["worker_threads"])
+            atexit.register(_POOL.shutdown)
+    return _POOL
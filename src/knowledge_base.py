@@ -0,0 +1,196 @@
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# Named knowledge bases.
+# Every knowledge base is one directory of index files (vector index, metadata, BM25, entity and
+# document tiers, sentence store, token cache). The default knowledge base keeps the legacy location,
+# the working directory, so existing indexes keep working; named ones live under KB_ROOT/<name>.
+#
+# One process can serve many of them: KnowledgeBaseCache keeps the most recently used indexes loaded,
+# evicting the least recently used ones when their estimated footprint exceeds a memory budget.
+# Models are not part of a knowledge base and are shared by all of them.
+
+DEFAULT_KB = "default"
+KB_ROOT = os.environ.get("HRM_KB_ROOT", "knowledge_bases")
+KB_MEMORY_BUDGET_MB = float(os.environ.get("HRM_KB_MEMORY_MB", "4096"))
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# Files read fully into RAM when a knowledge base is loaded (the others are memory-mapped)
+RESIDENT_FILES = ["vector_index.faiss", "corpus_metadata.pkl", "bm25_index.pkl", "entity_index.pkl",
+                  "document_index.faiss", "document_index.pkl"]
+# Everything an index build writes into a knowledge base directory
+INDEX_FILES = RESIDENT_FILES + ["corpus_sources.json", "dedup_stats.json", "vector_full.npy",
+                                "sentence_spans.npy", "sentence_offsets.npy", "sentence_embeddings.npy"]
+INDEX_DIRS = ["token_cache"]
+
+# Live KnowledgeBaseCache instances: creating or clearing a knowledge base drops it from all of them
+_caches = weakref.WeakSet()
+
+
+def load_metadata(path):
+    """
+    Chunk metadata list of an index. Bulk ingestion writes it as one pickled list per shard
+    (so it never holds the whole corpus at once); other builds write a single list.
+    """
+    docs = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                docs.extend(pickle.load(f))
+            except EOFError:
+                return docs
+
+
+def is_default(name):
+    return name in (None, "", DEFAULT_KB)
+
+
+def kb_dir(name=None):
+    """Directory of a knowledge base ("." for the default one)."""
+    if is_default(name):
+        return "."
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Invalid knowledge base name {name!r} (letters, digits, '_', '-', '.'; max 64 chars)")
+    return os.path.join(KB_ROOT, name)
+
+
+def _invalidate_cached(name):
+    for cache in list(_caches):
+        cache.invalidate(name)
+
+
+def create_knowledge_base(name):
+    path = kb_dir(name)
+    if not os.path.isdir(path):
+        # A re-created name starts over at index version 1: a cached retriever of the old one must not look current
+        _invalidate_cached(name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def has_index(name=None):
+    return os.path.exists(os.path.join(kb_dir(name), "vector_index.faiss"))
+
+
+def list_knowledge_bases():
+    """The default knowledge base plus every directory under KB_ROOT."""
+    names = [DEFAULT_KB]
+    if os.path.isdir(KB_ROOT):
+        names += sorted(n for n in os.listdir(KB_ROOT) if _NAME_RE.match(n) and os.path.isdir(os.path.join(KB_ROOT, n)))
+    return names
+
+
+def clear_knowledge_base(name=None):
+    """Deletes the index files of a knowledge base (a named one is removed entirely)."""
+    path = kb_dir(name)
+    _invalidate_cached(name)
+    if not is_default(name):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        return
+    for f in INDEX_FILES:
+        if os.path.exists(os.path.join(path, f)):
+            os.remove(os.path.join(path, f))
+    for d in INDEX_DIRS:
+        if os.path.exists(os.path.join(path, d)):
+            shutil.rmtree(os.path.join(path, d))
+    if os.path.exists(os.path.join(path, "index_manifest.json")):
+        os.remove(os.path.join(path, "index_manifest.json"))
+
+
+def resident_bytes(name=None):
+    """Estimated RAM of a loaded knowledge base: the size of the files that are read fully."""
+    path = kb_dir(name)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in RESIDENT_FILES if os.path.exists(os.path.join(path, f)))
+
+
+class KnowledgeBaseCache:
+    """
+    LRU of loaded knowledge bases under a memory budget.
+    load(name) builds the loaded object; size(name) estimates its footprint in bytes;
+    stale(obj) says a newer index was published, so the entry is loaded again.
+    The most recently used knowledge base is never evicted, even if it alone exceeds the budget.
+    Evicted objects stay alive until in-flight requests holding them finish.
+    """
+
+    def __init__(self, load, budget_mb=KB_MEMORY_BUDGET_MB, size=resident_bytes, stale=None):
+        self._load = load
+        self._size = size
+        self._stale = stale
+        self.budget_bytes = int(budget_mb * 2**20)
+        self._entries = OrderedDict()   # name -> (object, bytes)
+        self._lock = threading.Lock()
+        self._loading = {}              # name -> lock, so one knowledge base is only loaded once
+        self.counters = {"hits": 0, "loads": 0, "reloads": 0, "evictions": 0, "load_seconds": 0.0}
+        _caches.add(self)
+
+    def _lookup(self, name):
+        # Caller holds self._lock. Returns the fresh cached object or None.
+        if name not in self._entries:
+            return None
+        obj = self._entries[name][0]
+        if self._stale is not None and self._stale(obj):
+            return None
+        self._entries.move_to_end(name)
+        self.counters["hits"] += 1
+        return obj
+
+    def get(self, name):
+        with self._lock:
+            obj = self._lookup(name)
+            if obj is not None:
+                return obj
+            name_lock = self._loading.setdefault(name, threading.Lock())
+
+        with name_lock:
+            with self._lock:
+                obj = self._lookup(name)   # Loaded by a concurrent request meanwhile
+                if obj is not None:
+                    return obj
+            start = time.perf_counter()
+            obj = self._load(name)
+            elapsed = time.perf_counter() - start
+            size = self._size(name)
+            with self._lock:
+                reload = name in self._entries
+                self._entries[name] = (obj, size)
+                self._entries.move_to_end(name)
+                self.counters["reloads" if reload else "loads"] += 1
+                self.counters["load_seconds"] += elapsed
+                self._loading.pop(name, None)
+                print(f"📂 Knowledge base '{name}' loaded in {elapsed:.2f}s ({size / 2**20:.1f} MB)")
+                self._evict()
+        return obj
+
+    def _evict(self):
+        while len(self._entries) > 1 and self.resident_bytes() > self.budget_bytes:
+            name, _ = self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+            print(f"♻️ Knowledge base '{name}' evicted (memory budget {self.budget_bytes / 2**20:.0f} MB)")
+
+    def invalidate(self, name):
+        """
+        Drops a knowledge base (called by create_knowledge_base / clear_knowledge_base); the next get()
+        loads it again. Entries cached under another name of the same directory (None / "default") go too.
+        """
+        path = kb_dir(name)
+        with self._lock:
+            for key in [k for k in self._entries if k == name or kb_dir(k) == path]:
+                del self._entries[key]
+
+    def resident_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters,
+                        resident=list(self._entries),
+                        resident_mb=self.resident_bytes() / 2**20,
+                        budget_mb=self.budget_bytes / 2**20)
@@ -0,0 +1,87 @@
+import time
+
+# Deadline mode for RiskAnalysisPipeline.process(..., deadline_ms=...).
+# Before each unique claim the remaining time is split over the claims still to check, and the
+# cheapest-first ladder below is walked down until the expected cost of a claim fits its share.
+# Levels only go down within a request. When not even the last level fits, the remaining claims
+# are returned unverified. Claim costs per level are learned across requests (moving average),
+# so the first claim of a request is planned with realistic numbers too.
+
+DEGRADATION_LEVELS = [
+    # name, retrieval candidates (None = profile initial_k), cross-encoder rerank, evidence per claim (None = profile k)
+    {"name": "full", "initial_k": None, "rerank": True, "k": None},
+    {"name": "shallow_candidates", "initial_k": 15, "rerank": True, "k": None},
+    {"name": "no_rerank", "initial_k": 15, "rerank": False, "k": None},
+    {"name": "min_evidence", "initial_k": 10, "rerank": False, "k": 1},
+]
+
+# Expected cost of a level relative to the level above it, until it has been measured
+LEVEL_SPEEDUP = 0.5
+# Weight of the newest measurement in the moving average of claim costs
+COST_SMOOTHING = 0.3
+
+NOT_VERIFIED_LABEL = "Not verified (budget)"
+
+
+def not_verified_analysis():
+    """Analysis of a claim skipped because the deadline ran out."""
+    return {"score": 0.0, "risk_label": NOT_VERIFIED_LABEL, "color": "orange",
+            "contradiction_strength": 0, "entailment_strength": 0, "budget_skipped": True}
+
+
+class LatencyBudget:
+    def __init__(self, deadline_ms, claim_costs):
+        """claim_costs: {level: seconds per claim}, shared by the pipeline across requests."""
+        self.deadline_ms = deadline_ms
+        self.start = time.perf_counter()
+        self.end = self.start + deadline_ms / 1000
+        self.claim_costs = claim_costs
+        self.level = 0
+        self.degradations = []
+        self.unverified = 0
+
+    def remaining(self):
+        return self.end - time.perf_counter()
+
+    def expected_cost(self, level):
+        if not self.claim_costs:
+            return 0.0  # Nothing measured yet: try it
+        # Extrapolated from the nearest measured level (exact when this one was measured)
+        nearest = min(self.claim_costs, key=lambda lvl: abs(lvl - level))
+        return self.claim_costs[nearest] * LEVEL_SPEEDUP ** (level - nearest)
+
+    def plan(self, claims_left):
+        """Settings for the next claim (a DEGRADATION_LEVELS entry), or None = out of time."""
+        remaining = self.remaining()
+        share = remaining / max(claims_left, 1)
+        level = self.level
+        while level < len(DEGRADATION_LEVELS) - 1 and self.expected_cost(level) > share:
+            level += 1
+        # The last level may overrun its share, but only if one claim still fits in what is left
+        if remaining <= 0 or self.expected_cost(level) > remaining:
+            return None
+        for lvl in range(self.level + 1, level + 1):
+            self.degradations.append(DEGRADATION_LEVELS[lvl]["name"])
+        self.level = level
+        return DEGRADATION_LEVELS[level]
+
+    def record(self, seconds):
+        """Measured cost of the claim just checked at the current level."""
+        old = self.claim_costs.get(self.level)
+        self.claim_costs[self.level] = seconds if old is None else old + COST_SMOOTHING * (seconds - old)
+
+    def skip(self):
+        if "partial_results" not in self.degradations:
+            self.degradations.append("partial_results")
+        self.unverified += 1
+
+    def report(self):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "met": elapsed_ms <= self.deadline_ms,
+            "level": DEGRADATION_LEVELS[self.level]["name"],
+            "degradations": list(self.degradations),
+            "unverified_claims": self.unverified,
+        }
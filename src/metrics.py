@@ -0,0 +1,269 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Per-stage timings of the verification hot path.
+# Code on the hot path wraps each stage in `with stage("nli", items=len(pairs)):` and counts cache hits
+# with count("token_cache_hits", n). Inside RiskAnalysisPipeline.process the numbers go to the request's
+# RequestTimings (returned in stats["timings"]); every stage is also observed into the process-wide
+# histograms of METRICS, exported in the Prometheus text format (METRICS.prometheus_text(), or an
+# HTTP endpoint on HRM_METRICS_HOST:HRM_METRICS_PORT). HRM_METRICS=0 turns all of it into a shared
+# no-op context manager.
+
+METRICS_ENABLED = os.environ.get("HRM_METRICS", "1") != "0"
+METRICS_PORT = int(os.environ.get("HRM_METRICS_PORT", "0"))
+# Loopback only by default; set HRM_METRICS_HOST=0.0.0.0 for a scraper on another machine
+METRICS_HOST = os.environ.get("HRM_METRICS_HOST", "127.0.0.1")
+
+# Upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages in pipeline order (stats["timings"] lists them in this order)
+STAGES = ("claim_split", "query_encode", "vector_search", "bm25", "entity_lane", "fusion", "rerank",
+          "narrowing", "nli", "symbolic", "aggregation", "visualization")
+
+_current = ContextVar("hrm_request_timings", default=None)
+# Optional profiling hook: called as hook(stage, seconds, items) at the end of every stage
+_stage_hook = None
+
+
+class RequestTimings:
+    """Stage times, calls, items (batch sizes) and counters of one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.items = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def as_dict(self):
+        order = {name: i for i, name in enumerate(STAGES)}
+        stages = {}
+        for name in sorted(self.seconds, key=lambda n: order.get(n, len(order))):
+            stages[name] = {"ms": round(self.seconds[name] * 1000, 2), "calls": self.calls[name]}
+            if self.items[name]:
+                stages[name]["items"] = self.items[name]
+                stages[name]["avg_batch"] = round(self.items[name] / self.calls[name], 1)
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+
+class _Stage:
+    __slots__ = ("name", "items", "timings", "start")
+
+    def __init__(self, name, items, timings):
+        self.name, self.items, self.timings = name, items, timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        timings = self.timings
+        if timings is not None:
+            timings.seconds[self.name] += seconds
+            timings.calls[self.name] += 1
+            if self.items:
+                timings.items[self.name] += self.items
+        METRICS.observe(self.name, seconds, self.items)
+        if _stage_hook is not None:
+            _stage_hook(self.name, seconds, self.items)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, items=None):
+    """Times a hot-path stage: `with stage("rerank", items=len(pairs)): ...`"""
+    if not METRICS_ENABLED:
+        return _NO_STAGE
+    return _Stage(name, items, _current.get())
+
+
+def count(name, n=1):
+    """Adds to a counter of the current request and the process totals (cache hits etc.)."""
+    if not METRICS_ENABLED or not n:
+        return
+    timings = _current.get()
+    if timings is not None:
+        timings.counters[name] += n
+    METRICS.count(name, n)
+
+
+def timed(name):
+    """Decorator form of stage() (e.g. the chart functions of src/visualizer.py)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def set_stage_hook(hook):
+    """
+    Installs a profiling hook called as hook(stage, seconds, items) after every stage
+    (None removes it), e.g. to log slow stages or feed an external profiler.
+    """
+    global _stage_hook
+    _stage_hook = hook
+
+
+@contextmanager
+def track_request():
+    """Collects the stages of one request; yields its RequestTimings (None when disabled)."""
+    if not METRICS_ENABLED:
+        yield None
+        return
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        METRICS.observe("request", time.perf_counter() - timings.start)
+
+
+class Histogram:
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound below which a share q of the observations fall."""
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Process-wide stage latency histograms, item (batch size) totals and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.items = defaultdict(int)
+        self.counters = defaultdict(int)
+        self._collectors = {}
+
+    def observe(self, name, seconds, items=None):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+            if items:
+                self.items[name] += items
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def add_collector(self, name, collect, counters=()):
+        """
+        collect() -> {metric name: value}, exported as gauges (e.g. knowledge-base cache size).
+        Names in `counters` only ever grow (hits, loads...): exported as Prometheus counters, <name>_total.
+        """
+        self._collectors[name] = (collect, set(counters))
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms}} from the histograms."""
+        with self._lock:
+            return {name: {"count": h.count, "mean_ms": h.sum / h.count * 1000 if h.count else 0.0,
+                           "p50_ms": h.quantile(0.5) * 1000, "p95_ms": h.quantile(0.95) * 1000}
+                    for name, h in self.histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.items.clear()
+            self.counters.clear()
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = ["# HELP hrm_stage_seconds Time spent per pipeline stage.", "# TYPE hrm_stage_seconds histogram"]
+        with self._lock:
+            for name, hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'hrm_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'hrm_stage_seconds_sum{{stage="{name}"}} {hist.sum:.6f}')
+                lines.append(f'hrm_stage_seconds_count{{stage="{name}"}} {hist.count}')
+            lines += ["# HELP hrm_stage_items_total Items (pairs, texts) processed per stage; items / count = average batch size.",
+                      "# TYPE hrm_stage_items_total counter"]
+            lines += [f'hrm_stage_items_total{{stage="{name}"}} {n}' for name, n in sorted(self.items.items())]
+            lines += ["# HELP hrm_events_total Cache hits and other hot-path events.", "# TYPE hrm_events_total counter"]
+            lines += [f'hrm_events_total{{event="{name}"}} {n}' for name, n in sorted(self.counters.items())]
+        for collect, counters in list(self._collectors.values()):
+            for name, value in collect().items():
+                if name in counters:
+                    lines += [f"# TYPE hrm_{name}_total counter", f"hrm_{name}_total {value}"]
+                else:
+                    lines += [f"# TYPE hrm_{name} gauge", f"hrm_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves METRICS.prometheus_text() on http://<host>:<port>/metrics (once per process)."""
+    global _server
+    if _server is not None or not port:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = METRICS.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return _server
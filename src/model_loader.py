@@ -0,0 +1,89 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.runtime_config import configure_torch_threads, MODEL_DIR
+from src.inference_pool import get_inference_pool, PooledSentenceTransformer, PooledCrossEncoder
+
+# Single place where the bi-encoder / cross-encoders get loaded.
+# With inference_workers > 0 the models live in the worker pool and we hand out proxies
+# that expose the same encode()/predict() API; otherwise they are loaded in-process.
+
+_torch_configured = False
+
+
+def _configure_in_process():
+    global _torch_configured
+    if not _torch_configured:
+        configure_torch_threads()
+        _torch_configured = True
+
+
+def resolve_model_path(model_name, model_dir=None):
+    """
+    Local copy of a model if one exists under MODEL_DIR, else the hub name.
+    Accepts <dir>/<org>/<name>, <dir>/<org>__<name> and <dir>/<name> layouts.
+    """
+    model_dir = model_dir or MODEL_DIR
+    if os.path.isdir(model_name) or not os.path.isdir(model_dir):
+        return model_name
+    for candidate in (model_name, model_name.replace("/", "__"), model_name.split("/")[-1]):
+        path = os.path.join(model_dir, candidate)
+        if os.path.isfile(os.path.join(path, "config.json")):
+            return path
+    return model_name
+
+
+def has_safetensors(path):
+    # transformers picks model.safetensors over pytorch_model.bin and memory-maps it
+    return os.path.isdir(path) and any(f.endswith(".safetensors") for f in os.listdir(path))
+
+
+def load_concurrently(loaders):
+    """
+    Runs independent load steps in parallel threads (file reads and torch weight loading release the GIL).
+    Returns {name: seconds}. Re-raises the first failure.
+    """
+    def timed(fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, len(loaders))) as ex:
+        futures = {name: ex.submit(timed, fn) for name, fn in loaders.items()}
+    return {name: f.result() for name, f in futures.items()}
+
+
+def _log_source(model_name, path):
+    if path != model_name:
+        fmt = "safetensors, mmap" if has_safetensors(path) else "local"
+        print(f"📦 {model_name} <- {path} ({fmt})")
+
+
+def _backend_kwargs(backend):
+    # backend= ("onnx", "openvino") only exists in newer sentence-transformers; torch is the default
+    return {} if backend in (None, "torch") else {"backend": backend}
+
+
+def load_bi_encoder(model_name, backend="torch"):
+    path = resolve_model_path(model_name)
+    _log_source(model_name, path)
+    model_name = path
+    pool = get_inference_pool()
+    if pool is not None:
+        return PooledSentenceTransformer(pool, model_name, backend=backend)
+    _configure_in_process()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, **_backend_kwargs(backend))
+
+
+def load_cross_encoder(model_name, device=None, backend="torch"):
+    path = resolve_model_path(model_name)
+    _log_source(model_name, path)
+    model_name = path
+    # The pool is CPU-only; a GPU is better used in-process
+    pool = get_inference_pool() if device in (None, 'cpu') else None
+    if pool is not None:
+        return PooledCrossEncoder(pool, model_name, backend=backend)
+    _configure_in_process()
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, device=device, **_backend_kwargs(backend))
@@ -0,0 +1,162 @@
+import re
+import zlib
+import numpy as np
+
+# Near-duplicate chunk elimination (MinHash + LSH).
+# Many versions of the same policy PDF, or overlapping exports, produce near-identical chunks.
+# Each chunk gets a MinHash signature of its word shingles; LSH bands find candidate pairs and the
+# signature agreement (estimated Jaccard similarity) confirms them. Shingle overlap is blind to a
+# changed number ("a fee of $50" vs "a fee of $75"), so a candidate must also carry the same
+# numeric/date values (spaCy NER, only run for candidate pairs; stored as doc["entities"], which
+# indexing reuses). It is just as blind to a negation ("guests are allowed" vs "guests are not allowed"),
+# so a candidate must also carry the same negation words in the same order. A duplicate is collapsed
+# into the first (canonical) chunk, which keeps every source in doc["sources"] and counts the merged
+# copies in doc["duplicate_count"].
+
+NEAR_DUP_THRESHOLD = 0.85   # Estimated Jaccard similarity of word shingles
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+LSH_BANDS = 16              # 16 bands x 8 rows: pairs above ~0.7 similarity become candidates
+
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+")
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|none|nor|neither|nobody|nothing|nowhere|cannot|without)\b|n['’]t\b")
+
+
+def chunk_sources(doc):
+    """Every source a chunk belongs to (canonical chunks can carry several)."""
+    return doc.get("sources") or [doc.get("source", "Unknown")]
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _PRIME, size=num_perm).astype(np.int64)
+        self.b = rng.randint(0, _PRIME, size=num_perm).astype(np.int64)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def signature(self, text):
+        words = _WORD_RE.findall(text.lower())
+        n = max(1, len(words) - SHINGLE_WORDS + 1)
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(n)}
+        x = np.fromiter((zlib.crc32(s.encode()) % _PRIME for s in shingles), dtype=np.int64, count=len(shingles))
+        # Universal hashing h(x) = (a*x + b) mod p, minimum per permutation
+        return ((np.outer(x, self.a) + self.b) % _PRIME).min(axis=0)
+
+    def _band_keys(self, sig):
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find(self, sig, accept=None):
+        """Id of an indexed near-duplicate of `sig` (for which accept(id) holds, if given), or None."""
+        checked = set()
+        for bucket, key in zip(self.buckets, self._band_keys(sig)):
+            for other in bucket.get(key, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if np.mean(self.signatures[other] == sig) >= self.threshold and (accept is None or accept(other)):
+                    return other
+        return None
+
+    def add(self, sig, item_id):
+        self.signatures[item_id] = sig
+        for bucket, key in zip(self.buckets, self._band_keys(sig)):
+            bucket.setdefault(key, []).append(item_id)
+
+
+def merge_duplicate(canonical, duplicate):
+    """Folds `duplicate` into `canonical`: union of sources, plus the number of collapsed copies."""
+    sources = chunk_sources(canonical)
+    for s in chunk_sources(duplicate):
+        if s not in sources:
+            sources = sources + [s]
+    if len(sources) > 1:
+        canonical["sources"] = sources
+    canonical["duplicate_count"] = canonical.get("duplicate_count", 0) + 1 + duplicate.get("duplicate_count", 0)
+
+
+_verifier = None
+
+
+def _extract_values_batch(texts):
+    # spaCy is loaded on the first candidate pair that needs it
+    from src.symbolic_verifier import SymbolicVerifier
+    global _verifier
+    if _verifier is None:
+        _verifier = SymbolicVerifier()
+    return _verifier.extract_values_batch(texts)
+
+
+def value_key(values):
+    """Order-independent comparison key of extracted values ([{"val", "text", "label"}, ...])."""
+    return sorted((v["label"], str(v["val"])) for v in values)
+
+
+def negation_key(text):
+    """Negation words of a text in order ("isn't" -> "n't"), so "is" vs "is not" never merge."""
+    return [m.replace("’", "'") for m in _NEGATION_RE.findall(text.lower())]
+
+
+class ChunkDeduplicator:
+    """Streaming dedup: new chunks are checked against `existing` chunks and each other."""
+
+    def __init__(self, existing=(), extract_values=_extract_values_batch):
+        # extract_values(texts) -> values per text, as SymbolicVerifier.extract_values_batch
+        self.extract_values = extract_values
+        self.index = NearDuplicateIndex()
+        self.docs = []
+        for doc in existing:
+            self._keep(doc, self.index.signature(doc["text"]))
+
+    def _keep(self, doc, sig):
+        self.index.add(sig, len(self.docs))
+        self.docs.append(doc)
+
+    def _values(self, doc):
+        if "entities" not in doc:
+            doc["entities"] = self.extract_values([doc["text"]])[0]
+        return value_key(doc["entities"])
+
+    def add(self, doc):
+        """True if `doc` is new; False if it was merged into an earlier near-duplicate."""
+        sig = self.index.signature(doc["text"])
+        negations = negation_key(doc["text"])
+        match = self.index.find(sig, accept=lambda other: negation_key(self.docs[other]["text"]) == negations
+                                and self._values(self.docs[other]) == self._values(doc))
+        if match is None:
+            self._keep(doc, sig)
+            return True
+        merge_duplicate(self.docs[match], doc)
+        return False
+
+    def filter(self, chunks):
+        """Yields only the chunks that are not near-duplicates (before they get encoded)."""
+        return (doc for doc in chunks if self.add(doc))
+
+
+def collapse_near_duplicates(docs):
+    """Returns (kept_docs, kept_positions): near-duplicates are merged into their first occurrence."""
+    dedup = ChunkDeduplicator()
+    positions = [pos for pos, doc in enumerate(docs) if dedup.add(doc)]
+    return dedup.docs, positions
+
+
+def dedup_stats(docs):
+    """Summary for the Knowledge Base page (docs: any iterable, read once)."""
+    indexed = removed = multiple = 0
+    for d in docs:
+        indexed += 1
+        removed += d.get("duplicate_count", 0)
+        multiple += len(chunk_sources(d)) > 1
+    ingested = indexed + removed
+    return {
+        "chunks_ingested": ingested,
+        "chunks_indexed": indexed,
+        "duplicates_removed": removed,
+        "dedup_ratio": removed / ingested if ingested else 0.0,
+        "chunks_with_multiple_sources": multiple,
+    }
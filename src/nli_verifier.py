@@ -1,11 +1,17 @@
-from sentence_transformers import CrossEncoder
-import torch
+from src.token_cache import predict_pairs
+from src.model_loader import load_cross_encoder
+from src.runtime_config import load_inference_profile
+from src.metrics import stage, count
+
+NLI_MODEL = 'cross-encoder/nli-deberta-v3-base'
 
 class NLIVerifier:
-    def __init__(self):
+    def __init__(self, profile=None):
+        self.profile = profile or load_inference_profile()
         # Default to None, lazy load
         self.model = None
         self.current_model_name = None
+        import torch
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         
         # DeBERTa labels: 0=Contradiction, 1=Entailment, 2=Neutral
@@ -16,18 +22,32 @@ class NLIVerifier:
         Loads the specified model if not already loaded.
         model_key: 'base' or 'auto' (uses base)
         """
-        target_name = 'cross-encoder/nli-deberta-v3-base'
+        target_name = NLI_MODEL
         
         if self.current_model_name != target_name:
             print(f"⚖️ Loading NLI Model: {target_name} on {self.device}...")
             # If switching, simple reassignment lets Python GC the old one eventually
-            self.model = CrossEncoder(target_name, device=self.device)
+            self.model = load_cross_encoder(target_name, device=self.device, backend=self.profile["backends"]["nli"])
             self.current_model_name = target_name
 
-    def verify(self, claim: str, evidence_list: list, model_selection="base"):
+    def load_symbolic(self):
+        # Symbolic verifier (spaCy NER) used by 'auto' mode
+        if not hasattr(self, 'sym_verifier'):
+            from src.symbolic_verifier import SymbolicVerifier
+            self.sym_verifier = SymbolicVerifier()
+
+    def warm_up(self):
+        """Runs one pair through the NLI model (and spaCy, if loaded) so the first request is not slow."""
+        self.model.predict([["The guest stayed for three days.", "The guest stayed for 72 hours."]], apply_softmax=True)
+        if hasattr(self, 'sym_verifier'):
+            self.sym_verifier.check_contradiction("Warm-up costs $5.", "Warm-up costs $6.")
+
+    def verify(self, claim: str, evidence_list: list, model_selection="base", token_cache=None, sentence_cache=None):
         """
         Runs NLI with the selected model. 
         If model_selection='auto', runs Base + Symbolic Logic.
+        token_cache: NLI token cache of the knowledge base the evidence ids come from (retriever.token_caches).
+        sentence_cache: its per-sentence NLI token cache, for narrowed evidence (retriever.sentence_token_caches).
         """
         # Ensure model is ready (Default to base for auto)
         actual_model = 'base' if model_selection == 'auto' else model_selection
@@ -37,33 +57,68 @@ class NLIVerifier:
             return []
         
         # Create pairs: (Evidence, Claim) - Standard NLI format
-        pairs = [[ev['text'], claim] for ev in evidence_list]
+        # Narrowed evidence (most relevant sentences) is used when the retriever provides it
+        pairs = [[ev.get('nli_text', ev['text']), claim] for ev in evidence_list]
         
-        # Predict scores
-        scores = self.model.predict(pairs, apply_softmax=True)
+        # Different chunks often narrow to the same text (a sentence repeated across documents):
+        # every distinct (evidence text, claim) pair goes through the model once
+        first = {}
+        for i, pair in enumerate(pairs):
+            first.setdefault(pair[0], i)
+        unique = list(first.values())
+        count("nli_pair_dedup_hits", len(pairs) - len(unique))
+
+        # Predict scores (whole-chunk evidence ids come from the token cache when the chunk is indexed,
+        # narrowed evidence ids from the sentence cache)
+        unique_evidence = [evidence_list[i] for i in unique]
+        chunk_ids = [None if 'nli_text' in ev else ev.get('id') for ev in unique_evidence]
+        narrowed_ids = None
+        if sentence_cache is not None:
+            narrowed_ids = [sentence_cache.get_joined(ev['nli_sentences']) if 'nli_sentences' in ev else None for ev in unique_evidence]
+        with stage("nli", items=len(unique)):
+            unique_scores = predict_pairs(self.model, [pairs[i] for i in unique], chunk_ids=chunk_ids, cache=token_cache, evidence_first=True,
+                                          apply_softmax=True, batch_size=self.profile["batch_sizes"]["nli"], evidence_ids=narrowed_ids)
+        position = {i: j for j, i in enumerate(unique)}
+        scores = [unique_scores[position[first[pair[0]]]] for pair in pairs]
         
+        if model_selection == 'auto':
+            self.load_symbolic() # Lazy Init
+            # NER once for the claim; indexed chunks carry their entities from index time,
+            # anything else is parsed in one nlp.pipe pass
+            with stage("symbolic", items=len(evidence_list)):
+                claim_vals = self.sym_verifier._extract_values(claim)
+                evidence_vals = [ev.get('entities') for ev in evidence_list]
+                missing = [i for i, vals in enumerate(evidence_vals) if vals is None]
+                if missing:
+                    parsed = self.sym_verifier.extract_values_batch([evidence_list[i]['text'] for i in missing])
+                    for i, vals in zip(missing, parsed):
+                        evidence_vals[i] = vals
+                # Hard logic per evidence: contradiction first, entailment (unit conversions etc.) otherwise
+                verdicts = []
+                for ev, vals in zip(evidence_list, evidence_vals):
+                    contra = self.sym_verifier.check_contradiction(claim, ev['text'], claim_vals, vals)
+                    entail = None if contra == 'CONTRADICTED' else \
+                        self.sym_verifier.check_entailment(claim, ev['text'], claim_vals, vals)
+                    verdicts.append((contra, entail))
+            count("entity_cache_hits", len(evidence_list) - len(missing))
+            count("entity_cache_misses", len(missing))
+
         results = []
         for i, score_dist in enumerate(scores):
             label_idx = score_dist.argmax()
             
             # --- SYMBOLIC LOGIC OVERRIDE (AUTO MODE) ---
             if model_selection == 'auto':
-                from src.symbolic_verifier import SymbolicVerifier
-                if not hasattr(self, 'sym_verifier'):
-                    self.sym_verifier = SymbolicVerifier() # Lazy Init
-                
                 # Check for Hard Logic
-                evidence_text = evidence_list[i]['text']
-                
+                contra, entail = verdicts[i]
+
                 # Check Contradiction (Strongest signal)
-                contra = self.sym_verifier.check_contradiction(claim, evidence_text)
                 if contra == 'CONTRADICTED':
                     # Force Contradiction stats
                     score_dist = [0.99, 0.0, 0.0] 
                     label_idx = 0
                 else:
                     # Check Entailment (Unit conversions, etc)
-                    entail = self.sym_verifier.check_entailment(claim, evidence_text)
                     if entail == 'ENTAILED':
                         # Force Entailment stats
                         score_dist = [0.0, 0.99, 0.0]
@@ -0,0 +1,97 @@
+import subprocess
+import sys
+import threading
+
+# Shared spaCy registry.
+# The model is loaded once per process and every caller runs only the components it needs:
+#   - claim extraction: sentence boundaries (senter, no tagger/parser/NER)
+#   - symbolic verifier: NER only, in bulk through nlp.pipe
+# Components nobody uses (tagger, lemmatizer, ...) are removed after loading to save memory.
+
+SPACY_MODEL = "en_core_web_sm"
+
+# First component found wins (senter is much cheaper than the dependency parser)
+SENTENCE_COMPONENTS = ("senter", "sentencizer", "parser")
+NER_COMPONENTS = ("ner", "entity_ruler", "span_ruler")
+
+_nlp = None
+_lock = threading.Lock()
+_disable_cache = {}
+
+
+def _load():
+    import spacy
+    try:
+        nlp = spacy.load(SPACY_MODEL)
+    except OSError:
+        print("Downloading SpaCy model...")
+        subprocess.run([sys.executable, "-m", "spacy", "download", SPACY_MODEL])
+        nlp = spacy.load(SPACY_MODEL)
+
+    # en_core_web_sm ships senter disabled; it is all we need for sentence splitting
+    if "senter" in nlp.disabled:
+        nlp.enable_pipe("senter")
+
+    needed = {_sentence_component(nlp)} | set(_ner_components(nlp))
+    for name in list(nlp.pipe_names):
+        if name in needed or name == "tok2vec":
+            continue
+        nlp.remove_pipe(name)
+    return nlp
+
+
+def get_nlp():
+    """The process-wide spaCy pipeline (loaded on first use)."""
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                _nlp = _load()
+    return _nlp
+
+
+def _sentence_component(nlp):
+    return next((c for c in SENTENCE_COMPONENTS if c in nlp.pipe_names), None)
+
+
+def _ner_components(nlp):
+    return [c for c in NER_COMPONENTS if c in nlp.pipe_names]
+
+
+def _disabled_except(nlp, keep):
+    """Components to skip so that only `keep` (plus the tok2vec they listen to) runs."""
+    key = tuple(sorted(keep))
+    if key not in _disable_cache:
+        keep = set(keep)
+        if "tok2vec" in nlp.pipe_names:
+            listeners = set(getattr(nlp.get_pipe("tok2vec"), "listening_components", []))
+            if keep & listeners:
+                keep.add("tok2vec")
+        _disable_cache[key] = [name for name in nlp.pipe_names if name not in keep]
+    return _disable_cache[key]
+
+
+def sentence_doc(text):
+    """Doc with sentence boundaries only."""
+    nlp = get_nlp()
+    return nlp(text, disable=_disabled_except(nlp, [_sentence_component(nlp)]))
+
+
+def pipe_sentences(texts, batch_size=64, n_process=1):
+    """Streams texts through the sentence-only pipeline. Yields Docs in order."""
+    nlp = get_nlp()
+    return nlp.pipe(texts, batch_size=batch_size, n_process=n_process,
+                    disable=_disabled_except(nlp, [_sentence_component(nlp)]))
+
+
+def entity_doc(text):
+    """Doc with named entities only."""
+    nlp = get_nlp()
+    return nlp(text, disable=_disabled_except(nlp, _ner_components(nlp)))
+
+
+def pipe_entities(texts, batch_size=64, n_process=1):
+    """Streams texts through the NER-only pipeline. Yields Docs in order."""
+    nlp = get_nlp()
+    return nlp.pipe(texts, batch_size=batch_size, n_process=n_process,
+                    disable=_disabled_except(nlp, _ner_components(nlp)))
@@ -1,64 +1,229 @@
-from src.claim_extraction import extract_claims
+import os
+import threading
+import time
+from src.claim_extraction import extract_claims, canonical_claim_text
 from src.retriever import LocalRetriever
-from src.nli_verifier import NLIVerifier
+from src.nli_verifier import NLIVerifier, NLI_MODEL
 from src.aggregator import aggregate_scores
+from src.runtime_config import load_inference_profile
+from src.model_loader import load_concurrently
+from src.knowledge_base import KnowledgeBaseCache, kb_dir, DEFAULT_KB
+from src.latency_budget import LatencyBudget, not_verified_analysis
+from src.metrics import METRICS, stage, count, track_request, start_metrics_server
 
 class RiskAnalysisPipeline:
-    def __init__(self):
+    def __init__(self, eager: bool = None, warm_up: bool = True, kb: str = None):
+        """
+        eager=True loads every index file and model concurrently up front (incl. DeBERTa and spaCy,
+        which are otherwise lazy-loaded on the first request) and warms them up.
+        Default comes from HRM_EAGER_START (off).
+        kb: knowledge base loaded at startup (None = the default one). Requests can name any other
+        knowledge base; those are loaded on demand and kept in an LRU under HRM_KB_MEMORY_MB.
+        """
         print("Initializing Strong Local Pipeline...")
-        self.retriever = LocalRetriever()
-        
-        # This now loads the DeBERTa model (The "Logician")
-        self.verifier = NLIVerifier() 
+        if eager is None:
+            eager = os.environ.get("HRM_EAGER_START", "0") == "1"
+
+        # Machine-specific batch sizes, backends and candidate depths (written by autotune.py)
+        self.profile = load_inference_profile()
+        self.load_times = {}
+
+        if not eager:
+            self.retriever = LocalRetriever(profile=self.profile, kb=kb)
+            
+            # This now loads the DeBERTa model (The "Logician")
+            self.verifier = NLIVerifier(profile=self.profile) 
+        else:
+            self._eager_start(warm_up, kb)
+        # Other knowledge bases share the loaded models and only load their index files.
+        # A newly published index version is hot-loaded on the next request (no model reload).
+        self.knowledge_bases = KnowledgeBaseCache(lambda name: self.retriever.for_knowledge_base(name),
+                                                  stale=lambda retriever: retriever.is_stale())
+        self._reload_lock = threading.Lock()
+        # Seconds per claim at each deadline-mode level, learned across requests (src/latency_budget.py)
+        self.claim_costs = {}
+        # Stage timings -> stats["timings"] and Prometheus histograms (src/metrics.py)
+        METRICS.add_collector("knowledge_bases", lambda: {
+            f"kb_cache_{name}": value for name, value in self.knowledge_bases.metrics().items() if isinstance(value, (int, float))},
+            counters=[f"kb_cache_{name}" for name in self.knowledge_bases.counters])
+        start_metrics_server()
         print("✅ Heavy Local Model Ready.")
 
-    def process(self, question: str, answer: str, api_key: str = None, thresholds: dict = None, model_selection="base"):
+    def _eager_start(self, warm_up, kb=None):
+        start = time.perf_counter()
+        self.retriever = LocalRetriever(profile=self.profile, load=False, kb=kb)
+        self.verifier = NLIVerifier(profile=self.profile)
+
+        loaders = dict(self.retriever.model_loaders())
+        # Index files load concurrently too, as one consistent snapshot (see LocalRetriever.load_index)
+        index_times = {}
+        loaders["index"] = lambda: index_times.update(self.retriever.load_index(run=load_concurrently))
+        loaders["nli"] = lambda: self.verifier.load_model('base')
+        # One shared spaCy pipeline serves claim extraction and the symbolic verifier
+        loaders["spacy"] = self.verifier.load_symbolic
+
+        self.load_times = load_concurrently(loaders)
+        self.load_times.update(index_times)
+        self.retriever.finish_loading()
+
+        if warm_up:
+            warm_start = time.perf_counter()
+            self.load_times.update(load_concurrently({
+                "warm_up_retriever": self.retriever.warm_up,
+                "warm_up_nli": self.verifier.warm_up,
+                "warm_up_claims": lambda: extract_claims("Warm-up sentence one. Warm-up sentence two."),
+            }))
+            self.load_times["warm_up_total"] = time.perf_counter() - warm_start
+
+        self.load_times["total"] = time.perf_counter() - start
+        print("⏱️ Startup load times (s):")
+        for name, secs in sorted(self.load_times.items(), key=lambda x: -x[1]):
+            print(f"   {name:<18} {secs:6.2f}")
+
+    def retriever_for(self, kb=None):
+        """
+        Retriever of a knowledge base: the startup one, or a cached one sharing its models.
+        Either is swapped for a freshly loaded one when a new index version was published;
+        requests already holding the old retriever finish on the old snapshot.
+        """
+        if kb is None or kb_dir(kb) == self.retriever.kb_dir:
+            if self.retriever.is_stale():
+                with self._reload_lock:
+                    if self.retriever.is_stale():
+                        self.retriever = self.retriever.reload()
+            return self.retriever
+        return self.knowledge_bases.get(kb)
+
+    def process(self, question: str, answer: str, api_key: str = None, thresholds: dict = None, model_selection="base", narrow_evidence: bool = True, shared_pool: bool = False, sources: list = None, kb: str = None, deadline_ms: float = None, charts: bool = False):
+        """
+        shared_pool=True retrieves one candidate pool for the question + whole answer and scores
+        every claim inside it (claims with no good match in the pool fall back to a full search).
+        sources: check the claims against these knowledge-base sources only (None = all).
+        kb: knowledge base to check against (None = the one loaded at startup).
+        deadline_ms: latency budget. Claims are checked with fewer candidates, without reranking, then
+        with less evidence as time runs short; claims left when it runs out are returned as
+        "Not verified (budget)". stats["budget"] lists the degradations applied.
+        stats["timings"] has the time per stage, batch sizes and cache hits of this request (src/metrics.py).
+        charts=True also builds the report charts (result["charts"], see src/visualizer.report_charts)
+        as part of the request, so their time shows up in its timings.
+        """
+        with track_request() as timings:
+            result = self._process(question, answer, api_key, thresholds, model_selection, narrow_evidence, shared_pool, sources, kb, deadline_ms)
+            if charts:
+                from src.visualizer import report_charts
+                result["charts"] = report_charts(result["claims"])
+        if timings is not None:
+            result["stats"]["timings"] = timings.as_dict()
+        return result
+
+    def _process(self, question, answer, api_key, thresholds, model_selection, narrow_evidence, shared_pool, sources, kb, deadline_ms):
+        budget = LatencyBudget(deadline_ms, self.claim_costs) if deadline_ms else None
+        # Held for the whole request, so an LRU eviction meanwhile doesn't affect it
+        retriever = self.retriever_for(kb)
+
         # 1. Extract Claims (We still use LLM splitter if available, else Spacy)
-        claims = extract_claims(answer, api_key=api_key)
+        with stage("claim_split"):
+            claims = extract_claims(answer, api_key=api_key)
+
+        pool = None
+        if shared_pool and claims:
+            pool = retriever.candidate_pool(f"{question or ''} {answer}".strip(), sources=sources)
         
         final_results = []
         green_sentences = []
 
-        for claim in claims:
-            # 2. Retrieve Evidence
-            # Search for the claim text specifically
-            evidences = self.retriever.retrieve(claim.text, k=5)
-            
-            # 3. Local Verification (DeBERTa)
-            nli_scores = self.verifier.verify(claim.text, evidences, model_selection=model_selection)
-            
-            # Tag claim text for the Entity Auditor in aggregator
-            for score in nli_scores:
-                score['claim_text'] = claim.text
+        # Repeated claims (same text up to case/punctuation/bullets) are analysed once and fanned out.
+        # Within a claim, evidence chunks that reach NLI with the same text share one NLI pair (NLIVerifier.verify).
+        analysed = {}
+        total_pairs = 0
+
+        keys = [canonical_claim_text(claim.text) or claim.text for claim in claims]
+        unique_left = len(set(keys))
+
+        for claim, key in zip(claims, keys):
+            if key not in analysed:
+                settings = budget.plan(unique_left) if budget else None
+                if budget and settings is None:
+                    budget.skip()
+                    analysed[key] = (not_verified_analysis(), [])
+                else:
+                    start = time.perf_counter()
+                    analysed[key] = self._analyse_claim(retriever, claim.text, thresholds, model_selection, narrow_evidence, pool, sources, settings)
+                    if budget:
+                        budget.record(time.perf_counter() - start)
+                unique_left -= 1
+            else:
+                count("claim_dedup_hits")
+            agg, evidence = analysed[key]
+            total_pairs += len(evidence)
 
-            # 4. Math Aggregation (Logic + Entities + Vectors)
-            agg = aggregate_scores(evidences, nli_scores, thresholds=thresholds)
-            
             # Build Result Object
-            result_obj = {
+            final_results.append({
                 "claim_text": claim.text,
-                "evidence": [],
+                "evidence": [dict(ev) for ev in evidence],
                 "analysis": agg
-            }
-            
-            for ev, score in zip(evidences, nli_scores):
-                result_obj["evidence"].append({
-                    "text": ev["text"],
-                    "source": ev["source"],
-                    "similarity": ev["similarity"],
-                    "nli": score
-                })
-            
-            final_results.append(result_obj)
+            })
             
             if agg["color"] == "green":
                 green_sentences.append(claim.text)
 
+        # NLI pairs actually scored: one per distinct evidence text of each unique claim
+        unique_pairs = sum(len({ev["nli_text"] for ev in evidence}) for _, evidence in analysed.values())
+        stats = {
+            "total_claims": len(claims),
+            "green_count": len(green_sentences),
+            "unique_claims": len(analysed),
+            "claim_dedup_ratio": 1 - len(analysed) / len(claims) if claims else 0.0,
+            "evidence_pairs": total_pairs,
+            "unique_evidence_pairs": unique_pairs,
+            "pair_dedup_ratio": 1 - unique_pairs / total_pairs if total_pairs else 0.0,
+        }
+        stats["knowledge_base"] = retriever.kb or DEFAULT_KB
+        if budget:
+            stats["budget"] = budget.report()
+        if pool is not None:
+            stats["pool_size"] = len(pool["ids"])
+            stats["pool_fallbacks"] = pool["fallbacks"]
+
         return {
             "claims": final_results,
             "safest_answer": " ".join(green_sentences),
-            "stats": {
-                "total_claims": len(claims),
-                "green_count": len(green_sentences)
-            }
-        }
\ No newline at end of file
+            "stats": stats
+        }
+
+    def _analyse_claim(self, retriever, claim_text, thresholds, model_selection, narrow_evidence, pool=None, sources=None, settings=None):
+        """
+        Retrieval + verification + aggregation for one unique claim. Returns (analysis, evidence).
+        settings: deadline-mode level (src/latency_budget.py) for candidate depth, reranking and evidence count.
+        """
+        settings = settings or {}
+        # 2. Retrieve Evidence
+        # Search for the claim text specifically
+        # (narrow_evidence: NLI only sees the sentences most similar to the claim)
+        evidences = retriever.retrieve(claim_text, k=settings.get("k") or self.profile["k"], narrow=narrow_evidence, pool=pool, sources=sources,
+                                       initial_k=settings.get("initial_k"), rerank=settings.get("rerank", True))
+        
+        # 3. Local Verification (DeBERTa)
+        nli_scores = self.verifier.verify(claim_text, evidences, model_selection=model_selection,
+                                          token_cache=retriever.token_caches.get(NLI_MODEL),
+                                          sentence_cache=retriever.sentence_token_caches.get(NLI_MODEL))
+        
+        # Tag claim text for the Entity Auditor in aggregator
+        for score in nli_scores:
+            score['claim_text'] = claim_text
+
+        # 4. Math Aggregation (Logic + Entities + Vectors)
+        with stage("aggregation"):
+            agg = aggregate_scores(evidences, nli_scores, thresholds=thresholds)
+
+        evidence = []
+        for ev, score in zip(evidences, nli_scores):
+            evidence.append({
+                "text": ev["text"],
+                "source": ev["source"],
+                "similarity": ev["similarity"],
+                "similarity_kind": ev.get("similarity_kind", "cross_encoder"),
+                "nli_text": ev.get("nli_text", ev["text"]),
+                "nli": score
+            })
+        return agg, evidence
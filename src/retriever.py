@@ -1,49 +1,264 @@
-import faiss
+import copy
 import pickle
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer, CrossEncoder
 import os
 import re
+from src.token_cache import TokenCache, predict_pairs, TOKEN_CACHE_DIR, CACHED_MODELS, SENTENCE_CACHED_MODELS
+from src.evidence_narrowing import SentenceStore
+from src.entity_index import EntityIndex, ENTITY_LANE_K, ENTITY_LANE_WEIGHT
+from src.document_index import DocumentIndex, HIERARCHICAL_MIN_CHUNKS
+from src.near_dedup import chunk_sources
+from src.vector_store import load_full_vectors, search_vectors, stored_vectors
+from src.knowledge_base import kb_dir, load_metadata
+from src.index_manifest import read_manifest, wait_for_publish
+from src.model_loader import load_cross_encoder
+from src.embedding_models import get_bi_encoder, index_embedding
+from src.runtime_config import load_inference_profile
+from src.metrics import stage, count
+
+RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+# Shared candidate pool: a claim whose best in-pool cosine similarity is below this gets a full search
+POOL_MIN_SIMILARITY = 0.35
+
+# Attempts at loading a consistent index while new versions are being published
+INDEX_LOAD_ATTEMPTS = 5
 
 class LocalRetriever:
-    def __init__(self):
-        # Load all components
-        if not os.path.exists("vector_index.faiss"):
+    skipped = ()   # Index parts left out of the build, from the manifest (set by load_index)
+
+    def __init__(self, profile=None, load=True, kb=None):
+        """kb: knowledge base to search (None = the default one, see src/knowledge_base.py)."""
+        # Batch sizes / backends / candidate depth (see autotune.py)
+        self.profile = profile or load_inference_profile()
+        self.kb = kb
+        self.kb_dir = kb_dir(kb)
+        self._symbolic = None
+        # Manifest version of the loaded index files (None for indexes built before manifests)
+        manifest = wait_for_publish(self.kb_dir)
+        self.index_version = manifest.get("version")
+        # Bi-encoder that built the index (src/embedding_models.py); queries are encoded with the same one
+        self.embedding = index_embedding(self.kb_dir, manifest)
+
+        if not os.path.exists(self._path("vector_index.faiss")):
             raise FileNotFoundError("Index missing. Please build index first.")
-            
-        self.index = faiss.read_index("vector_index.faiss")
-        
-        with open("corpus_metadata.pkl", 'rb') as f:
-            self.metadata = pickle.load(f)
-            
-        with open("bm25_index.pkl", 'rb') as f:
-            self.bm25 = pickle.load(f)
-            
-        # Bi-Encoder for Initial Retrieval (Fast)
-        self.model = SentenceTransformer('all-mpnet-base-v2') 
-        
+
+        # Load all components (load=False lets the pipeline run the loaders concurrently)
+        if load:
+            self.load_index()
+            for loader in self.model_loaders().values():
+                loader()
+            self.finish_loading()
+
+    def _path(self, name):
+        return os.path.join(self.kb_dir, name)
+
+    def index_loaders(self):
+        """Load steps for the knowledge base's index files."""
+        return {
+            "faiss_index": self._load_faiss,
+            "metadata": self._load_metadata,
+            "bm25": self._load_bm25,
+            "sentence_store": self._load_sentence_store,
+            "entity_index": self._load_entity_index,
+            "document_index": self._load_document_index,
+            "token_cache": self._load_token_cache,
+        }
+
+    def model_loaders(self):
+        """Load steps for the models (independent of the knowledge base)."""
+        return {
+            "bi_encoder": self._load_bi_encoder,
+            "reranker": self._load_reranker,
+        }
+
+    def for_knowledge_base(self, kb):
+        """
+        A retriever over a knowledge base's current index files that shares this one's loaded models.
+        This object is not modified, so requests still running on it are unaffected.
+        """
+        other = copy.copy(self)
+        other.kb, other.kb_dir = kb, kb_dir(kb)
+        if not os.path.exists(other._path("vector_index.faiss")):
+            raise FileNotFoundError(f"Index missing for knowledge base '{kb}'. Please build index first.")
+        other.load_index()
+        if other.embedding["model"] != self.embedding["model"]:
+            other._load_bi_encoder()
+        other.finish_loading()
+        return other
+
+    def load_index(self, run=None):
+        """
+        Loads the index files as one consistent snapshot: waits out a publish in progress, and loads again
+        if a new version was published meanwhile (or a file was replaced while it was being read).
+        run: runs the load steps {name: fn} (default: one after another); its result is returned.
+        """
+        run = run or (lambda steps: {name: step() for name, step in steps.items()})
+        for attempt in range(INDEX_LOAD_ATTEMPTS):
+            manifest = wait_for_publish(self.kb_dir)
+            self.index_version = manifest.get("version")
+            self.embedding = index_embedding(self.kb_dir, manifest)
+            # Parts a bulk build left out on purpose (see src/bulk_ingest.finalize)
+            self.skipped = manifest.get("skipped", [])
+            try:
+                result = run(self.index_loaders())
+            except FileNotFoundError:
+                if attempt == INDEX_LOAD_ATTEMPTS - 1:
+                    raise
+                continue
+            if read_manifest(self.kb_dir) == manifest:
+                return result
+        # Still mixed: keeps the older version number, so is_stale() triggers a reload on the next request
+        print("⚠️ Index kept changing while loading; it will be reloaded on the next request.")
+        return result
+
+    def is_stale(self):
+        """True once a newer index version has been completely published for this knowledge base."""
+        manifest = read_manifest(self.kb_dir)
+        return not manifest.get("publishing") and manifest.get("version") != self.index_version
+
+    def reload(self):
+        """The current index of this knowledge base, with the same models (index load time only)."""
+        start = time.perf_counter()
+        fresh = self.for_knowledge_base(self.kb)
+        print(f"🔄 Index reloaded (version {self.index_version} -> {fresh.index_version}) in {time.perf_counter() - start:.2f}s")
+        return fresh
+
+    def _load_faiss(self):
+        import faiss
+        self.index = faiss.read_index(self._path("vector_index.faiss"))
+        # Compressed index (src/vector_store.py): full-precision vectors on disk for exact re-scoring
+        self.full_vectors = load_full_vectors(self.index.ntotal, kb_dir=self.kb_dir)
+
+    def _load_metadata(self):
+        self.metadata = load_metadata(self._path("corpus_metadata.pkl"))
+
+    def _load_bm25(self):
+        # Bulk-ingested corpora above BM25_MAX_CHUNKS have no BM25 index -> vector + entity lanes only
+        self.bm25 = None
+        if os.path.exists(self._path("bm25_index.pkl")):
+            with open(self._path("bm25_index.pkl"), 'rb') as f:
+                self.bm25 = pickle.load(f)
+
+    def _load_sentence_store(self):
+        # Per-chunk sentence embeddings (built at index time); None -> NLI sees whole chunks
+        self.sentence_store = SentenceStore.load(kb_dir=self.kb_dir)
+
+    def _load_entity_index(self):
+        # Entity value/unit -> chunk ids (built at index time); None -> two-lane fusion only
+        self.entity_index = EntityIndex.load(kb_dir=self.kb_dir)
+
+    def _load_document_index(self):
+        # Document-level tier (built at index time); None -> flat chunk search only
+        self.document_index = DocumentIndex.load(kb_dir=self.kb_dir)
+
+    def _load_token_cache(self):
+        # Pre-tokenized chunk ids per cross-encoder (built at index time); None -> tokenize on the fly
+        self.token_caches = {name: TokenCache.load(name, cache_dir=self._path(TOKEN_CACHE_DIR)) for name in CACHED_MODELS}
+        self.reranker_cache = self.token_caches.get(RERANKER_MODEL)
+        # Narrowed evidence for NLI is assembled from per-sentence ids (rows of the sentence store)
+        self.sentence_token_caches = {name: TokenCache.load(name, cache_dir=self._path(TOKEN_CACHE_DIR), unit="sentences")
+                                      for name in SENTENCE_CACHED_MODELS}
+
+    def _load_bi_encoder(self):
+        # Bi-Encoder for Initial Retrieval (Fast): the model recorded in the index manifest
+        self.model = get_bi_encoder(self.embedding["model"], backend=self.profile["backends"]["embedding"])
+
+    def _load_reranker(self):
         # Cross-Encoder for Re-Ranking (Accurate)
         # MS MARCO MiniLM is fast and trained for relevance ranking
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.reranker = load_cross_encoder(RERANKER_MODEL, backend=self.profile["backends"]["reranker"])
+
+    def finish_loading(self):
+        # Cross-checks that need several components
+        dim = self.embedding.get("dim")
+        if dim and self.index.d != dim:
+            raise ValueError(f"Index has {self.index.d}-d vectors but its manifest records {self.embedding['model']} ({dim}-d). Rebuild the index.")
+        if self.sentence_store is not None and len(self.sentence_store.offsets) - 1 != len(self.metadata):
+            print("⚠️ Sentence store is out of date with the index. Rebuild the index to enable evidence narrowing.")
+            self.sentence_store = None
+        for name, cache in self.sentence_token_caches.items():
+            if cache is not None and (self.sentence_store is None or len(cache) != len(self.sentence_store)):
+                self.sentence_token_caches[name] = None
+        if "sentence_store" in self.skipped:
+            print("⚠️ Index built without a sentence store: NLI sees whole chunks (no evidence narrowing).")
+        if "token_cache" in self.skipped:
+            print("⚠️ Index built without a token cache: the reranker and NLI tokenize evidence on the fly.")
+        if self.entity_index is not None and self.entity_index.num_chunks != len(self.metadata):
+            print("⚠️ Entity index is out of date with the index. Rebuild the index to enable the entity lane.")
+            self.entity_index = None
+        if self.document_index is not None and self.document_index.num_chunks != len(self.metadata):
+            print("⚠️ Document index is out of date with the index. Rebuild the index to enable two-tier retrieval.")
+            self.document_index = None
+
+    def warm_up(self):
+        """Pushes a tiny batch through both models so the first real query doesn't pay for lazy init."""
+        self.encode_query("warm-up query")
+        self.reranker.predict([["warm-up query", "warm-up passage"]])
+
+    def query_entities(self, query):
+        """Numeric/date entities of the query (no spaCy call for queries without numbers or dates)."""
+        from src.symbolic_verifier import SymbolicVerifier, may_contain_values
+        if not may_contain_values(query):
+            return []
+        if self._symbolic is None:
+            self._symbolic = SymbolicVerifier()
+        return self._symbolic._extract_values(query)
 
     def simple_tokenize(self, text):
         return re.findall(r'\b\w+\b', text.lower())
 
-    def retrieve(self, query: str, k: int = 5):
-        # --- STAGE 1: BROAD SEARCH (Retrieve 50 candidates) ---
-        initial_k = 50 
-        
-        # 1. Vector Search
-        query_vec = self.model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(query_vec)
-        v_scores, v_indices = self.index.search(query_vec, initial_k)
-        
-        # 2. BM25 Search
+    def encode_query(self, text):
+        with stage("query_encode", items=1):
+            query_vec = self.model.encode([text], convert_to_numpy=True)
+            query_vec /= np.maximum(np.linalg.norm(query_vec, axis=1, keepdims=True), 1e-12)
+        return query_vec
+
+    def _fuse(self, query, query_vec, depth, pool=None):
+        """
+        Vector + BM25 (+ entity) search fused with RRF. Returns [(chunk id, score), ...] (best first).
+        With a pool, only the pool's chunks are scored (in-memory dot products + BM25 get_batch_scores).
+        """
         tokenized_query = self.simple_tokenize(query)
-        bm25_scores = self.bm25.get_scores(tokenized_query)
-        bm25_indices = np.argsort(bm25_scores)[::-1][:initial_k]
-        
+        if pool is None:
+            # 1. Vector Search
+            with stage("vector_search"):
+                v_scores, v_indices = search_vectors(self.index, self.full_vectors, query_vec, depth, rescore=self.profile["rescore"])
+            v_indices = v_indices[0]
+
+            # 2. BM25 Search
+            bm25_scores, bm25_indices = None, []
+            if self.bm25 is not None:
+                with stage("bm25"):
+                    bm25_scores = self.bm25.get_scores(tokenized_query)
+                    bm25_indices = np.argsort(bm25_scores)[::-1][:depth]
+        else:
+            ids = pool["ids"]
+            with stage("vector_search", items=len(ids)):
+                v_indices = ids[np.argsort(-(pool["vectors"] @ query_vec[0]))[:depth]]
+            # Chunks outside the pool get no subject score, so the entity lane stays inside it too
+            bm25_scores = np.zeros(len(self.metadata))
+            if self.bm25 is not None:
+                with stage("bm25", items=len(ids)):
+                    pool_bm25 = np.asarray(self.bm25.get_batch_scores(tokenized_query, ids.tolist()))
+                    bm25_indices = ids[np.argsort(-pool_bm25, kind="stable")[:depth]]
+                bm25_scores[ids] = pool_bm25
+            else:
+                bm25_indices = []
+                bm25_scores[ids] = 1.0
+
+        # 3b. Entity lane: chunks with the same entity type (dates, amounts, IDs...) and subject
+        entity_indices = []
+        if self.entity_index is not None:
+            with stage("entity_lane"):
+                entity_indices = self.entity_index.lane(self.query_entities(query), bm25_scores, k=ENTITY_LANE_K)
+
         # 3. Hybrid Fusion (RRF)
+        with stage("fusion"):
+            return self._rrf(v_indices, bm25_indices, entity_indices, depth)
+
+    def _rrf(self, v_indices, bm25_indices, entity_indices, depth):
         combined_scores = {}
         
         def add_rank(indices, weight=1.0):
@@ -52,43 +267,135 @@ class LocalRetriever:
                 if idx not in combined_scores: combined_scores[idx] = 0.0
                 combined_scores[idx] += (1.0 / (60 + rank)) * weight
 
-        add_rank(v_indices[0], weight=1.0)
+        add_rank(v_indices, weight=1.0)
         add_rank(bm25_indices, weight=1.5)
-        
+        add_rank(entity_indices, weight=ENTITY_LANE_WEIGHT)
+
+        return sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:depth]
+
+    def candidate_pool(self, text, size=None, sources=None):
+        """
+        One broad search for a whole question + answer. Claims are then scored against this
+        pool only (retrieve(..., pool=pool)) instead of running N full-corpus searches.
+        """
+        size = size or self.profile["pool_k"]
+        within = self.source_pool(sources) if sources else None
+        ids = [int(idx) for idx, _ in self._fuse(text, self.encode_query(text), size, pool=within)]
+        return self._pool(ids)
+
+    def document_pool(self, query, query_vec):
+        """Two-tier retrieval, tier 1: the chunks of the top documents for this query."""
+        doc_ids = self.document_index.top_documents(query_vec, self.simple_tokenize(query), self.profile["top_docs"])
+        return self._pool(self.document_index.chunks_of(doc_ids))
+
+    def source_pool(self, sources):
+        """Only the chunks of the given sources (per-source id ranges from the document index)."""
+        if self.document_index is not None:
+            ids = self.document_index.chunks_of(self.document_index.documents_for_sources(sources))
+        else:
+            # Older index without a document tier: one scan over the metadata
+            wanted = set(sources)
+            ids = [i for i, d in enumerate(self.metadata)
+                   if any(s in wanted or s.split(" (Page ")[0] in wanted for s in chunk_sources(d))]
+        return self._pool(np.unique(np.asarray(ids, dtype=np.int64)))
+
+    def _pool(self, ids):
+        """Candidate chunk ids with their vectors (full precision when the index is compressed)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        return {"ids": ids, "vectors": stored_vectors(self.index, self.full_vectors, ids), "fallbacks": 0}
+
+    def use_hierarchical(self):
+        """Two-tier search pays off only on large corpora (and needs the document index)."""
+        return self.document_index is not None and len(self.metadata) >= HIERARCHICAL_MIN_CHUNKS
+
+    def retrieve(self, query: str, k: int = 5, narrow: bool = True, pool: dict = None, hierarchical: bool = None, sources: list = None,
+                 initial_k: int = None, rerank: bool = True):
+        """
+        pool: shared candidate pool (see candidate_pool) to search instead of the full corpus.
+        hierarchical: document -> chunk search (None = automatic, see use_hierarchical).
+        sources: only search chunks of these sources (names as listed by get_indexed_files).
+        initial_k / rerank: fewer candidates, or fused order + cosine similarity instead of the
+        cross-encoder (deadline mode, see src/latency_budget.py).
+        """
+        # --- STAGE 1: BROAD SEARCH (Retrieve 50 candidates by default, tuned per machine) ---
+        initial_k = initial_k or self.profile["initial_k"]
+        query_vec = self.encode_query(query)
+        if hierarchical is None:
+            hierarchical = self.use_hierarchical()
+
+        # Shared pool: fall back to the full corpus when nothing in the pool resembles the claim
+        if pool is not None and (len(pool["ids"]) == 0 or float(np.max(pool["vectors"] @ query_vec[0])) < POOL_MIN_SIMILARITY):
+            pool["fallbacks"] += 1
+            count("pool_fallbacks")
+            pool = None
+        if pool is None and sources:
+            pool = self.source_pool(sources)
+        elif pool is None and hierarchical and self.document_index is not None:
+            pool = self.document_pool(query, query_vec)
+
         # Get top 50 candidates from Hybrid Fusion
-        broad_candidates = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:initial_k]
+        broad_candidates = self._fuse(query, query_vec, initial_k, pool=pool)
         
         # --- STAGE 2: RE-RANKING (Cross-Encoder) ---
         if not broad_candidates: return []
         
-        # Prepare pairs for Cross-Encoder: [ [Query, Doc1], [Query, Doc2], ... ]
-        pairs = []
-        candidate_indices = []
-        
-        for idx, _ in broad_candidates:
-            doc_text = self.metadata[idx]["text"]
-            pairs.append([query, doc_text])
-            candidate_indices.append(idx)
-            
-        # Predict scores (Logits)
-        ce_scores = self.reranker.predict(pairs)
-        
-        # Sort by Cross-Encoder score
-        # Zip indices with their new CE scores
-        reranked = sorted(zip(candidate_indices, ce_scores), key=lambda x: x[1], reverse=True)[:k]
-        
+        if rerank:
+            # Prepare pairs for Cross-Encoder: [ [Query, Doc1], [Query, Doc2], ... ]
+            pairs = []
+            candidate_indices = []
+
+            for idx, _ in broad_candidates:
+                doc_text = self.metadata[idx]["text"]
+                pairs.append([query, doc_text])
+                candidate_indices.append(idx)
+
+            # Predict scores (Logits) - chunk side comes from the token cache
+            with stage("rerank", items=len(pairs)):
+                ce_scores = predict_pairs(self.reranker, pairs, chunk_ids=candidate_indices, cache=self.reranker_cache, evidence_first=False,
+                                          batch_size=self.profile["batch_sizes"]["reranker"])
+
+            # Sort by Cross-Encoder score
+            # Zip indices with their new CE scores
+            reranked = sorted(zip(candidate_indices, ce_scores), key=lambda x: x[1], reverse=True)[:k]
+        else:
+            # No cross-encoder: keep the fused order, score with the cosine similarity. That is not on the
+            # sigmoid(CE) scale, so results are flagged "similarity_kind": "cosine" (see aggregate_scores)
+            top = np.asarray([idx for idx, _ in broad_candidates[:k]], dtype=np.int64)
+            cosine = stored_vectors(self.index, self.full_vectors, top) @ query_vec[0]
+            reranked = list(zip(top, cosine))
+
         results = []
         for idx, score in reranked:
             doc = self.metadata[idx]
-            
+
             # Normalize logit to 0-1 for UI consistency (Sigmoid)
             # This allows the Aggregator to still work with "sim_score > 0.6" logic
-            normalized_score = 1 / (1 + np.exp(-score))
+            normalized_score = 1 / (1 + np.exp(-score)) if rerank else max(float(score), 0.0)
             
-            results.append({
+            result = {
+                "id": int(idx),
                 "text": doc["text"],
                 "source": doc.get("source", "Unknown"),
                 "similarity": float(normalized_score) # High quality relevance score
-            })
+            }
+            if not rerank:
+                result["similarity_kind"] = "cosine"
+
+            # Near-duplicate chunks found in several documents list all of them
+            if "sources" in doc:
+                result["sources"] = doc["sources"]
+
+            # Numeric/date entities extracted at index time (saves NER in the symbolic verifier)
+            if "entities" in doc:
+                result["entities"] = doc["entities"]
+
+            # --- STAGE 3: EVIDENCE NARROWING (only the relevant sentences go to NLI) ---
+            if narrow and self.sentence_store is not None:
+                with stage("narrowing"):
+                    narrowed = self.sentence_store.narrow(idx, doc["text"], query_vec[0])
+                if narrowed:
+                    result["nli_text"], result["nli_sentences"] = narrowed
+
+            results.append(result)
             
         return results
\ No newline at end of file
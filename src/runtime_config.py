@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+
+# Inference thread settings, per platform.
+# macOS needs everything single-threaded (OpenMP + tokenizers fork segfaults), while big Linux
+# boxes should use their cores. Every value can be overridden with an HRM_* environment variable.
+#
+#   omp_num_threads / torch_threads: None = let torch use all cores
+#   inference_workers: 0 = run models in-process, N = dispatch to N worker processes
+#   worker_threads: intra-op torch threads per worker (None = cores // workers)
+
+PLATFORM_DEFAULTS = {
+    "darwin": {
+        "kmp_duplicate_lib_ok": True,
+        "tokenizers_parallelism": False,
+        "omp_num_threads": 1,
+        "torch_threads": 1,
+        "inference_workers": 0,
+        "worker_threads": 1,
+    },
+    "linux": {
+        "kmp_duplicate_lib_ok": True,
+        "tokenizers_parallelism": False,
+        "omp_num_threads": None,
+        "torch_threads": None,
+        "inference_workers": 0,
+        "worker_threads": None,
+    },
+}
+DEFAULT_PLATFORM = "linux"
+
+ENV_OVERRIDES = {
+    "omp_num_threads": "HRM_OMP_NUM_THREADS",
+    "torch_threads": "HRM_TORCH_THREADS",
+    "inference_workers": "HRM_INFERENCE_WORKERS",
+    "worker_threads": "HRM_WORKER_THREADS",
+}
+
+
+# Local model weights: <MODEL_DIR>/<org>__<name> (see download_model.py). Falls back to the HF hub.
+MODEL_DIR = os.environ.get("HRM_MODEL_DIR", "models")
+
+# Machine-specific inference profile written by `python autotune.py`.
+# Loaded by RiskAnalysisPipeline at startup; anything missing falls back to these defaults.
+PROFILE_FILE = os.environ.get("HRM_PROFILE", "inference_profile.json")
+
+DEFAULT_PROFILE = {
+    "torch_threads": None,
+    "inference_workers": None,
+    "worker_threads": None,
+    "backends": {"embedding": "torch", "reranker": "torch", "nli": "torch"},
+    "batch_sizes": {"embedding": 32, "reranker": 32, "nli": 32},
+    "initial_k": 50,  # Candidates fused from vector + BM25 search and sent to the reranker
+    "k": 5,           # Evidence chunks verified per claim
+    "pool_k": 200,    # Shared candidate pool per question + answer (process(..., shared_pool=True))
+    "top_docs": 20,   # Documents searched by two-tier retrieval on large corpora (src/document_index.py)
+    "rescore": True,  # Re-score compressed-index candidates with the full-precision vectors (src/vector_store.py)
+}
+
+
+def load_inference_profile(path=None):
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    path = path or PROFILE_FILE
+    if not os.path.exists(path):
+        return profile
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable inference profile {path}: {e}")
+        return profile
+
+    for key, value in saved.items():
+        if isinstance(profile.get(key), dict) and isinstance(value, dict):
+            profile[key].update(value)
+        else:
+            profile[key] = value
+    return profile
+
+
+def get_runtime_config():
+    config = dict(PLATFORM_DEFAULTS.get(sys.platform, PLATFORM_DEFAULTS[DEFAULT_PLATFORM]))
+
+    # Autotuned values beat platform defaults, explicit env vars beat both
+    profile = load_inference_profile()
+    for key in ("torch_threads", "inference_workers", "worker_threads"):
+        if profile.get(key) is not None:
+            config[key] = profile[key]
+
+    for key, var in ENV_OVERRIDES.items():
+        if os.environ.get(var):
+            config[key] = int(os.environ[var])
+
+    cores = os.cpu_count() or 1
+    if config["worker_threads"] is None:
+        config["worker_threads"] = max(1, cores // max(1, config["inference_workers"]))
+    return config
+
+
+def apply_runtime_env():
+    """Sets the thread-related env flags. Must run before torch/tokenizers are imported."""
+    config = get_runtime_config()
+    if config["kmp_duplicate_lib_ok"]:
+        os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "true" if config["tokenizers_parallelism"] else "false")
+    if config["omp_num_threads"]:
+        os.environ.setdefault("OMP_NUM_THREADS", str(config["omp_num_threads"]))
+    return config
+
+
+def configure_torch_threads(threads=None):
+    """Applies the intra-op thread count for in-process inference."""
+    threads = threads or get_runtime_config()["torch_threads"]
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
@@ -1,42 +1,93 @@
-import spacy
+import re
 from word2number import w2n
+from src.nlp_registry import get_nlp, entity_doc, pipe_entities
+
+NUMERIC_LABELS = ["MONEY", "QUANTITY", "CARDINAL", "PERCENT", "TIME", "DATE"]
+
+# --- FAST PRE-FILTER ---
+# A numeric value needs a digit or a number word; DATE/TIME entities can also come from
+# month/day names or relative time words. Texts with none of these cannot yield any of
+# NUMERIC_LABELS, so NER is skipped for them entirely (most claim/evidence pairs).
+_NUMBER_WORDS = sorted(w2n.american_number_system) + ["inf", "infinity", "nan"]
+_DATE_WORDS = [
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "today", "tonight", "tomorrow", "yesterday", "morning", "afternoon", "evening", "night", "noon", "midnight",
+    "second", "seconds", "minute", "minutes", "hour", "hours", "day", "days", "week", "weeks", "weekend",
+    "month", "months", "year", "years", "decade", "decades", "century", "centuries", "quarter", "season",
+    "spring", "summer", "autumn", "fall", "winter", "annual", "annually", "daily", "weekly", "monthly", "yearly",
+    "ago", "now", "recently", "currently", "era", "age", "period", "time", "times",
+]
+_VALUE_HINT_RE = re.compile(r"\d|\b(?:" + "|".join(_NUMBER_WORDS + _DATE_WORDS) + r")\b", re.IGNORECASE)
+_NUMBER_WORD_RE = re.compile(r"\b(?:" + "|".join(_NUMBER_WORDS[:-3]) + r")\b")
+
+# Allocation-light number normalization (no exceptions on the common paths)
+_CURRENCY_TABLE = str.maketrans("", "", "$€£")
+_FLOAT_RE = re.compile(
+    r"\s*[-+]?(?:(?:\d+(?:_\d+)*(?:\.(?:\d+(?:_\d+)*)?)?|\.\d+(?:_\d+)*)(?:[eE][-+]?\d+(?:_\d+)*)?|inf(?:inity)?|nan)\s*",
+    re.IGNORECASE,
+)
+_FIRST_NUMBER_RE = re.compile(r"[-+]?\d*\.\d+|\d+")
+
+
+def may_contain_values(text):
+    """Cheap check: can spaCy NER find any MONEY/QUANTITY/CARDINAL/PERCENT/DATE/TIME value in `text`?"""
+    return _VALUE_HINT_RE.search(text) is not None
+
 
 class SymbolicVerifier:
-    def __init__(self):
-        # We need efficient entity extraction
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-        except:
-            print("⚠️ Downloading Spacy Model...")
-            from spacy.cli import download
-            download("en_core_web_sm")
-            self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, fast_path=True):
+        # We need efficient entity extraction: shared spaCy pipeline, NER only
+        self.nlp = get_nlp()
+        # fast_path: skip NER for texts that cannot contain numbers/dates (see benchmark_symbolic.py)
+        self.fast_path = fast_path
 
     def _normalize_number(self, text):
         """Attempts to convert text numbers to floats."""
-        import re
-        try:
-            # Handle currency symbols
-            text = text.replace("$", "").replace("€", "").replace("£", "")
-            return float(w2n.word_to_num(text))
-        except:
+        # Handle currency symbols
+        text = text.translate(_CURRENCY_TABLE)
+
+        # 1. Number words / digit strings ("one hundred", "72"). w2n can only succeed on these.
+        lowered = text.replace("-", " ").lower()
+        if lowered.isdecimal():
+            return float(int(lowered))
+        if _NUMBER_WORD_RE.search(lowered):
             try:
-                # Try simple float conversion (removing commas)
-                return float(text.replace(",",""))
-            except:
-                # Regex fallback: extract first number found in string
-                # e.g. "3 days" -> 3.0
-                match = re.search(r"[-+]?\d*\.\d+|\d+", text)
-                if match:
-                    return float(match.group())
-                return None
+                return float(w2n.word_to_num(text))
+            except Exception:
+                pass
+
+        # 2. Simple float conversion (removing commas)
+        plain = text.replace(",", "")
+        if _FLOAT_RE.fullmatch(plain):
+            return float(plain)
+
+        # 3. Regex fallback: extract first number found in string
+        # e.g. "3 days" -> 3.0
+        match = _FIRST_NUMBER_RE.search(text)
+        if match:
+            return float(match.group())
+        return None
 
     def _extract_values(self, text):
         """Extracts numeric entities with their labels."""
-        doc = self.nlp(text)
+        if self.fast_path and not may_contain_values(text):
+            return []
+        return self._values_from_doc(entity_doc(text))
+
+    def extract_values_batch(self, texts, batch_size=64):
+        """_extract_values for many texts in one nlp.pipe pass (texts without numbers/dates skip NER)."""
+        results = [[] for _ in texts]
+        todo = [i for i, t in enumerate(texts) if not self.fast_path or may_contain_values(t)]
+        for i, doc in zip(todo, pipe_entities((texts[i] for i in todo), batch_size=batch_size)):
+            results[i] = self._values_from_doc(doc)
+        return results
+
+    def _values_from_doc(self, doc):
         values = []
         for ent in doc.ents:
-            if ent.label_ in ["MONEY", "QUANTITY", "CARDINAL", "PERCENT", "TIME", "DATE"]:
+            if ent.label_ in NUMERIC_LABELS:
                 val = self._normalize_number(ent.text)
                 if val:
                     values.append({"val": val, "text": ent.text, "label": ent.label_})
@@ -45,13 +96,16 @@ class SymbolicVerifier:
                      values.append({"val": ent.text, "text": ent.text, "label": ent.label_})
         return values
 
-    def check_contradiction(self, claim, evidence):
+    def check_contradiction(self, claim, evidence, claim_vals=None, evidence_vals=None):
         """
         Checks for hard numeric contradictions with fuzzy logic.
+        claim_vals / evidence_vals: already extracted values (skips re-running NER).
         Returns: 'CONTRADICTED' if mismatch found, else None.
         """
-        claim_vals = self._extract_values(claim)
-        evidence_vals = self._extract_values(evidence)
+        if claim_vals is None:
+            claim_vals = self._extract_values(claim)
+        if evidence_vals is None:
+            evidence_vals = self._extract_values(evidence)
 
         if not claim_vals or not evidence_vals:
             return None
@@ -108,17 +162,18 @@ class SymbolicVerifier:
                     
         return None
 
-    def check_entailment(self, claim, evidence):
+    def check_entailment(self, claim, evidence, claim_vals=None, evidence_vals=None):
         """
         Checks for semantic entailment via logic (like unit conversion).
+        claim_vals / evidence_vals: already extracted values (skips re-running NER).
         Returns: 'ENTAILED' if logic proves it, else None.
         """
         # Specific Check: Time Units
         
         # Check "3 days" vs "72 hours" explicitly
         if "days" in claim and "hours" in evidence:
-            c_val = self._extract_values(claim)
-            e_val = self._extract_values(evidence)
+            c_val = claim_vals if claim_vals is not None else self._extract_values(claim)
+            e_val = evidence_vals if evidence_vals is not None else self._extract_values(evidence)
             if c_val and e_val:
                 # Simple logic: 1 day = 24 hours
                 # If we find x days and y hours, check x*24 == y
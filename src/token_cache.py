@@ -0,0 +1,316 @@
+import os
+import numpy as np
+from src.metrics import count
+from src.vector_store import NpyAppender
+
+# Pre-tokenized evidence cache.
+# Every knowledge-base chunk is tokenized once per cross-encoder tokenizer at index time
+# and stored as one flat id array + offsets (memory-mapped at query time).
+# At query time only the claim/query is tokenized; (evidence, claim) inputs are assembled
+# from the cached ids.
+# The NLI model usually sees narrowed evidence (a few sentences of a chunk, see
+# src/evidence_narrowing.py), so its tokenizer also gets a per-sentence cache: the ids of
+# " ".join(sentences) are the concatenated ids of the sentences (no token spans whitespace).
+
+TOKEN_CACHE_DIR = "token_cache"
+
+# Tokenizers we cache ids for: the reranker and the NLI model
+CACHED_MODELS = [
+    'cross-encoder/ms-marco-MiniLM-L-6-v2',
+    'cross-encoder/nli-deberta-v3-base',
+]
+
+# Tokenizers that also get a per-sentence cache (for narrowed evidence): the NLI model
+SENTENCE_CACHED_MODELS = CACHED_MODELS[1:]
+
+# Nothing past this survives truncation, so there is no point storing it
+MAX_CACHED_TOKENS = 512
+
+
+def _cache_prefix(model_name, cache_dir=TOKEN_CACHE_DIR, unit="chunks"):
+    prefix = os.path.join(cache_dir, model_name.replace("/", "__"))
+    return prefix if unit == "chunks" else f"{prefix}.{unit}"
+
+
+def build_token_cache(passages, model_names=CACHED_MODELS, cache_dir=TOKEN_CACHE_DIR, previous=None, unit="chunks"):
+    """
+    Tokenizes every passage once per model tokenizer and writes <model>.ids.npy / .offsets.npy.
+    previous: (token cache dir of the current index, its passage count, its passage id per passage or None).
+    Unchanged chunks copy their ids from there, so an upload only tokenizes the new chunks.
+    unit: "chunks", or "sentences" for the sentence rows of the sentence store (<model>.sentences.*).
+    """
+    from transformers import AutoTokenizer
+    from src.model_loader import resolve_model_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in model_names:
+        tokenizer = AutoTokenizer.from_pretrained(resolve_model_path(name))
+        old_cache, old_ids = None, [None] * len(passages)
+        if previous is not None:
+            old_cache = TokenCache.load(name, cache_dir=previous[0], unit=unit)
+            if old_cache is not None and len(old_cache) == previous[1]:
+                old_ids = previous[2]
+        todo = [i for i, old in enumerate(old_ids) if old is None]
+        encoded = [None] * len(passages)
+        if todo:
+            tokenized = tokenizer([passages[i] for i in todo], add_special_tokens=False, truncation=False)["input_ids"]
+            for i, ids in zip(todo, tokenized):
+                encoded[i] = ids
+        for i, old in enumerate(old_ids):
+            if old is not None:
+                encoded[i] = old_cache.ids[old_cache.offsets[old]:old_cache.offsets[old + 1]]
+
+        dtype = _id_dtype(tokenizer)
+
+        lengths = np.fromiter((min(len(ids), MAX_CACHED_TOKENS) for ids in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        flat = np.empty(offsets[-1], dtype=dtype)
+        for i, ids in enumerate(encoded):
+            flat[offsets[i]:offsets[i + 1]] = ids[:MAX_CACHED_TOKENS]
+
+        prefix = _cache_prefix(name, cache_dir, unit)
+        np.save(prefix + ".ids.npy", flat)
+        np.save(prefix + ".offsets.npy", offsets)
+        print(f"🔤 Token cache: {len(encoded)} {unit} for {name} ({len(todo)} tokenized, {flat.nbytes / 1e6:.1f} MB)")
+
+
+def _id_dtype(tokenizer):
+    # Compact storage: uint16 is enough for BERT-style vocabularies (30k), DeBERTa-v3 needs int32
+    return np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max else np.int32
+
+
+class TokenCacheWriter:
+    """
+    Same files as build_token_cache, written one batch of passages at a time (bulk ingestion,
+    where the corpus never fits in memory).
+    """
+
+    def __init__(self, model_names=CACHED_MODELS, cache_dir=TOKEN_CACHE_DIR, unit="chunks"):
+        from transformers import AutoTokenizer
+        from src.model_loader import resolve_model_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.unit = unit
+        self.caches = []
+        for name in model_names:
+            tokenizer = AutoTokenizer.from_pretrained(resolve_model_path(name))
+            prefix = _cache_prefix(name, cache_dir, unit)
+            self.caches.append((name, tokenizer, prefix, NpyAppender(prefix + ".ids.npy", _id_dtype(tokenizer)), []))
+
+    def add(self, passages):
+        if not passages:
+            return
+        for _, tokenizer, _, ids, lengths in self.caches:
+            tokenized = [t[:MAX_CACHED_TOKENS] for t in tokenizer(passages, add_special_tokens=False, truncation=False)["input_ids"]]
+            ids.append([i for t in tokenized for i in t])
+            lengths.append(np.fromiter(map(len, tokenized), dtype=np.int64, count=len(tokenized)))
+
+    def close(self):
+        for name, _, prefix, ids, lengths in self.caches:
+            ids.close()
+            lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            np.save(prefix + ".offsets.npy", offsets)
+            print(f"🔤 Token cache: {len(lengths):,} {self.unit} for {name} ({ids.rows * ids.dtype.itemsize / 1e6:.1f} MB)")
+
+
+class TokenCache:
+    """Read-only, memory-mapped view of the token ids of one tokenizer."""
+
+    def __init__(self, ids, offsets):
+        self.ids = ids
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, model_name, cache_dir=TOKEN_CACHE_DIR, unit="chunks"):
+        """Returns None if no cache was built for this model."""
+        prefix = _cache_prefix(model_name, cache_dir, unit)
+        if not os.path.exists(prefix + ".ids.npy"):
+            return None
+        try:
+            return cls(np.load(prefix + ".ids.npy", mmap_mode='r'), np.load(prefix + ".offsets.npy", mmap_mode='r'))
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable token cache for {model_name}: {e}")
+            return None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, idx):
+        """Token ids of chunk `idx`, or None if the chunk is not in the cache."""
+        if idx is None or idx < 0 or idx >= len(self):
+            return None
+        return self.ids[self.offsets[idx]:self.offsets[idx + 1]].tolist()
+
+    def get_joined(self, rows):
+        """Token ids of " ".join(rows' texts) (sentence cache), or None if a row is not in the cache."""
+        parts = [self.get(row) for row in rows]
+        return None if any(p is None for p in parts) else [i for p in parts for i in p]
+
+
+def _truncate_pair(first, second, budget):
+    # Same lengths as the fast tokenizers' 'longest_first' truncation used by CrossEncoder.predict:
+    # the shorter side stays whole if the longer one can absorb the cut; otherwise both get half the
+    # budget and an odd token goes to the longer side (to the second one when they are equally long)
+    if len(first) + len(second) <= budget:
+        return first, second
+    swap = len(first) > len(second)
+    short, long = (len(second), len(first)) if swap else (len(first), len(second))
+    long = short if short > budget else max(short, budget - short)
+    if short + long > budget:
+        short, long = budget // 2, budget // 2 + budget % 2
+    len_a, len_b = (long, short) if swap else (short, long)
+    return first[:len_a], second[:len_b]
+
+
+_PAIR_TEMPLATES = {}
+
+
+def _find(seq, sub, start=0):
+    for i in range(start, len(seq) - len(sub) + 1):
+        if seq[i:i + len(sub)] == sub:
+            return i
+    raise ValueError("probe tokens not found in pair encoding")
+
+
+def _pair_template(tokenizer):
+    """
+    Special-token layout of a (first, second) pair for this tokenizer, e.g. [CLS] A [SEP] B [SEP].
+    Derived once by encoding a probe pair, so it works for any tokenizer (BERT, DeBERTa, RoBERTa, ...).
+    """
+    key = id(tokenizer)
+    if key not in _PAIR_TEMPLATES:
+        a = tokenizer("x", add_special_tokens=False)["input_ids"]
+        b = tokenizer("y", add_special_tokens=False)["input_ids"]
+        enc = tokenizer("x", "y", return_token_type_ids=True)
+        ids = enc["input_ids"]
+        types = enc.get("token_type_ids") or [0] * len(ids)
+        i = _find(ids, a)
+        j = _find(ids, b, i + len(a))
+        _PAIR_TEMPLATES[key] = {
+            "prefix": (ids[:i], types[:i]),
+            "first_type": types[i],
+            "middle": (ids[i + len(a):j], types[i + len(a):j]),
+            "second_type": types[j],
+            "suffix": (ids[j + len(b):], types[j + len(b):]),
+        }
+    return _PAIR_TEMPLATES[key]
+
+
+def build_pair_features(tokenizer, pair_ids, max_length):
+    """
+    Assembles padded model inputs from already tokenized (first, second) id lists.
+    Returns a dict of int64 numpy arrays (input_ids, attention_mask[, token_type_ids]).
+    """
+    tpl = _pair_template(tokenizer)
+    (pre_ids, pre_types), (mid_ids, mid_types), (suf_ids, suf_types) = tpl["prefix"], tpl["middle"], tpl["suffix"]
+    num_special = len(pre_ids) + len(mid_ids) + len(suf_ids)
+
+    rows, types = [], []
+    for first, second in pair_ids:
+        first, second = _truncate_pair(first, second, max_length - num_special)
+        rows.append(pre_ids + list(first) + mid_ids + list(second) + suf_ids)
+        types.append(pre_types + [tpl["first_type"]] * len(first) + mid_types + [tpl["second_type"]] * len(second) + suf_types)
+
+    width = max(len(r) for r in rows)
+    pad_id = tokenizer.pad_token_id or 0
+    input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+    token_type_ids = np.zeros((len(rows), width), dtype=np.int64)
+    for i, (row, tt) in enumerate(zip(rows, types)):
+        input_ids[i, :len(row)] = row
+        attention_mask[i, :len(row)] = 1
+        token_type_ids[i, :len(tt)] = tt
+
+    features = {"input_ids": input_ids, "attention_mask": attention_mask}
+    if "token_type_ids" in tokenizer.model_input_names:
+        features["token_type_ids"] = token_type_ids
+    return features
+
+
+def _activation_fn(cross_encoder):
+    # sentence-transformers renamed this attribute across versions
+    fn = getattr(cross_encoder, "activation_fn", None)
+    return fn if fn is not None else getattr(cross_encoder, "default_activation_function", None)
+
+
+def run_pair_features(cross_encoder, features, apply_softmax=False, batch_size=32):
+    """Runs the cross-encoder's underlying HF model on prebuilt features. Mirrors CrossEncoder.predict output."""
+    import torch
+
+    model = cross_encoder.model
+    if hasattr(model, "eval"):  # ONNX/OpenVINO backends have no train/eval mode
+        model.eval()
+    activation = _activation_fn(cross_encoder)
+
+    n = len(features["input_ids"])
+    lengths = features["attention_mask"].sum(axis=1)
+    # Length-sorted batches keep padding minimal
+    order = np.argsort(-lengths, kind="stable")
+
+    outputs = [None] * n
+    with torch.inference_mode():
+        for start in range(0, n, batch_size):
+            rows = order[start:start + batch_size]
+            width = int(lengths[rows].max())
+            batch = {k: torch.from_numpy(np.ascontiguousarray(v[rows, :width])).to(model.device) for k, v in features.items()}
+            logits = model(**batch, return_dict=True).logits
+            if activation is not None:
+                logits = activation(logits)
+            if apply_softmax and logits.dim() > 1 and logits.size(1) > 1:
+                logits = torch.nn.functional.softmax(logits, dim=1)
+            for row, out in zip(rows, logits.float().cpu().numpy()):
+                outputs[row] = out
+
+    scores = np.stack(outputs)
+    if scores.ndim == 2 and scores.shape[1] == 1:
+        scores = scores[:, 0]
+    return scores
+
+
+def predict_pairs(cross_encoder, pairs, chunk_ids=None, cache=None, evidence_first=True, apply_softmax=False, batch_size=32,
+                  evidence_ids=None):
+    """
+    Drop-in for cross_encoder.predict(pairs) that takes the evidence side from the token cache.
+    pairs: [[evidence, claim], ...] if evidence_first else [[query, evidence], ...]
+    chunk_ids: knowledge-base index of each pair's evidence (None = not from the index)
+    evidence_ids: already cached token ids per pair (or None), e.g. narrowed evidence from the sentence cache
+    Falls back to the plain CrossEncoder path if there is no cache.
+    """
+    if (cache is None or chunk_ids is None) and evidence_ids is None or not pairs:
+        return cross_encoder.predict(pairs, apply_softmax=apply_softmax, batch_size=batch_size)
+    chunk_ids = chunk_ids if cache is not None and chunk_ids is not None else [None] * len(pairs)
+    evidence_ids = evidence_ids or [None] * len(pairs)
+
+    tokenizer = cross_encoder.tokenizer
+    ev_pos, text_pos = (0, 1) if evidence_first else (1, 0)
+
+    # The claim/query is usually shared by every pair -> tokenize each distinct text once
+    text_ids = {}
+    pair_ids = []
+    hits = 0
+    for pair, chunk_id, ev_ids in zip(pairs, chunk_ids, evidence_ids):
+        text = pair[text_pos]
+        if text not in text_ids:
+            text_ids[text] = tokenizer(text, add_special_tokens=False)["input_ids"]
+
+        if ev_ids is None and cache is not None:
+            ev_ids = cache.get(chunk_id)
+        if ev_ids is None:
+            ev_ids = tokenizer(pair[ev_pos], add_special_tokens=False)["input_ids"]
+        else:
+            hits += 1
+
+        pair_ids.append((ev_ids, text_ids[text]) if evidence_first else (text_ids[text], ev_ids))
+
+    count("token_cache_hits", hits)
+    count("token_cache_misses", len(pairs) - hits)
+
+    features = build_pair_features(tokenizer, pair_ids, cross_encoder.max_length or MAX_CACHED_TOKENS)
+    if hasattr(cross_encoder, "predict_features"):
+        # Pooled model: features are shipped to the inference workers
+        return cross_encoder.predict_features(features, apply_softmax=apply_softmax, batch_size=batch_size)
+    return run_pair_features(cross_encoder, features, apply_softmax=apply_softmax, batch_size=batch_size)
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+
+# Compressed vector storage.
+# vector_index.faiss can hold compressed codes instead of raw float32 vectors
+# (768-d all-mpnet-base-v2 = 3 KB per chunk):
+#
+#   format  FAISS type    bytes/chunk (768-d)
+#   flat    IndexFlatIP   3072   exact, no extra file
+#   fp16    SQfp16        1536
+#   int8    SQ8            768
+#   pq      PQ96x8          96   8 dims per sub-quantizer, needs PQ_MIN_TRAIN vectors to train
+#
+# Compressed formats keep the full-precision vectors in FULL_VECTORS_FILE, memory-mapped: they stay on
+# disk and only the rows of the current candidates are paged in. The compressed search fetches
+# RESCORE_FACTOR x more candidates, which are then re-scored exactly (profile: "rescore").
+
+VECTOR_FORMATS = ("flat", "fp16", "int8", "pq")
+VECTOR_FORMAT = os.environ.get("HRM_VECTOR_FORMAT", "flat")   # Format of newly built indexes
+FULL_VECTORS_FILE = "vector_full.npy"
+RESCORE_FACTOR = 4
+PQ_DIMS_PER_CODE = 8
+PQ_MIN_TRAIN = 256 * 39    # FAISS wants ~39 training points per centroid (2^8 centroids per sub-quantizer)
+TRAIN_SAMPLE = 100_000
+
+
+def factory_string(fmt, dim):
+    if fmt == "flat":
+        return "Flat"
+    if fmt == "fp16":
+        return "SQfp16"
+    if fmt == "int8":
+        return "SQ8"
+    if fmt == "pq":
+        return f"PQ{dim // PQ_DIMS_PER_CODE}x8"
+    raise ValueError(f"Unknown vector format {fmt!r} (expected one of {', '.join(VECTOR_FORMATS)})")
+
+
+def index_format(index):
+    """Vector format of a loaded FAISS index (None for index types not built here)."""
+    import faiss
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return {faiss.ScalarQuantizer.QT_fp16: "fp16", faiss.ScalarQuantizer.QT_8bit: "int8"}.get(index.sq.qtype)
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    return None
+
+
+def make_vector_index(dim, fmt, train_vectors):
+    """Empty (trained) inner-product index. train_vectors: a sample of the vectors, float32 or float16."""
+    import faiss
+    if fmt == "pq" and len(train_vectors) < PQ_MIN_TRAIN:
+        print(f"⚠️ PQ needs {PQ_MIN_TRAIN:,} vectors to train ({len(train_vectors):,} given); using int8 instead")
+        fmt = "int8"
+    index = faiss.index_factory(dim, factory_string(fmt, dim), faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        rows = np.random.RandomState(0).permutation(len(train_vectors))[:TRAIN_SAMPLE]
+        index.train(np.asarray(train_vectors[np.sort(rows)], dtype=np.float32))
+    return index
+
+
+def build_vector_index(embeddings, fmt=None, block_size=65536, kb_dir="."):
+    """FAISS index over L2-normalized embeddings; compressed formats also write FULL_VECTORS_FILE."""
+    fmt = fmt or VECTOR_FORMAT
+    index = make_vector_index(embeddings.shape[1], fmt, embeddings)
+    for start in range(0, len(embeddings), block_size):
+        index.add(np.asarray(embeddings[start:start + block_size], dtype=np.float32))
+    if index_format(index) != "flat":
+        np.save(os.path.join(kb_dir, FULL_VECTORS_FILE), np.asarray(embeddings, dtype=np.float32))
+    return index
+
+
+def load_full_vectors(ntotal, kb_dir="."):
+    """Memory-mapped full-precision vectors, or None (flat index, or a file that doesn't match)."""
+    path = os.path.join(kb_dir, FULL_VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    vectors = np.load(path, mmap_mode="r")
+    if len(vectors) != ntotal:
+        print("⚠️ Full-precision vectors are out of date with the index. Rebuild the index to enable re-scoring.")
+        return None
+    return vectors
+
+
+def search_vectors(index, full_vectors, query_vec, depth, rescore=True):
+    """index.search, with compressed candidates re-scored exactly against full_vectors."""
+    if full_vectors is None or not rescore:
+        return index.search(query_vec, depth)
+    _, candidates = index.search(query_vec, depth * RESCORE_FACTOR)
+    candidates = np.sort(candidates[0][candidates[0] >= 0])   # Sorted ids -> sequential reads from the mmap
+    scores = np.asarray(full_vectors[candidates], dtype=np.float32) @ query_vec[0]
+    order = np.argsort(-scores, kind="stable")[:depth]
+    return scores[order][None, :], candidates[order][None, :]
+
+
+def stored_vectors(index, full_vectors, ids):
+    """Vectors of chunk ids: exact from full_vectors when there are any, else read back from the index."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if full_vectors is not None:
+        return np.asarray(full_vectors[ids], dtype=np.float32)
+    if hasattr(index, "reconstruct_batch"):
+        return index.reconstruct_batch(ids)
+    return np.vstack([index.reconstruct(int(i)) for i in ids])
+
+
+class NpyAppender:
+    """
+    A .npy file written a block of rows at a time when the row count is not known up front
+    (bulk ingestion). Rows go to a side file; close() writes the header and streams them behind it.
+    """
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self._raw = open(path + ".rows", "wb")
+
+    def append(self, block):
+        block = np.ascontiguousarray(block, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        self._raw.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        import shutil
+        self._raw.close()
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                  "shape": (self.rows,) + self.row_shape}
+        with open(self.path, "wb") as out, open(self._raw.name, "rb") as raw:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out, 1 << 24)
+        os.remove(self._raw.name)
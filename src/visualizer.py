@@ -1,11 +1,11 @@
 import plotly.graph_objects as go
 import plotly.express as px
-import networkx as nx
-from pyvis.network import Network
 import tempfile
 import os
+from src.metrics import timed
 
 # --- 1. THE TRUST RADAR (Spider Chart) ---
+@timed("visualization")
 def plot_radar_chart(analysis):
     """
     Shows the 'DNA' of a specific claim's verification score.
@@ -61,6 +61,7 @@ def plot_radar_chart(analysis):
     return fig
 
 # --- 2. THE RISK SUNBURST (Donut Summary) ---
+@timed("visualization")
 def plot_sunburst(claims):
     """
     Hierarchical view of the total answer.
@@ -116,10 +117,15 @@ def plot_sunburst(claims):
     return fig
 
 # --- 3. THE KNOWLEDGE NETWORK (Physics Graph) ---
+@timed("visualization")
 def create_interactive_network(claims):
     """
     Creates a bouncing physics graph: Claims <-> Evidence
     """
+    # Graph libs are only needed here; keep them off the import path of the other charts
+    import networkx as nx
+    from pyvis.network import Network
+
     G = nx.Graph()
     
     for i, claim in enumerate(claims):
@@ -172,6 +178,7 @@ def create_interactive_network(claims):
         return None
 
 # --- 4. TRUST TIMELINE (Line Chart) ---
+@timed("visualization")
 def plot_trust_timeline(claims):
     """
     Shows how factuality evolves as you read the text.
@@ -213,6 +220,7 @@ def plot_trust_timeline(claims):
     return fig
 
 # --- 5. SOURCE ATTRIBUTION (Bar Chart) ---
+@timed("visualization")
 def plot_source_attribution(claims):
     """
     Which files are we relying on?
@@ -253,6 +261,7 @@ def plot_source_attribution(claims):
     return fig
 
 # --- 6. EVIDENCE HEATMAP (Matrix) ---
+@timed("visualization")
 def plot_heatmap(claims):
     """
     Shows the strength of top 3 evidence chunks for each claim.
@@ -298,4 +307,18 @@ def plot_heatmap(claims):
         font=dict(color="white"),
         margin=dict(l=20, r=20, t=40, b=20)
     )
-    return fig
\ No newline at end of file
+    return fig
+# --- REPORT ---
+def report_charts(claims):
+    """
+    Every chart of the verification report. Built by pipeline.process(..., charts=True) so the
+    chart time is part of the request's timings and latency histogram.
+    """
+    return {
+        "sunburst": plot_sunburst(claims),
+        "radar": [plot_radar_chart(c['analysis']) for c in claims],
+        "timeline": plot_trust_timeline(claims),
+        "sources": plot_source_attribution(claims),
+        "heatmap": plot_heatmap(claims),
+        "network": create_interactive_network(claims),
+    }
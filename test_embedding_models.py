@@ -0,0 +1,44 @@
+import json
+import faiss
+import pytest
+from src.chunker import CHUNK_TOKEN_BUDGET, chunk_text, count_tokens
+from src.embedding_models import LEGACY_EMBEDDING_MODEL, chunk_token_budget, embedding_info, index_embedding
+from src.index_manifest import MANIFEST_FILE
+
+
+def test_chunk_budget_follows_the_embedding_model():
+    assert chunk_token_budget("all-mpnet-base-v2") == CHUNK_TOKEN_BUDGET
+    assert chunk_token_budget("paraphrase-MiniLM-L3-v2") < chunk_token_budget("all-MiniLM-L6-v2") < CHUNK_TOKEN_BUDGET
+    assert chunk_token_budget("not-in-the-registry") == CHUNK_TOKEN_BUDGET
+
+    text = " ".join(f"Sentence number {i} is about the guest policy." for i in range(100))
+    budget = chunk_token_budget("paraphrase-MiniLM-L3-v2")
+    assert max(count_tokens(c) for c in chunk_text(text, budget=budget)) <= budget
+
+
+def _retriever(root, dim):
+    from src.retriever import LocalRetriever
+    retriever = LocalRetriever.__new__(LocalRetriever)
+    retriever.embedding = index_embedding(root)
+    retriever.index = faiss.IndexFlatIP(dim)
+    retriever.metadata = []
+    retriever.sentence_store = retriever.entity_index = retriever.document_index = None
+    retriever.sentence_token_caches = {}
+    return retriever
+
+
+def test_legacy_index_without_embedding_entry_loads(tmp_path):
+    # Indexes built before the manifest recorded the model (no "embedding" entry, or no manifest at all)
+    root = str(tmp_path)
+    assert index_embedding(root) == {"model": LEGACY_EMBEDDING_MODEL, "dim": None, "normalize": True}
+    with open(tmp_path / MANIFEST_FILE, "w") as f:
+        json.dump({"version": 3, "num_chunks": 0}, f)
+    assert index_embedding(root)["dim"] is None
+    _retriever(root, 32).finish_loading()   # No dimension check against the registry's 768
+
+
+def test_recorded_dimension_mismatch_fails(tmp_path):
+    with open(tmp_path / MANIFEST_FILE, "w") as f:
+        json.dump({"version": 1, "embedding": embedding_info("all-mpnet-base-v2")}, f)
+    with pytest.raises(ValueError):
+        _retriever(str(tmp_path), 32).finish_loading()
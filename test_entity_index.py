@@ -0,0 +1,31 @@
+import numpy as np
+from src import entity_index
+from src.entity_index import EntityIndex, entity_keys
+
+
+def _index(docs):
+    postings = {}
+    for chunk_id, entities in enumerate(docs):
+        for key in entity_keys(entities):
+            postings.setdefault(key, []).append(chunk_id)
+    return EntityIndex({key: np.asarray(ids, dtype=np.int32) for key, ids in postings.items()}, len(docs))
+
+
+def _date(year):
+    return [{"val": year, "text": str(year), "label": "DATE"}]
+
+
+def test_lane_ranks_exact_value_then_subject():
+    docs = [_date(1990), _date(1985), [], _date(1990), _date(2001)]
+    subject = np.array([0.5, 3.0, 9.0, 0.0, 1.0])
+    # 1990 chunk with subject overlap first, then the other dates by subject; no-subject and no-date chunks dropped
+    assert _index(docs).lane(_date(1990), subject) == [0, 1, 4]
+
+
+def test_generic_label_is_only_checked_for_top_subject_matches(monkeypatch):
+    monkeypatch.setattr(entity_index, "ENTITY_SUBJECT_TOP_N", 2)
+    docs = [_date(1900 + i) for i in range(100)] + [_date(1990)]
+    subject = np.zeros(len(docs))
+    subject[[7, 42, 63, 100]] = [1.0, 4.0, 2.0, 0.5]
+    # The exact value always comes in (if it shares the subject); other dates only among the 2 best subject matches
+    assert _index(docs).lane(_date(1990), subject) == [100, 42, 63]
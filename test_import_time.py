@@ -0,0 +1,68 @@
+"""
+Cold-start budget check.
+
+Importing the package (and listing the knowledge base) must not pull in torch, faiss,
+sentence-transformers, spaCy or the charting libraries, and must stay under a time budget.
+Run with pytest, or directly for a timing table:  python test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds, for a fresh interpreter. Override on slow CI machines.
+IMPORT_BUDGET = float(os.environ.get("HRM_IMPORT_BUDGET_S", "1.5"))
+LIST_FILES_BUDGET = float(os.environ.get("HRM_LIST_FILES_BUDGET_S", "1.5"))
+
+HEAVY_MODULES = ["torch", "faiss", "sentence_transformers", "transformers", "spacy", "pypdf", "rank_bm25",
+                 "plotly", "networkx", "pyvis"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _run(code, cwd=ROOT):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", PROBE.format(code=code, heavy=HEAVY_MODULES)],
+                         cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_import():
+    return _run("import src.pipeline, src.index_builder, src.retriever, src.nli_verifier, src.claim_extraction, src.symbolic_verifier")
+
+
+def measure_list_files():
+    with tempfile.TemporaryDirectory() as kb:
+        # A knowledge base as written by build_index_from_documents (contents don't matter here)
+        open(os.path.join(kb, "corpus_metadata.pkl"), "wb").close()
+        with open(os.path.join(kb, "corpus_sources.json"), "w") as f:
+            json.dump([f"manual_{i}.pdf (Page {p})" for i in range(50) for p in range(1, 21)], f)
+        return _run("from src.index_builder import get_indexed_files\nfiles = get_indexed_files()\nassert len(files) == 1000", cwd=kb)
+
+
+def test_cold_import_is_light():
+    result = measure_import()
+    assert result["heavy"] == [], f"Heavy modules imported at package import: {result['heavy']}"
+    assert result["seconds"] < IMPORT_BUDGET, f"Cold import took {result['seconds']:.2f}s (budget {IMPORT_BUDGET}s)"
+
+
+def test_listing_indexed_files_is_light():
+    result = measure_list_files()
+    assert result["heavy"] == [], f"Heavy modules imported by get_indexed_files: {result['heavy']}"
+    assert result["seconds"] < LIST_FILES_BUDGET, f"get_indexed_files took {result['seconds']:.2f}s (budget {LIST_FILES_BUDGET}s)"
+
+
+if __name__ == "__main__":
+    for name, fn, budget in [("cold import", measure_import, IMPORT_BUDGET), ("get_indexed_files", measure_list_files, LIST_FILES_BUDGET)]:
+        r = fn()
+        status = "✅" if not r["heavy"] and r["seconds"] < budget else "❌"
+        print(f"{status} {name:<18} {r['seconds']:.3f}s (budget {budget}s) heavy={r['heavy']}")
@@ -0,0 +1,93 @@
+import numpy as np
+from src.evidence_narrowing import build_sentence_store, SentenceStore
+
+
+class CountingEncoder:
+    """Deterministic stand-in for the bi-encoder that counts the sentences it encodes."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, sentences, **kwargs):
+        self.encoded += len(sentences)
+        vecs = np.array([[len(s), s.count("e") + 1, sum(map(ord, s)) % 97 + 1] for s in sentences], dtype=np.float32)
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_upload_only_encodes_new_sentences(tmp_path):
+    corpus = ["Paris is in France. It is the capital.", "The hotel costs $10 per night.", "Old file. Two sentences."]
+    old_dir, new_dir, full_dir = tmp_path / "old", tmp_path / "new", tmp_path / "full"
+    for d in (old_dir, new_dir, full_dir):
+        d.mkdir()
+    build_sentence_store(corpus, CountingEncoder(), kb_dir=str(old_dir))
+    old = SentenceStore.load(num_chunks=3, kb_dir=str(old_dir))
+
+    # Re-upload: chunk 2 is replaced, one new chunk with 3 sentences is appended
+    passages = [corpus[0], corpus[1], "New upload. Three sentences here. Really."]
+    encoder = CountingEncoder()
+    assert build_sentence_store(passages, encoder, kb_dir=str(new_dir), previous=(old, [0, 1, None])) == 3
+    assert encoder.encoded == 3
+
+    # Same store as a full rebuild
+    build_sentence_store(passages, CountingEncoder(), kb_dir=str(full_dir))
+    inc, full = SentenceStore.load(kb_dir=str(new_dir)), SentenceStore.load(kb_dir=str(full_dir))
+    assert np.array_equal(inc.offsets, full.offsets)
+    assert np.array_equal(inc.spans, full.spans)
+    assert np.array_equal(np.asarray(inc.embeddings), np.asarray(full.embeddings))
+
+
+def test_reupload_replaces_exactly_that_file(tmp_path):
+    import pickle
+    from src.index_builder import _load_existing, METADATA_FILE
+    docs = [
+        {"text": "a1", "source": "a.pdf (Page 1)"},
+        {"text": "d1", "source": "data.pdf (Page 1)"},
+        {"text": "n1", "source": "notes.txt"},
+        {"text": "shared", "source": "a.pdf (Page 2)", "sources": ["a.pdf (Page 2)", "data.pdf (Page 3)"], "duplicate_count": 1},
+    ]
+    with open(tmp_path / METADATA_FILE, "wb") as f:
+        pickle.dump(docs, f)
+
+    kept, _, _, (_, total, ids) = _load_existing("a.pdf", str(tmp_path))
+    assert [d["text"] for d in kept] == ["d1", "n1", "shared"]
+    assert kept[2]["source"] == "data.pdf (Page 3)" and "sources" not in kept[2]
+    assert (total, ids) == (4, [1, 2, 3])
+
+    kept, _, _, _ = _load_existing("notes.txt", str(tmp_path))
+    assert "n1" not in [d["text"] for d in kept]
+
+
+def test_first_upload_encodes_each_chunk_once(tmp_path, monkeypatch):
+    import io
+    from src import index_builder, knowledge_base
+    from src.index_builder import process_uploaded_file
+    monkeypatch.setattr(knowledge_base, "KB_ROOT", str(tmp_path))
+    encoder = CountingEncoder()
+    encoder.get_sentence_embedding_dimension = lambda: 3
+    monkeypatch.setattr(index_builder, "get_bi_encoder", lambda name: encoder)
+    monkeypatch.setattr(index_builder, "annotate_entities", lambda docs: None)
+    monkeypatch.setattr(index_builder, "build_token_cache", lambda *a, **k: None)
+
+    upload = io.BytesIO(b"Paris is in France.\n\nThe hotel costs $10 per night.\n\nCheck-out is at noon.")
+    upload.name = "notes.txt"
+    assert process_uploaded_file(upload, kb="team-a") == 3
+
+    # 3 chunks streamed while reading the upload + 3 sentences for the sentence store, nothing re-encoded
+    assert len(SentenceStore.load(kb_dir=knowledge_base.kb_dir("team-a"))) == 3
+    assert encoder.encoded == 6
+
+
+def test_streamed_sentence_store_matches_full_build(tmp_path):
+    from src.evidence_narrowing import SentenceStoreWriter
+    passages = ["Paris is in France. It is the capital.", "The hotel costs $10 per night.", "", "Old file. Two sentences."]
+    streamed, full = tmp_path / "streamed", tmp_path / "full"
+    streamed.mkdir(), full.mkdir()
+    writer = SentenceStoreWriter(CountingEncoder(), kb_dir=str(streamed))
+    assert writer.add(passages[:2]) == ["Paris is in France.", "It is the capital.", "The hotel costs $10 per night."]
+    writer.add(passages[2:])
+    writer.close()
+    build_sentence_store(passages, CountingEncoder(), kb_dir=str(full))
+
+    a, b = SentenceStore.load(num_chunks=4, kb_dir=str(streamed)), SentenceStore.load(kb_dir=str(full))
+    assert np.array_equal(a.offsets, b.offsets) and np.array_equal(a.spans, b.spans)
+    assert np.array_equal(np.asarray(a.embeddings), np.asarray(b.embeddings))
@@ -0,0 +1,67 @@
+import os
+import time
+from src import index_manifest
+from src.index_manifest import begin_build, discard_build, publish_index, read_manifest, wait_for_publish, MANIFEST_FILE
+
+
+def _build(root, text):
+    staging = begin_build(root)
+    with open(os.path.join(staging, "corpus_metadata.pkl"), "w") as f:
+        f.write(text)
+    return staging
+
+
+def test_publish_marks_manifest_while_moving_files(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    publish_index(_build(root, "v1"), root, num_chunks=1)
+
+    seen = []
+    real_replace = os.replace
+    def replace(src, dst):
+        if not dst.endswith(MANIFEST_FILE):
+            seen.append(read_manifest(root).get("publishing"))
+        real_replace(src, dst)
+    monkeypatch.setattr(index_manifest.os, "replace", replace)
+    manifest = publish_index(_build(root, "v2"), root, num_chunks=2)
+
+    assert seen == [True]                     # Readers starting mid-publish wait / retry
+    assert read_manifest(root) == manifest and manifest["version"] == 2 and "publishing" not in manifest
+    assert not [n for n in os.listdir(root) if n.startswith(".staging-")]
+
+
+def test_crashed_publish_is_not_waited_for(tmp_path):
+    root = str(tmp_path)
+    staging = _build(root, "v1")
+    index_manifest._write_manifest(root, staging, {"version": 3, "publishing": True, "publishing_since": time.time() - 3600})
+    start = time.time()
+    assert wait_for_publish(root)["version"] == 3
+    assert time.time() - start < 1
+
+
+def test_failed_and_abandoned_builds_are_cleaned_up(tmp_path):
+    root = str(tmp_path)
+    discard_build(_build(root, "failed"))
+    abandoned = _build(root, "killed")
+    os.utime(abandoned, (0, 0))
+    current = begin_build(root)
+    assert [n for n in os.listdir(root) if n.startswith(".staging-")] == [os.path.basename(current)]
+
+
+def test_retriever_reloads_when_a_version_is_published_while_loading(tmp_path):
+    from src.retriever import LocalRetriever
+    root = str(tmp_path)
+    publish_index(_build(root, "v1"), root, num_chunks=1)
+
+    retriever = LocalRetriever.__new__(LocalRetriever)
+    retriever.kb_dir = root
+    loads = []
+    def load_metadata():
+        with open(os.path.join(root, "corpus_metadata.pkl")) as f:
+            loads.append(f.read())
+        if len(loads) == 1:                   # A new version lands halfway through the first load
+            publish_index(_build(root, "v2"), root, num_chunks=2)
+    retriever.index_loaders = lambda: {"metadata": load_metadata}
+
+    retriever.load_index()
+    assert loads == ["v1", "v2"]
+    assert retriever.index_version == 2 and not retriever.is_stale()
@@ -0,0 +1,28 @@
+import time
+import pytest
+from src.inference_pool import InferencePool, InferencePoolError
+
+
+def test_dead_worker_fails_pending_calls():
+    pool = InferencePool(1, 1, timeout=60)
+    try:
+        future = pool._submit("describe", "bi", ("missing-model", "torch"))
+        pool.processes[0].kill()
+        start = time.time()
+        with pytest.raises(InferencePoolError):
+            pool._wait(future)
+        assert time.time() - start < 10   # Noticed by the liveness check, not the timeout
+        assert not pool.healthy()
+        pool.restart(pool.processes)
+        assert pool.healthy() and pool.restarts == 1
+    finally:
+        pool.shutdown()
+
+
+def test_unanswered_call_times_out():
+    pool = InferencePool(0, 1, timeout=0.2)   # No workers: nothing ever answers
+    try:
+        with pytest.raises(InferencePoolError):
+            pool._wait(pool._submit("describe", "bi", ("missing-model", "torch")))
+    finally:
+        pool.shutdown()
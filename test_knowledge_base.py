@@ -0,0 +1,62 @@
+import pickle
+import pytest
+from src import knowledge_base
+from src.knowledge_base import KnowledgeBaseCache, kb_dir, load_metadata, clear_knowledge_base, create_knowledge_base
+
+
+def test_lru_eviction_under_budget():
+    loaded = []
+    sizes = {"a": 400_000, "b": 400_000, "c": 400_000}
+    cache = KnowledgeBaseCache(lambda name: loaded.append(name) or f"index-{name}", budget_mb=1, size=sizes.get)
+
+    assert cache.get("a") == "index-a"
+    assert cache.get("b") == "index-b"
+    assert cache.get("a") == "index-a"   # hit, "b" becomes least recently used
+    cache.get("c")                       # 1.2 MB > 1 MB budget -> evicts "b"
+
+    metrics = cache.metrics()
+    assert loaded == ["a", "b", "c"]
+    assert metrics["resident"] == ["a", "c"]
+    assert (metrics["hits"], metrics["loads"], metrics["evictions"]) == (1, 3, 1)
+
+    cache.get("b")                       # reloaded, evicts "a"
+    assert cache.metrics()["resident"] == ["c", "b"]
+
+
+def test_oversized_knowledge_base_stays_loaded():
+    cache = KnowledgeBaseCache(lambda name: name, budget_mb=1, size=lambda name: 5 * 2**20)
+    cache.get("big")
+    assert cache.metrics()["resident"] == ["big"]
+
+
+def test_knowledge_base_names():
+    assert kb_dir(None) == kb_dir("default") == "."
+    assert kb_dir("team-a").endswith("team-a")
+    for bad in ["../etc", "a/b", ".hidden"]:
+        with pytest.raises(ValueError):
+            kb_dir(bad)
+
+
+def test_metadata_written_per_shard(tmp_path):
+    # Bulk ingestion appends one pickled list per shard; plain builds write one list
+    path = tmp_path / "corpus_metadata.pkl"
+    with open(path, "wb") as f:
+        pickle.dump([{"text": "a"}, {"text": "b"}], f)
+        pickle.dump([{"text": "c"}], f)
+    assert [d["text"] for d in load_metadata(path)] == ["a", "b", "c"]
+
+
+def test_clearing_or_recreating_drops_cached_retriever(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge_base, "KB_ROOT", str(tmp_path))
+    create_knowledge_base("team-a")
+    loads = []
+    cache = KnowledgeBaseCache(lambda name: loads.append(name) or object(), size=lambda name: 0)
+    first = cache.get("team-a")
+
+    clear_knowledge_base("team-a")
+    assert cache.metrics()["resident"] == []          # Memory goes with the knowledge base
+    create_knowledge_base("team-a")
+    assert cache.get("team-a") is not first and loads == ["team-a", "team-a"]
+
+    create_knowledge_base("team-a")                   # Already exists: the loaded one stays
+    assert cache.get("team-a") is cache.get("team-a") and len(loads) == 2
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from src.aggregator import aggregate_scores
+from src.latency_budget import LatencyBudget, DEGRADATION_LEVELS
+
+
+def test_fits_budget_at_full_quality():
+    budget = LatencyBudget(1000, {0: 0.01})
+    assert budget.plan(10)["name"] == "full"
+    assert budget.report()["degradations"] == []
+
+
+def test_degrades_step_by_step():
+    costs = {0: 0.2}                     # unmeasured levels: half the cost of the level above
+    budget = LatencyBudget(900, costs)
+    assert budget.plan(10)["name"] == "no_rerank"
+    assert budget.report()["degradations"] == ["shallow_candidates", "no_rerank"]
+
+    budget.record(0.04)
+    assert costs[2] == 0.04
+    # Levels never go back up within a request
+    costs[0] = 0.001
+    assert budget.plan(1)["name"] == "no_rerank"
+
+
+def test_out_of_time_returns_partial_results():
+    budget = LatencyBudget(100, {len(DEGRADATION_LEVELS) - 1: 0.5})
+    assert budget.plan(3) is None
+    budget.skip()
+    budget.skip()
+    report = budget.report()
+    assert report["degradations"] == ["partial_results"]
+    assert report["unverified_claims"] == 2
+
+
+def _no_rerank_retriever(vectors):
+    import faiss
+    from src.retriever import LocalRetriever
+    retriever = LocalRetriever.__new__(LocalRetriever)
+    retriever.index = faiss.IndexFlatIP(vectors.shape[1])
+    retriever.index.add(vectors)
+    retriever.full_vectors = None
+    retriever.sentence_store = None
+    retriever.document_index = None
+    retriever.metadata = [{"text": f"chunk {i}", "source": "a.txt"} for i in range(len(vectors))]
+    retriever.profile = {"initial_k": 10}
+    retriever.encode_query = lambda query: vectors[:1]
+    retriever._fuse = lambda query, query_vec, depth, pool=None: [(i, 1.0) for i in range(len(vectors))][:depth]
+    return retriever
+
+
+def test_no_rerank_evidence_uses_cosine_threshold():
+    vectors = np.eye(4, dtype=np.float32)
+    vectors[1] = [0.7, 0.714, 0, 0]           # cosine 0.7 with the query: on topic, not a match
+    evidences = _no_rerank_retriever(vectors).retrieve("claim", k=2, hierarchical=False, rerank=False)
+
+    assert [ev["similarity_kind"] for ev in evidences] == ["cosine", "cosine"]
+    assert evidences[1]["similarity"] == pytest.approx(0.7, abs=1e-3)
+
+    neutral = [{"p_entailment": 0.1, "p_contradiction": 0.1, "p_neutral": 0.8, "claim_text": "unrelated words"}]
+    # 0.7 passes the cross-encoder bar (0.6) but not the cosine one
+    assert aggregate_scores(evidences[1:], neutral)["score"] == 0.35
+    assert aggregate_scores([{**evidences[1], "similarity_kind": "cross_encoder"}], neutral)["score"] == 0.75
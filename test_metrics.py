@@ -0,0 +1,79 @@
+from src.metrics import Histogram, MetricsRegistry, METRICS, stage, count, track_request
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 0.5, 3.0):
+        hist.observe(value)
+    assert hist.counts == [2, 1, 1, 1]     # le=0.01 is inclusive, 3.0 goes to +Inf
+    assert hist.quantile(0.5) == 0.1
+    assert hist.quantile(1.0) == float("inf")
+
+
+def test_request_timings():
+    with track_request() as timings:
+        with stage("rerank", items=50):
+            pass
+        with stage("rerank", items=30):
+            pass
+        count("token_cache_hits", 7)
+    report = timings.as_dict()
+    assert report["stages"]["rerank"]["calls"] == 2
+    assert report["stages"]["rerank"]["avg_batch"] == 40.0
+    assert report["counters"] == {"token_cache_hits": 7}
+    # Outside a request stages only go to the process-wide histograms
+    with stage("visualization"):
+        pass
+    assert "visualization" in METRICS.summary()
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe("nli", 0.02, items=5)
+    registry.count("token_cache_hits", 3)
+    registry.add_collector("kb", lambda: {"kb_cache_hits": 2, "kb_cache_resident_mb": 1.5}, counters=["kb_cache_hits"])
+    text = registry.prometheus_text()
+    assert 'hrm_stage_seconds_bucket{stage="nli",le="0.025"} 1' in text
+    assert 'hrm_stage_seconds_bucket{stage="nli",le="+Inf"} 1' in text
+    assert 'hrm_stage_seconds_count{stage="nli"} 1' in text
+    assert 'hrm_stage_items_total{stage="nli"} 5' in text
+    assert 'hrm_events_total{event="token_cache_hits"} 3' in text
+    assert "# TYPE hrm_kb_cache_hits_total counter\nhrm_kb_cache_hits_total 2" in text
+    assert "# TYPE hrm_kb_cache_resident_mb gauge\nhrm_kb_cache_resident_mb 1.5" in text
+
+
+def test_charts_are_timed_inside_the_request(monkeypatch):
+    import sys
+    import types
+    from src.metrics import timed
+    from src.pipeline import RiskAnalysisPipeline
+    # Stand-in for src.visualizer (plotly): one timed chart
+    fake = types.ModuleType("src.visualizer")
+    fake.report_charts = timed("visualization")(lambda claims: {"sunburst": len(claims)})
+    monkeypatch.setitem(sys.modules, "src.visualizer", fake)
+    pipeline = RiskAnalysisPipeline.__new__(RiskAnalysisPipeline)
+    pipeline._process = lambda *args: {"claims": [{}], "stats": {}}
+
+    before = METRICS.summary().get("request", {}).get("count", 0)
+    result = pipeline.process("q", "a", charts=True)
+    assert result["charts"] == {"sunburst": 1}
+    assert result["stats"]["timings"]["stages"]["visualization"]["calls"] == 1
+    assert METRICS.summary()["request"]["count"] == before + 1
+
+
+def test_metrics_server_binds_loopback(monkeypatch):
+    import socket
+    import urllib.request
+    from src import metrics
+    monkeypatch.setattr(metrics, "_server", None)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = metrics.start_metrics_server(port)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert b"hrm_stage_seconds" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,33 @@
+from src.near_dedup import ChunkDeduplicator, collapse_near_duplicates
+
+POLICY = ("Guests may stay in the residential halls for up to {} hours per visit. Every visitor must register at the front desk "
+          "before entering any residential floor, show a valid photo identification card, and remain with the resident host at "
+          "all times. Residents are responsible for the conduct of their guests and for any damage caused during the visit. "
+          "Overnight guests are not permitted during the examination period, and the hall director may refuse entry to any "
+          "visitor who has previously violated the community standards of the university housing office.")
+
+
+def test_near_duplicates_are_merged():
+    docs = [{"text": POLICY.format(72), "source": "a.pdf"}, {"text": POLICY.format(72) + " Thanks.", "source": "b.pdf"}]
+    kept, positions = collapse_near_duplicates(docs)
+    assert positions == [0]
+    assert kept[0]["sources"] == ["a.pdf", "b.pdf"]
+
+
+def test_chunks_differing_in_a_number_are_kept():
+    dedup = ChunkDeduplicator()
+    assert dedup.add({"text": POLICY.format(72), "source": "2023.pdf"})
+    assert dedup.add({"text": POLICY.format(48), "source": "2024.pdf"})
+    assert not dedup.add({"text": POLICY.format(48), "source": "2024-copy.pdf"})
+    assert [d["source"] for d in dedup.docs] == ["2023.pdf", "2024.pdf"]
+    assert dedup.docs[1]["sources"] == ["2024.pdf", "2024-copy.pdf"]
+
+
+def test_chunks_differing_in_a_negation_are_kept():
+    dedup = ChunkDeduplicator(extract_values=lambda texts: [[] for _ in texts])
+    allowed = POLICY.format("seventy-two").replace("Overnight guests are not permitted", "Overnight guests are permitted")
+    assert dedup.add({"text": allowed, "source": "2023.pdf"})
+    assert dedup.add({"text": POLICY.format("seventy-two"), "source": "2024.pdf"})
+    assert dedup.add({"text": allowed.replace("are permitted", "aren't permitted"), "source": "2024-draft.pdf"})
+    assert not dedup.add({"text": POLICY.format("seventy-two") + " Thanks.", "source": "2024-copy.pdf"})
+    assert len(dedup.docs) == 3
@@ -1,4 +1,4 @@
-from src.symbolic_verifier import SymbolicVerifier
+from src.symbolic_verifier import SymbolicVerifier, may_contain_values
 
 def test_symbolic_logic():
     verifier = SymbolicVerifier()
@@ -40,5 +40,19 @@ def test_symbolic_logic():
         status = "✅" if result == case['expected'] or (case['expected'] is None and result == "NEUTRAL/PASS") else "❌"
         print(f"   -> Result: {result} | Expected: {case['expected']} {status}\n")
 
+def test_fast_path_prefilter():
+    # Texts without digits, number words or dates never reach spaCy NER
+    assert not may_contain_values("The sky is blue.")
+    assert may_contain_values("Cost is $99.99.")
+    assert may_contain_values("The price is one hundred dollars.")
+    assert may_contain_values("It was signed in March.")
+
+    verifier = SymbolicVerifier()
+    assert verifier._normalize_number("$1,000.50") == 1000.5
+    assert verifier._normalize_number("twenty-one") == 21.0
+    assert verifier._normalize_number("3 days") == 3.0
+    assert verifier._normalize_number("last week") is None
+
 if __name__ == "__main__":
     test_symbolic_logic()
+    test_fast_path_prefilter()
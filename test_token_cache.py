@@ -0,0 +1,81 @@
+import random
+import numpy as np
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+from transformers import PreTrainedTokenizerFast
+from src.evidence_narrowing import split_sentence_spans
+from src.token_cache import TokenCache, build_pair_features, predict_pairs
+
+WORDS = [f"w{i}" for i in range(50)] + ["x", "y", "."]
+
+
+def _tokenizer():
+    # BERT-style pair layout, built in memory: [CLS] A [SEP] B [SEP]
+    vocab = {t: i for i, t in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + WORDS)}
+    tok = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tok.post_processor = processors.TemplateProcessing(single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+                                                       special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    return PreTrainedTokenizerFast(tokenizer_object=tok, pad_token="[PAD]", unk_token="[UNK]", cls_token="[CLS]", sep_token="[SEP]",
+                                   model_input_names=["input_ids", "token_type_ids", "attention_mask"])
+
+
+def _rows(features):
+    return [row[:n].tolist() for row, n in zip(features["input_ids"], features["attention_mask"].sum(axis=1))]
+
+
+def test_pair_features_match_longest_first_truncation():
+    tokenizer = _tokenizer()
+    rng = random.Random(0)
+    for _ in range(300):
+        first = " ".join(rng.choice(WORDS[:50]) for _ in range(rng.randint(1, 40)))
+        second = " ".join(rng.choice(WORDS[:50]) for _ in range(rng.randint(1, 40)))
+        max_length = rng.randint(6, 48)
+        expected = tokenizer(first, second, truncation="longest_first", max_length=max_length)["input_ids"]
+        ids = lambda text: tokenizer(text, add_special_tokens=False)["input_ids"]
+        assert _rows(build_pair_features(tokenizer, [(ids(first), ids(second))], max_length)) == [expected]
+
+
+class _CapturingEncoder:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.max_length = 24
+
+    def predict_features(self, features, **kwargs):
+        self.features = features
+        return np.zeros(len(features["input_ids"]))
+
+
+def test_narrowed_evidence_from_sentence_cache():
+    tokenizer = _tokenizer()
+    chunk = "w1 w2 w3 . w4 w5 . w6 w7 w8 w9 ."
+    sentences = [chunk[s:e] for s, e in split_sentence_spans(chunk)]
+    encoded = [tokenizer(s, add_special_tokens=False)["input_ids"] for s in sentences]
+    offsets = np.cumsum([0] + [len(ids) for ids in encoded])
+    cache = TokenCache(np.concatenate(encoded), offsets)
+
+    narrowed = " ".join(sentences[1:])
+    encoder = _CapturingEncoder(tokenizer)
+    predict_pairs(encoder, [[narrowed, "x y"]], evidence_ids=[cache.get_joined([1, 2])])
+    assert _rows(encoder.features) == [tokenizer(narrowed, "x y", truncation="longest_first", max_length=24)["input_ids"]]
+
+
+def test_nli_scores_each_distinct_evidence_text_once():
+    from src.nli_verifier import NLIVerifier, NLI_MODEL
+
+    class Model:
+        seen = []
+
+        def predict(self, pairs, **kwargs):
+            self.seen.extend(pairs)
+            return np.array([[0.1, 0.8, 0.1] if "72" in ev else [0.7, 0.1, 0.2] for ev, _ in pairs])
+
+    verifier = NLIVerifier.__new__(NLIVerifier)
+    verifier.profile = {"batch_sizes": {"nli": 8}}
+    verifier.model, verifier.current_model_name = Model(), NLI_MODEL
+    verifier.label_map = {0: 'contradiction', 1: 'entailment', 2: 'neutral'}
+    evidence = [{"id": 0, "text": "A. Stays up to 72 hours.", "nli_text": "Stays up to 72 hours."},
+                {"id": 5, "text": "Stays up to 72 hours. B.", "nli_text": "Stays up to 72 hours."},
+                {"id": 9, "text": "Stays up to 3 hours."}]
+    scores = verifier.verify("Guests may stay 72 hours.", evidence)
+    assert [s["label"] for s in scores] == ["entailment", "entailment", "contradiction"]
+    assert [ev for ev, _ in Model.seen] == ["Stays up to 72 hours.", "Stays up to 3 hours."]